@@ -16,6 +16,7 @@ if [ ! -f $DB_PATH ]; then
     . $PERSISTENT_DIR/.env
     
     python3 $PROJECT_DIR/manage.py migrate;
+    python3 $PROJECT_DIR/manage.py enable_incremental_vacuum;
     python3 $PROJECT_DIR/manage.py collectstatic --noinput;          
     mkdir -p $PERSISTENT_DIR/aria2/logs
     mkdir -p $PERSISTENT_DIR/http
@@ -33,6 +34,7 @@ else
     . /var/venv_django/bin/activate;      
     . $PERSISTENT_DIR/.env
     python3 $PROJECT_DIR/manage.py migrate;
+    python3 $PROJECT_DIR/manage.py enable_incremental_vacuum;
     python3 $PROJECT_DIR/manage.py collectstatic --noinput;          
     python3 $PROJECT_DIR/manage.py prune_db_task_results;         
 fi;  
@@ -1,9 +1,19 @@
 from .models import Torrent, TorrentFile, TorrentType, TorrentTorBoxSearchResult, Level
 from .statusmgr import StatusMgr
+from .copymgr import (
+    copy_file,
+    move_file,
+    link_file,
+    reflink_file,
+    device_slot,
+    ProgressTracker,
+    VerificationError,
+)
 import logging
 import abc
-import shutil
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from .commondao import (
     torrent_file_to_log,
     format_log_value,
@@ -15,6 +25,11 @@ from pathlib import Path
 from django.db.models import Q
 from constance import config
 
+# files of one action transferred at once, disks are limited by device_slot
+FILE_WORKERS = 4
+# seconds between progress reports, each report is a log row
+PROGRESS_INTERVAL = 10
+
 
 class ActionHandler:
     def __init__(self):
@@ -89,7 +104,9 @@ class ExitHandler(ActionHandler):
     def handle(self, action: Action):
         for file in action.files:
             file.action_on_finish_done = True
-            file.save()
+        TorrentFile.objects.filter(id__in=[file.id for file in action.files]).update(
+            action_on_finish_done=True
+        )
 
 
 def get_stash_api():
@@ -163,6 +180,8 @@ class CopyEnterHandler(ActionHandler):
 
 
 class ActionCopy(Action):
+    name = "Copy"
+
     def __init__(
         self,
         torrent: Torrent,
@@ -193,6 +212,14 @@ class ActionCopy(Action):
         target_path = self.target_dir / source_path.name
         return source_path, target_path
 
+    def report_progress(self, tracker: ProgressTracker, done: int, count: int):
+        copied = tracker.get_copied()
+        percent = copied * 100 / tracker.total if tracker.total else 100
+        self.status_mgr.action_progress(
+            self.torrent,
+            message=f"{self.name} action in progress: {format_log_value(f'{percent:.1f}%')}, files done: {done} of {count}, {copied} of {tracker.total} bytes",
+        )
+
     def exec_target_exists(self, source_path: Path, target_path: Path):
         add_log(
             message=f"Target file already exists: <i>'{target_path}'</i>, skipping action execution for this file",
@@ -201,21 +228,130 @@ class ActionCopy(Action):
             torrent=self.torrent,
         )
 
+    def exec_fallback(self, source: Path, target: Path):
+        add_log(
+            message=f"{self.name} not possible between: {format_log_value(source)} and {format_log_value(target)}, file copied instead",
+            level=Level.objects.get_warning(),
+            source="action",
+            torrent=self.torrent,
+        )
+
+    # for links copied data means file system couldn't do the action
+    fallback_on_copy = False
+
+    def transfer(self, source: Path, target: Path, progress, md5=None):
+        # returns True when data was copied, so md5 was checked if given
+        copy_file(source, target, progress, md5)
+        return True
+
+    def transfer_file(self, source: Path, target: Path, md5, progress):
+        with device_slot(source, target.parent):
+            return self.transfer(source, target, progress, md5)
+
+    def mark_verified(self, files: list[TorrentFile]):
+        for file in files:
+            file.verified = True
+        TorrentFile.objects.filter(id__in=[file.id for file in files]).update(
+            verified=True
+        )
+
     def exec(self):
+        paths = []
+        errors = []
+        targets = set()
         for source, target, file in self.paths:
+            if target in targets:
+                # parallel transfers to one target would share temp file
+                ActionCopy.exec_target_exists(self, source, target)
+                continue
             if target.exists():
                 self.exec_target_exists(source, target)
                 continue
-
-            message_start = f"Copy action for file: {torrent_file_to_log(file)} started: source: {format_log_value(source)},<br/> target: {format_log_value(target)}"
-            message_stop = f"Copy action for file done: {torrent_file_to_log(file)}, source: {format_log_value(source)},<br/> target: {format_log_value(target)}"
-            self.status_mgr.action_progress(self.torrent, message=message_start)
-
-            shutil.copy(source, target)
-            self.status_mgr.action_progress(self.torrent, message=message_stop)
+            targets.add(target)
+            size = source.stat().st_size
+            if file.size and size != file.size:
+                error = VerificationError(
+                    f"File: {source} has size: {size}, expected: {file.size}"
+                )
+                errors.append(error)
+                self.status_mgr.action_error(
+                    self.torrent,
+                    message=f"Size of file: {torrent_file_to_log(file)} is: {format_log_value(size)}, expected: {format_log_value(file.size)}, skipping it",
+                )
+                continue
+            paths.append((source, target, file, size))
+        if not paths:
+            if errors:
+                raise errors[0]
+            return
+        tracker = ProgressTracker(sum(size for _, _, _, size in paths))
+        self.status_mgr.action_progress(
+            self.torrent,
+            message=f"{self.name} action started for: {len(paths)} files, {tracker.total} bytes, target: {format_log_value(self.target_dir)}",
+        )
+        verified = []
+        # only file operations run in pool, logs are written from this thread
+        with ThreadPoolExecutor(
+            max_workers=FILE_WORKERS, thread_name_prefix="action"
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self.transfer_file,
+                    source,
+                    target,
+                    None if file.verified else file.md5,
+                    tracker.file_progress(file.id),
+                ): (source, target, file, size)
+                for source, target, file, size in paths
+            }
+            pending = set(futures)
+            last_report = time.monotonic()
+            while pending:
+                done, pending = wait(
+                    pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    source, target, file, size = futures[future]
+                    error = future.exception()
+                    if isinstance(error, VerificationError):
+                        errors.append(error)
+                        self.status_mgr.action_error(
+                            self.torrent,
+                            message=f"Verification of file: {torrent_file_to_log(file)} failed, target was not created,<br/> {format_log_value(error)}",
+                        )
+                        continue
+                    if error:
+                        errors.append(error)
+                        add_log(
+                            message=f"{self.name} action for file: {torrent_file_to_log(file)} failed, source: {format_log_value(source)},<br/> target: {format_log_value(target)},<br/> {format_log_value(error)}",
+                            level=Level.objects.get_error(),
+                            source="action",
+                            torrent=self.torrent,
+                        )
+                        continue
+                    tracker.update(file.id, size)
+                    copied = future.result()
+                    if copied and file.md5 and not file.verified:
+                        verified.append(file)
+                    if copied and self.fallback_on_copy:
+                        self.exec_fallback(source, target)
+                if pending and time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                    done_count = len(futures) - len(pending)
+                    self.report_progress(tracker, done_count, len(futures))
+                    last_report = time.monotonic()
+        self.mark_verified(verified)
+        if errors:
+            raise errors[0]
+        targets = "<br/>".join(format_log_value(target) for _, target, _, _ in paths)
+        self.status_mgr.action_progress(
+            self.torrent,
+            message=f"{self.name} action done for: {len(paths)} files, targets:<br/> {targets}",
+        )
 
 
 class ActionMove(ActionCopy):
+    name = "Move"
+
     def __init__(
         self,
         torrent: Torrent,
@@ -236,18 +372,24 @@ class ActionMove(ActionCopy):
             torrent=self.torrent,
         )
 
-    def exec(self):
-        for source, target, file in self.paths:
-            if target.exists():
-                self.exec_target_exists(source, target)
-                continue
+    def transfer(self, source: Path, target: Path, progress, md5=None):
+        return not move_file(source, target, progress, md5)
+
+
+class ActionHardlink(ActionCopy):
+    name = "Hardlink"
+    fallback_on_copy = True
+
+    def transfer(self, source: Path, target: Path, progress, md5=None):
+        return not link_file(source, target, progress, md5)
+
 
-            message_start = f"Move action for file: {torrent_file_to_log(file)} started: source: {format_log_value(source)},<br/> target: {format_log_value(target)}"
-            message_stop = f"Move action for file done: {torrent_file_to_log(file)}, source: {format_log_value(source)},<br/> target: {format_log_value(target)}"
-            self.status_mgr.action_progress(self.torrent, message=message_start)
+class ActionReflink(ActionCopy):
+    name = "Reflink"
+    fallback_on_copy = True
 
-            shutil.move(source, target)
-            self.status_mgr.action_progress(self.torrent, message=message_stop)
+    def transfer(self, source: Path, target: Path, progress, md5=None):
+        return not reflink_file(source, target, progress, md5)
 
 
 def clean_title(title: str):
@@ -672,6 +814,24 @@ class ActionFactory:
                 enter_handler=enter_handler,
                 exit_handler=exit_handler,
             )
+        if torrent_type.action_on_finish == TorrentType.ACTION_HARDLINK:
+            self.logger.debug("Creating action for hardlink")
+            return ActionHardlink(
+                torrent=torrent,
+                files=files,
+                torrent_dir=torrent_dir,
+                enter_handler=enter_handler,
+                exit_handler=exit_handler,
+            )
+        if torrent_type.action_on_finish == TorrentType.ACTION_REFLINK:
+            self.logger.debug("Creating action for reflink")
+            return ActionReflink(
+                torrent=torrent,
+                files=files,
+                torrent_dir=torrent_dir,
+                enter_handler=enter_handler,
+                exit_handler=exit_handler,
+            )
 
 
 class ActionMgr:
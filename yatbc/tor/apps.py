@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class TorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tor'
+
+    def ready(self):
+        from .eventbus import connect_signals
+        from .logbuffer import connect_signals as connect_log_buffer_signals
+
+        connect_log_buffer_signals()  # logs are written before task finished event
+        connect_signals()
@@ -1,4 +1,4 @@
-import requests
+from .httpsession import get_session
 import logging
 import json
 import shutil
@@ -19,6 +19,17 @@ from .commondao import (
 )
 
 
+TELL_STATUS_KEYS = [
+    "gid",
+    "status",
+    "totalLength",
+    "completedLength",
+    "files",
+    "errorCode",
+    "errorMessage",
+]
+
+
 class AriaApi:
     def __init__(self, host=None, port=None, secret=None):
         self.logger = logging.getLogger("torbox")
@@ -50,7 +61,7 @@ class AriaApi:
                 }
             )
             self._log_query(query)
-            result = requests.post(self.aria, data=query)
+            result = get_session().post(self.aria, data=query)
 
             if result.ok:
                 json_result = json.loads(result.content)
@@ -65,38 +76,51 @@ class AriaApi:
             self.logger.error("Couldn't getVersion of Aria2c: " + str(e))
             return None
 
-    def download_file(self, link, target_name, target_folder, torrent=None):
+    def download_files(self, downloads, torrent=None):
+        # downloads are (link, target_name, target_folder), added with one multicall
         try:
             self.logger.debug(
-                f"Downloading file: {link} to {target_folder}/{target_name}, with aria2c rpc server: {self.aria}"
+                f"Downloading {len(downloads)} files, with aria2c rpc server: {self.aria}"
             )
             query = json.dumps(
                 {
                     "jsonrpc": "2.0",
                     "id": self._build_request_id(),
-                    "method": "aria2.addUri",
+                    "method": "system.multicall",
                     "params": [
-                        f"token:{self.secret}",
-                        [link],
-                        {"dir": target_folder, "out": target_name},
+                        [
+                            {
+                                "methodName": "aria2.addUri",
+                                "params": [
+                                    f"token:{self.secret}",
+                                    [link],
+                                    {"dir": target_folder, "out": target_name},
+                                ],
+                            }
+                            for link, target_name, target_folder in downloads
+                        ]
                     ],
                 }
             )
             self._log_query(query)
-            result = requests.post(self.aria, data=query)
+            result = get_session().post(self.aria, data=query)
 
             if result.ok:
                 json_result = json.loads(result.content)
-                self.logger.debug(f"Aria2c download_file result: {json_result}")
-                return True, json_result["result"]
+                self.logger.debug(f"Aria2c multicall addUri result: {json_result}")
+                # every entry is either [gid] or a fault struct with code and message
+                return True, [
+                    entry[0] if isinstance(entry, list) else None
+                    for entry in json_result["result"]
+                ]
             else:
                 self.logger.error(
-                    f"Could not get download_file from aria: {result.reason}"
+                    f"Could not get multicall addUri from aria: {result.reason}"
                 )
                 return False, result.reason
         except Exception as e:
             add_log(
-                message=f"Could not download file: <i>'{link}'</i> to <i>'{target_folder}/{target_name}'</i>: <i>'{clean_html(e)}'</i>",
+                message=f"Could not download files: <i>'{[link for link, _, _ in downloads]}'</i>: <i>'{clean_html(e)}'</i>",
                 level=Level.objects.get_error(),
                 source="ariaapi",
                 torrent=torrent,
@@ -126,7 +150,7 @@ class AriaApi:
             }
         )
         self._log_query(query)
-        result = requests.post(self.aria, data=query)
+        result = get_session().post(self.aria, data=query)
 
         if result.ok:
             json_result = json.loads(result.content)
@@ -136,6 +160,47 @@ class AriaApi:
             self.logger.error(f"Could not get tellStatus from aria: {result.reason}")
             return False, result.reason
 
+    def tellStatusBatch(self, internal_ids):
+        self.logger.debug(
+            f"Updating status for {len(internal_ids)} aria internal ids from aria2 api {self.aria}"
+        )
+        query = json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "method": "system.multicall",
+                "id": self._build_request_id(),
+                "params": [
+                    [
+                        {
+                            "methodName": "aria2.tellStatus",
+                            "params": [
+                                f"token:{self.secret}",
+                                internal_id,
+                                TELL_STATUS_KEYS,
+                            ],
+                        }
+                        for internal_id in internal_ids
+                    ]
+                ],
+            }
+        )
+        self._log_query(query)
+        result = get_session().post(self.aria, data=query)
+
+        if result.ok:
+            json_result = json.loads(result.content)
+            self.logger.debug(f"Aria2c multicall tellStatus result: {json_result}")
+            # every entry is either [result] or a fault struct with code and message
+            return True, [
+                entry[0] if isinstance(entry, list) else None
+                for entry in json_result["result"]
+            ]
+        else:
+            self.logger.error(
+                f"Could not get multicall tellStatus from aria: {result.reason}"
+            )
+            return False, result.reason
+
 
 def validate_aria_api(host, port, password, api=None):
     if not api:
@@ -154,7 +219,7 @@ def validate_aria_api(host, port, password, api=None):
         return False, "Aria validation failed: Could not connect to aria2 api", 2
 
 
-def _update_aria_status(json_result, aria_internal_id):
+def _apply_aria_status(aria_download_status: AriaDownloadStatus, json_result):
     logger = logging.getLogger("torbox")
     gid = json_result["gid"]
     path = json_result["files"][0]["path"]  # in TorBox there will be always just one
@@ -175,7 +240,6 @@ def _update_aria_status(json_result, aria_internal_id):
     logger.debug(
         f"{gid}, {path}, {completed_length}, {total_length}, {error_message}, {status}"
     )
-    aria_download_status = AriaDownloadStatus.objects.get(internal_id=aria_internal_id)
     aria_download_status.path = path
     aria_download_status.error = error_message
     aria_download_status.status = status
@@ -191,10 +255,36 @@ def _update_aria_status(json_result, aria_internal_id):
     else:
         aria_download_status.progress = 0
         aria_download_status.done = False
+    return aria_download_status
+
+
+def _update_aria_status(json_result, aria_internal_id):
+    aria_download_status = AriaDownloadStatus.objects.get(internal_id=aria_internal_id)
+    _apply_aria_status(aria_download_status, json_result)
     aria_download_status.save()
     return aria_download_status
 
 
+def _report_status(status: AriaDownloadStatus, file: TorrentFile, save=True):
+    status_mgr = StatusMgr.get_instance()
+    torrent = file.torrent if file else None
+    if status.error:
+        status_mgr.aria_error(
+            torrent,
+            message=f"Aria download failed with error: {format_log_value(status.error)}, aria_id: {format_log_value(status.internal_id)}, file: {torrent_file_to_log(file)}",
+            save=save,
+        )
+        return
+
+    status_mgr.aria_progress(
+        torrent,
+        message=f"Aria download updated. Progress: {format_log_value(status.progress)}, aria_id: {format_log_value(status.internal_id)}, file: {torrent_file_to_log(file)}, status: {format_log_value(status.status)}",
+        done_downloading=status.done,
+        file=file,
+        save=save,
+    )
+
+
 def update_status(aria_internal_id, api=None):
     status_mgr = StatusMgr.get_instance()
     if not api:
@@ -215,20 +305,76 @@ def update_status(aria_internal_id, api=None):
         return
 
     status = _update_aria_status(result, aria_internal_id)
+    if status_mgr.aria_status_changed(status):
+        status.save(update_fields=["reported_progress", "reported_status"])
+        _report_status(status, file)
 
-    if status.error:
-        status_mgr.aria_error(
-            torrent,
-            message=f"Aria download failed with error: {format_log_value(status.error)}, aria_id: {format_log_value(aria_internal_id)}, file: {torrent_file_to_log(file)}",
-        )
+
+def update_statuses(statuses: list[AriaDownloadStatus], api=None):
+    # one multicall to aria and one bulk update, regardless of number of files
+    status_mgr = StatusMgr.get_instance()
+    if not statuses:
+        return
+    if not api:
+        api = AriaApi()
+    files = {}
+    # files of one torrent share its instance, so its status is saved once at the end
+    torrents = {}
+    for file in TorrentFile.objects.filter(aria__in=statuses).select_related(
+        "torrent"
+    ):
+        file.torrent = torrents.setdefault(file.torrent_id, file.torrent)
+        files[file.aria_id] = file
+    reported = {pk: torrent.local_status_id for pk, torrent in torrents.items()}
+    ok, results = api.tellStatusBatch([status.internal_id for status in statuses])
+    if not ok:
+        for status in statuses:
+            file = files.get(status.id)
+            status_mgr.aria_error(
+                file.torrent if file else None,
+                message=f"Could not get result from aria api for aria internal id <i>'{status.internal_id}'</i>: {format_log_value(results)}",
+                save=False,
+            )
+        save_torrent_statuses(torrents, reported)
         return
 
-    status_mgr.aria_progress(
-        torrent,
-        message=f"Aria download updated. Progress: {format_log_value(status.progress)}, aria_id: {format_log_value(aria_internal_id)}, file: {torrent_file_to_log(file)}, status: {format_log_value(status.status)}",
-        done_downloading=status.done,
-        file=file,
+    updated = []
+    for status, json_result in zip(statuses, results):
+        file = files.get(status.id)
+        if json_result is None:
+            status_mgr.aria_error(
+                file.torrent if file else None,
+                message=f"Aria did not return status for aria internal id <i>'{status.internal_id}'</i>",
+                save=False,
+            )
+            continue
+        updated.append(_apply_aria_status(status, json_result))
+    changed = [status for status in updated if status_mgr.aria_status_changed(status)]
+    AriaDownloadStatus.objects.bulk_update(
+        updated,
+        [
+            "path",
+            "error",
+            "status",
+            "done",
+            "progress",
+            "finished_at",
+            "reported_progress",
+            "reported_status",
+        ],
     )
+    for status in changed:
+        _report_status(status, files.get(status.id), save=False)
+    save_torrent_statuses(torrents, reported)
+
+
+def save_torrent_statuses(torrents, reported):
+    changed = [
+        torrent
+        for pk, torrent in torrents.items()
+        if torrent.local_status_id != reported[pk]
+    ]
+    Torrent.objects.bulk_update(changed, ["local_status"])
 
 
 def calculate_progress(files: TorrentFile):
@@ -280,22 +426,28 @@ def check_local_download_status(api=None):
         api = AriaApi()
     status_mgr = StatusMgr()
     logger = logging.getLogger("torbox")
-    files = AriaDownloadStatus.objects.filter(
-        done=False, error="", internal_id__isnull=False
-    )
-    for aria in files:
-        logger.debug(
-            f"Checking status of: {aria.id} with internal id: {aria.internal_id}"
+    statuses = list(
+        AriaDownloadStatus.objects.filter(
+            done=False, error="", internal_id__isnull=False
         )
-        update_status(aria.internal_id, api=api)
+    )
+    logger.debug(f"Checking status of: {len(statuses)} aria downloads")
+    update_statuses(statuses, api=api)
 
     torrents = Torrent.objects.exclude(
         Q(local_download_finished=True) | Q(deleted=True)
     ).filter(local_download=True)
 
     # update torrent progress for downloading files from torbox to local storage
+    files_by_torrent = {}
+    for file in TorrentFile.objects.filter(torrent__in=torrents).select_related(
+        "aria", "torrent"
+    ):
+        files_by_torrent.setdefault(file.torrent_id, []).append(file)
+    updated = []
+    finished = []
     for torrent in torrents:
-        files = TorrentFile.objects.filter(torrent=torrent)
+        files = files_by_torrent.get(torrent.id, [])
         total, progress, done = calculate_progress(files)
         if total == 0:
             logger.warning(
@@ -303,7 +455,10 @@ def check_local_download_status(api=None):
             )
             continue
         torrent.local_download_progress = progress / total
-        torrent.save()
+        updated.append(torrent)
         logger.debug(f"Updating progress: {torrent} {torrent.local_download_progress}")
         if len(done) == len(files):
-            status_mgr.aria_done(torrent=torrent)
+            finished.append(torrent)
+    Torrent.objects.bulk_update(updated, ["local_download_progress"])
+    for torrent in finished:
+        status_mgr.aria_done(torrent=torrent)
@@ -10,13 +10,41 @@ from .models import (
     ArrErrorLog,
 )
 import math
-from django.db.models import Q, OuterRef, Subquery, ExpressionWrapper, fields, F
+from django.db.models import (
+    Q,
+    ExpressionWrapper,
+    fields,
+    F,
+    Count,
+)
 import re
 import logging
-from django.db import connection
+from contextlib import contextmanager
+from django.db import connection, transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import bleach
 from .common import TRANSMISSION_CLIENT, TORBOX_CLIENT
+from .logbuffer import get_log_buffer
+
+
+@contextmanager
+def write_transaction(using=None):
+    # sqlite takes write lock on BEGIN, so read then write can't fail on lock upgrade
+    # other transactions stay DEFERRED and don't block readers
+    db = transaction.get_connection(using)
+    if db.vendor != "sqlite" or db.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    db.ensure_connection()
+    mode = db.transaction_mode
+    db.transaction_mode = "IMMEDIATE"
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        db.transaction_mode = mode
 
 
 def clean_html(html):
@@ -51,22 +79,27 @@ def torrent_file_to_log(file: TorrentFile):
     return f"<i>'{name}'(id: {file.id})</i><br/>"
 
 
+LOG_LEVEL_METHODS = {"ERROR": "error", "WARNING": "warning", "INFO": "info"}
+
+
 def add_log(message, level, source=None, torrent=None, local_status=None, arr=None):
     logger = logging.getLogger("torbox")
-    log = ErrorLog.objects.create(message=message, level=level, source=source)
-    if torrent:
-        TorrentErrorLog.objects.create(torrent=torrent, error_log=log)
-        if local_status:  # on "Status" screen
-            torrent.local_status = local_status
-            torrent.save()
-    if arr:
-        ArrErrorLog.objects.create(arr=arr, error_log=log)
-    if level == Level.objects.get_error():
-        logger.error(f"Message: {log.message}, source: {log.source}")
-    if level == Level.objects.get_warning():
-        logger.warning(f"Message: {log.message}, source: {log.source}")
-    if level == Level.objects.get_info():
-        logger.info(f"Message: {log.message}, source: {log.source}")
+    log = ErrorLog(message=message, level=level, source=source)
+    buffer = get_log_buffer()
+    if buffer:  # inside task, written in bulk later
+        buffer.add(log, torrent=torrent, arr=arr)
+    else:
+        log.save()
+        if torrent:
+            TorrentErrorLog.objects.create(torrent=torrent, error_log=log)
+        if arr:
+            ArrErrorLog.objects.create(arr=arr, error_log=log)
+    if torrent and local_status:  # on "Status" screen
+        torrent.local_status = local_status
+        torrent.save()
+    method = LOG_LEVEL_METHODS.get(level.name)
+    if method:
+        getattr(logger, method)(f"Message: {log.message}, source: {log.source}")
     return log
 
 
@@ -98,11 +131,24 @@ def update_double(torrent):
         double = double[0]
         double.doubled = True
         double.save()
-        torrent.double = True
+        torrent.doubled = True
         torrent.save()
         logger.debug(f"Updating double status for: {double} {torrent}")
 
 
+def has_movie_series_marker(name: str):
+    return re.search("[sS]\\d{1,2}([eE]\\d{1,2})*", name) is not None
+
+
+def log_movie_series_type(torrent: Torrent):
+    add_log(
+        message=f"Torrent {torrent.name} with hash: {torrent.hash} was added with season/episode marker, updating as movie series type",
+        level=Level.objects.get_info(),
+        source="torboxapi",
+        torrent=torrent,
+    )
+
+
 def update_type(torrent: Torrent):
     logger = logging.getLogger("torbox")
     no_type = TorrentType.objects.get(name="No Type")
@@ -110,19 +156,13 @@ def update_type(torrent: Torrent):
         logger.debug(f"Torrent {torrent} already had a type, skipping type update")
         return
     movie_series = TorrentType.objects.get(name="Movie Series")
-    result = re.search("[sS]\\d{1,2}([eE]\\d{1,2})*", torrent.name)
-    if result:
+    if has_movie_series_marker(torrent.name):
         logger.info(
             f"Found movie series marker, changing type to movie series for torrent: {torrent}"
         )
         torrent.torrent_type = movie_series
         torrent.save()
-        add_log(
-            message=f"Torrent {torrent.name} with hash: {torrent.hash} was added with season/episode marker, updating as movie series type",
-            level=Level.objects.get_info(),
-            source="torboxapi",
-            torrent=torrent,
-        )
+        log_movie_series_type(torrent)
         return
     logger.info(f"Couldn't determine type for torrent: {torrent}, leaving with No Type")
 
@@ -164,64 +204,90 @@ def map_torbox_entry_to_torrent_history(entry, torrent: Torrent):
     )
 
 
+def map_torbox_file_to_torrent_file(file, torrent: Torrent):
+    return TorrentFile(
+        torrent=torrent,
+        name=file.name,
+        short_name=file.short_name,
+        size=file.size,
+        hash=file._kwargs["hash"],
+        md5=getattr(file, "md5", None),
+        mime_type=file.mimetype,
+        internal_id=file.id_,
+    )
+
+
+def to_datetime(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def merge_torrent(torrent: Torrent, new_torrent: Torrent):
+    # copies state reported by remote client to already known torrent, without saving it
+    logger = logging.getLogger("torbox")
+    INFO = Level.objects.get_info()
+    if torrent.deleted:
+        torrent.redownload = True
+        torrent.deleted = False
+        logger.info(f"Redownloading torrent: {torrent}")
+        add_log(
+            message=f"Marking torrent: {torrent} as redownload",
+            level=INFO,
+            source="torboxapi",
+            torrent=torrent,
+        )
+    if (
+        torrent.internal_id
+        and new_torrent.internal_id
+        and int(torrent.internal_id) != int(new_torrent.internal_id)
+    ):
+        logger.info(
+            f"Updated internal id for torrent: {torrent}, old: {torrent.internal_id}, new: {new_torrent.internal_id}"
+        )
+    if torrent.private != new_torrent.private:
+        torrent.private = new_torrent.private
+    if torrent.cached != new_torrent.cached:
+        torrent.cached = new_torrent.cached
+    if torrent.name != new_torrent.name:
+        torrent.name = new_torrent.name
+    if torrent.size != new_torrent.size:
+        torrent.size = new_torrent.size
+    if (
+        new_torrent.torrent_type_id != torrent.torrent_type_id
+        and torrent.torrent_type.name == "No Type"
+    ):
+        logger.info(
+            f"New torrent: {new_torrent} has different type than previous torrent {torrent}"
+        )
+        add_log(
+            message=f"New torrent: {torrent_to_log(new_torrent)} has type: {format_log_value(new_torrent.torrent_type.name)}, and old torrent: {torrent_to_log(torrent)} has No Type, updating type to the new one",
+            level=INFO,
+            source="torboxapi",
+            torrent=torrent,
+        )
+        torrent.torrent_type = new_torrent.torrent_type
+
+    torrent.active = new_torrent.active
+    torrent.total_uploaded = new_torrent.total_uploaded
+    torrent.total_downloaded = new_torrent.total_downloaded
+    torrent.download_present = new_torrent.download_present
+    torrent.download_finished = new_torrent.download_finished
+    torrent.internal_id = new_torrent.internal_id
+    return torrent
+
+
 def update_torrent(new_torrent: Torrent):
     from .statusmgr import StatusMgr
 
     status_mgr = StatusMgr.get_instance()
     logger = logging.getLogger("torbox")
     torrent = get_previous_torrent(new_torrent)
-    INFO = Level.objects.get_info()
 
     if torrent:
-
-        if torrent.deleted:
-            torrent.redownload = True
-            torrent.deleted = False
-            logger.info(f"Redownloading torrent: {torrent}")
-            add_log(
-                message=f"Marking torrent: {torrent} as redownload",
-                level=INFO,
-                source="torboxapi",
-                torrent=torrent,
-            )
-        if (
-            torrent.internal_id
-            and new_torrent.internal_id
-            and int(torrent.internal_id) != int(new_torrent.internal_id)
-        ):
-            logger.info(
-                f"Updated internal id for torrent: {torrent}, old: {torrent.internal_id}, new: {new_torrent.internal_id}"
-            )
-        if torrent.private != new_torrent.private:
-            torrent.private = new_torrent.private
-        if torrent.cached != new_torrent.cached:
-            torrent.cached = new_torrent.cached
-        if torrent.name != new_torrent.name:
-            torrent.name = new_torrent.name
-        if torrent.size != new_torrent.size:
-            torrent.size = new_torrent.size
-        if (
-            new_torrent.torrent_type != torrent.torrent_type
-            and torrent.torrent_type.name == "No Type"
-        ):
-            logger.info(
-                f"New torrent: {new_torrent} has different type than previous torrent {torrent}"
-            )
-            add_log(
-                message=f"New torrent: {torrent_to_log(new_torrent)} has type: {format_log_value(new_torrent.torrent_type.name)}, and old torrent: {torrent_to_log(torrent)} has No Type, updating type to the new one",
-                level=INFO,
-                source="torboxapi",
-                torrent=torrent,
-            )
-            torrent.torrent_type = new_torrent.torrent_type
-
-        torrent.active = new_torrent.active
-        torrent.total_uploaded = new_torrent.total_uploaded
-        torrent.total_downloaded = new_torrent.total_downloaded
-        torrent.download_present = new_torrent.download_present
-        torrent.download_finished = new_torrent.download_finished
-        torrent.internal_id = new_torrent.internal_id
-
+        merge_torrent(torrent, new_torrent)
         torrent.save()
         if torrent.local_status == status_mgr.client_init:
             status_mgr.remote_client_added_torrent(torrent)
@@ -236,24 +302,151 @@ def update_torrent(new_torrent: Torrent):
     return torrent
 
 
-def mark_deleted_torrents(not_deleted, clients):
+SYNC_TORRENT_FIELDS = [
+    "active",
+    "name",
+    "size",
+    "total_uploaded",
+    "total_downloaded",
+    "download_present",
+    "download_finished",
+    "internal_id",
+    "private",
+    "cached",
+    "deleted",
+    "redownload",
+    "torrent_type",
+    "local_status",
+]
+
+
+def get_previous_torrents(client, hashes):
+    # one query for synced hashes, lowest pk wins like in get_previous_torrent
+    result = {}
+    previous = (
+        Torrent.objects.filter(client=client, hash__in=hashes)
+        .select_related("torrent_type", "local_status", "latest_history")
+        .order_by("pk")
+    )
+    for torrent in previous:
+        result.setdefault(torrent.hash, torrent)
+    return result
+
+
+def get_torrent_files_state(client):
+    return {
+        entry["torrent_id"]: (entry["files"], entry["aria"], entry["md5"])
+        for entry in TorrentFile.objects.filter(torrent__client=client)
+        .values("torrent_id")
+        .annotate(files=Count("id"), aria=Count("aria"), md5=Count("md5"))
+    }
+
+
+def bulk_update_doubles(torrents: list[Torrent]):
     logger = logging.getLogger("torbox")
-    ids_to_exclude = [obj.pk for obj in not_deleted]
+    by_hash = {}
+    for pk, hash in Torrent.objects.filter(
+        hash__in={torrent.hash for torrent in torrents}, deleted=False
+    ).values_list("pk", "hash"):
+        by_hash.setdefault(hash, set()).add(pk)
+    doubled = set()
+    not_doubled = set()
+    for torrent in torrents:
+        others = by_hash.get(torrent.hash, set()) - {torrent.pk}
+        if others:
+            doubled.update(others)
+            doubled.add(torrent.pk)
+        elif torrent.doubled:
+            not_doubled.add(torrent.pk)
+    not_doubled -= doubled
+    if doubled:
+        logger.debug(f"Updating double status for: {doubled}")
+        Torrent.objects.filter(pk__in=doubled, doubled=False).update(doubled=True)
+    if not_doubled:
+        logger.debug(f"Torrents no longer a double: {not_doubled}")
+        Torrent.objects.filter(pk__in=not_doubled).update(doubled=False)
+    for torrent in torrents:
+        torrent.doubled = torrent.pk in doubled
+
+
+def bulk_update_torrents(new_torrents: list[Torrent], client):
+    # in memory version of update_torrent, returns stored torrents in order of new_torrents
+    from .statusmgr import StatusMgr
+
+    status_mgr = StatusMgr.get_instance()
+    logger = logging.getLogger("torbox")
+    no_type = TorrentType.objects.get_no_type()
+    movie_series = TorrentType.objects.get_movie_series()
+    previous = get_previous_torrents(
+        client, {torrent.hash for torrent in new_torrents}
+    )
+    result = []
+    created = []
+    updated = {}
+    added = []
+    typed = []
+    for new_torrent in new_torrents:
+        torrent = previous.get(new_torrent.hash)
+        if torrent is None:
+            torrent = new_torrent
+            previous[torrent.hash] = torrent
+            created.append(torrent)
+            added.append(torrent)
+        elif torrent.pk not in updated:
+            merge_torrent(torrent, new_torrent)
+            updated[torrent.pk] = torrent
+            if torrent.local_status_id == status_mgr.client_init.id:
+                added.append(torrent)
+        if torrent.torrent_type_id == no_type.id and has_movie_series_marker(
+            torrent.name
+        ):
+            torrent.torrent_type = movie_series
+            typed.append(torrent)
+        result.append(torrent)
+    for torrent in added:
+        torrent.local_status = status_mgr.client_added
+
+    Torrent.objects.bulk_create(created)
+    Torrent.objects.bulk_update(updated.values(), SYNC_TORRENT_FIELDS)
+    logger.debug(f"Bulk sync created: {len(created)}, updated: {len(updated)}")
+
+    for torrent in added:
+        status_mgr.remote_client_added_torrent(torrent, save=False)
+    for torrent in typed:
+        log_movie_series_type(torrent)
+    bulk_update_doubles(result)
+    return result
+
+
+def mark_deleted_torrents(not_deleted, clients, unchanged_ids=()):
+    logger = logging.getLogger("torbox")
+    ids_to_exclude = [obj.pk for obj in not_deleted] + list(unchanged_ids)
     logger.debug(f"Update delete: {ids_to_exclude}, {clients}")
     Torrent.objects.exclude(Q(pk__in=ids_to_exclude) | Q(client__in=clients)).update(
         deleted=True
     )
 
 
-def get_active_torrents_with_current_history():
-    latest_details_subquery = (
-        TorrentHistory.objects.filter(torrent_id=OuterRef("pk"))
-        .order_by("-updated_at", "-pk")
-        .values("pk")[:1]
+def add_torrent_history(history: TorrentHistory):
+    # saves history and points torrent to it, unless torrent already has newer one
+    history.save()
+    updated = (
+        Torrent.objects.filter(pk=history.torrent_id)
+        .filter(
+            Q(latest_history__isnull=True)
+            | Q(latest_history__updated_at__lte=history.updated_at)
+        )
+        .update(latest_history=history)
     )
+    if updated:
+        history.torrent.latest_history = history
+    return history
+
+
+def get_active_torrents_with_current_history():
     return (
         Torrent.objects.filter(deleted=False)
-        .annotate(latest_history_id=Subquery(latest_details_subquery))
+        .select_related("latest_history")
         .annotate(
             age=ExpressionWrapper(
                 timezone.now() - F("created_at"), output_field=fields.DurationField()
@@ -263,18 +456,6 @@ def get_active_torrents_with_current_history():
     )
 
 
-def get_history_with_age(history_id):
-    return (
-        TorrentHistory.objects.filter(id=history_id)
-        .annotate(
-            ago=ExpressionWrapper(
-                timezone.now() - F("updated_at"), output_field=fields.DurationField()
-            )
-        )
-        .first()
-    )
-
-
 def format_age(age_in_seconds: int):
     if age_in_seconds < 60:
         return "<1min"
@@ -295,3 +476,19 @@ def get_active_torrents_with_formatted_age():
         age_in_seconds = obj.age.total_seconds()
         obj.formatted_age = format_age(age_in_seconds)
     return torrents
+
+
+def get_active_torrents_with_latest_history():
+    torrents = list(
+        get_active_torrents_with_current_history().select_related(
+            "local_status__level"
+        )
+    )
+    now = timezone.now()
+    for torrent in torrents:
+        torrent.formatted_age = format_age(torrent.age.total_seconds())
+        if torrent.latest_history:
+            torrent.latest_history.last_updated_ago = format_age(
+                (now - torrent.latest_history.updated_at).total_seconds()
+            )
+    return torrents
@@ -0,0 +1,312 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import ExitStack, contextmanager
+from functools import partial
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not available on windows
+    fcntl = None
+
+# big chunks keep syscall count low for multi GB files
+CHUNK_SIZE = 64 * 1024 * 1024
+# used only by user space fallback
+BUFFER_SIZE = 1024 * 1024
+# copied data is flushed to disk and offset saved after this many bytes
+CHECKPOINT_SIZE = 256 * 1024 * 1024
+# unfinished copies are hidden next to target, so library scanners skip them
+TEMP_PREFIX = "."
+TEMP_SUFFIX = ".part"
+# parallel operations on single disk, more makes hdd heads seek between files
+MAX_OPERATIONS_PER_DEVICE = 2
+# kernel can't copy between given files, next method should be tried
+UNSUPPORTED_ERRORS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.ENOTSOCK,
+    errno.EBADF,
+    errno.EPERM,
+}
+# ioctl from linux/fs.h, shares extents of source with target on btrfs, XFS etc.
+FICLONE = 0x40049409
+# file system can't link or clone given files, so they are copied instead
+NO_LINK_ERRORS = UNSUPPORTED_ERRORS | {errno.EMLINK, errno.ENOTTY}
+
+_lock = threading.Lock()
+_device_slots = {}
+
+
+class VerificationError(Exception):
+    pass
+
+
+def kernel_copy(source_fd, target_fd, count):
+    return os.copy_file_range(source_fd, target_fd, count)
+
+
+def send_copy(source_fd, target_fd, count):
+    return os.sendfile(target_fd, source_fd, None, count)
+
+
+def user_copy(source_fd, target_fd, count, digest=None):
+    data = memoryview(os.read(source_fd, min(count, BUFFER_SIZE)))
+    if digest is not None:
+        digest.update(data)
+    written = 0
+    while written < len(data):
+        written += os.write(target_fd, data[written:])
+    return written
+
+
+def get_copy_methods():
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append(kernel_copy)
+    if hasattr(os, "sendfile"):
+        methods.append(send_copy)
+    methods.append(user_copy)
+    return methods
+
+
+def copy_stream(
+    source_fd, target_fd, total, progress=None, copied=0, checkpoint=None, digest=None
+):
+    # both descriptors are used from their current position
+    logger = logging.getLogger("torbox")
+    if digest is not None:
+        # data has to pass user space to be hashed, it is still read only once
+        methods = [partial(user_copy, digest=digest)]
+    else:
+        methods = get_copy_methods()
+    last_checkpoint = copied
+    while copied < total:
+        method = methods[0]
+        try:
+            sent = method(source_fd, target_fd, min(CHUNK_SIZE, total - copied))
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRORS or len(methods) == 1:
+                raise
+            sent = 0
+            logger.debug(f"Copy method not supported, trying next one: {e}")
+        if sent == 0:
+            # some file systems report nothing copied instead of error
+            if len(methods) == 1:
+                raise OSError(
+                    errno.EIO, f"Source ended after {copied} of {total} bytes"
+                )
+            methods = methods[1:]
+            continue
+        copied += sent
+        if progress:
+            progress(copied, total)
+        if checkpoint and copied - last_checkpoint >= CHECKPOINT_SIZE:
+            checkpoint(copied)
+            last_checkpoint = copied
+    return copied
+
+
+def get_temp_path(target):
+    target = Path(target)
+    return target.with_name(f"{TEMP_PREFIX}{target.name}{TEMP_SUFFIX}")
+
+
+def get_checkpoint_path(temp):
+    return temp.with_name(f"{temp.name}.checkpoint")
+
+
+def read_checkpoint(path, source_stat):
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return 0
+    # changed source can't be resumed
+    if data.get("size") != source_stat.st_size:
+        return 0
+    if data.get("mtime") != source_stat.st_mtime_ns:
+        return 0
+    return int(data.get("offset", 0))
+
+
+def write_checkpoint(path, source_stat, offset):
+    temp = path.with_name(f"{path.name}.tmp")
+    temp.write_text(
+        json.dumps(
+            {
+                "size": source_stat.st_size,
+                "mtime": source_stat.st_mtime_ns,
+                "offset": offset,
+            }
+        )
+    )
+    os.replace(temp, path)
+
+
+def update_digest(fd, digest, size):
+    left = size
+    while left > 0:
+        data = os.read(fd, min(left, BUFFER_SIZE))
+        if not data:
+            raise OSError(errno.EIO, f"File ended {left} bytes before checkpoint")
+        digest.update(data)
+        left -= len(data)
+
+
+def remove_temp(temp):
+    temp.unlink(missing_ok=True)
+    get_checkpoint_path(temp).unlink(missing_ok=True)
+
+
+def copy_file(source, target, progress=None, md5=None):
+    # target appears only when complete, copy after restart continues from checkpoint
+    logger = logging.getLogger("torbox")
+    source_stat = os.stat(source)
+    temp = get_temp_path(target)
+    checkpoint_path = get_checkpoint_path(temp)
+    offset = 0
+    if temp.exists():
+        offset = min(read_checkpoint(checkpoint_path, source_stat), temp.stat().st_size)
+    if offset:
+        logger.info(f"Resuming copy of: {source} to: {target} from: {offset} bytes")
+    with open(source, "rb") as source_file, open(
+        temp, "r+b" if offset else "wb"
+    ) as target_file:
+        target_fd = target_file.fileno()
+
+        def checkpoint(copied):
+            os.fsync(target_fd)
+            write_checkpoint(checkpoint_path, source_stat, copied)
+
+        target_file.truncate(offset)
+        digest = None
+        if md5:
+            digest = hashlib.md5(usedforsecurity=False)
+            # resumed part is hashed from temp, so written data is verified
+            update_digest(target_fd, digest, offset)
+        source_file.seek(offset)
+        target_file.seek(offset)
+        copied = copy_stream(
+            source_file.fileno(),
+            target_fd,
+            source_stat.st_size,
+            progress,
+            offset,
+            checkpoint,
+            digest,
+        )
+        os.fsync(target_fd)
+    if digest is not None and digest.hexdigest() != md5.lower():
+        remove_temp(temp)
+        raise VerificationError(
+            f"Copy of: {source} has md5: {digest.hexdigest()}, expected: {md5}"
+        )
+    shutil.copymode(source, temp)
+    os.replace(temp, target)
+    checkpoint_path.unlink(missing_ok=True)
+    return copied
+
+
+def move_file(source, target, progress=None, md5=None):
+    try:
+        os.rename(source, target)
+        return True
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    copy_file(source, target, progress, md5)
+    shutil.copystat(source, target)
+    os.unlink(source)
+    return False
+
+
+def link_file(source, target, progress=None, md5=None):
+    try:
+        os.link(source, target)
+        return True
+    except OSError as e:
+        if e.errno not in NO_LINK_ERRORS:
+            raise
+        logging.getLogger("torbox").debug(f"Hardlink not possible: {e}")
+    copy_file(source, target, progress, md5)
+    return False
+
+
+def clone_file(source_fd, target_fd):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(target_fd, FICLONE, source_fd)
+        return True
+    except OSError as e:
+        if e.errno not in NO_LINK_ERRORS:
+            raise
+        logging.getLogger("torbox").debug(f"Reflink not possible: {e}")
+    return False
+
+
+def reflink_file(source, target, progress=None, md5=None):
+    temp = get_temp_path(target)
+    # interrupted fallback copy is resumed, instead of starting again
+    if not get_checkpoint_path(temp).exists():
+        with open(source, "rb") as source_file, open(temp, "wb") as target_file:
+            cloned = clone_file(source_file.fileno(), target_file.fileno())
+        if cloned:
+            shutil.copymode(source, temp)
+            os.replace(temp, target)
+            return True
+    copy_file(source, target, progress, md5)
+    return False
+
+
+def get_device(path):
+    # target dir can be created later, its nearest existing parent is on same disk
+    path = Path(path).absolute()
+    for candidate in (path, *path.parents):
+        try:
+            return os.stat(candidate).st_dev
+        except OSError:
+            continue
+    return None
+
+
+@contextmanager
+def device_slot(*paths):
+    # same order in all threads, so two operations can't wait on each other
+    devices = sorted({get_device(path) for path in paths}, key=str)
+    with _lock:
+        slots = [
+            _device_slots.setdefault(
+                device, threading.BoundedSemaphore(MAX_OPERATIONS_PER_DEVICE)
+            )
+            for device in devices
+        ]
+    with ExitStack() as stack:
+        for slot in slots:
+            stack.enter_context(slot)
+        yield
+
+
+class ProgressTracker:
+    def __init__(self, total):
+        self.total = total
+        self._lock = threading.Lock()
+        self._copied = {}
+
+    def update(self, key, copied):
+        with self._lock:
+            self._copied[key] = copied
+
+    def file_progress(self, key):
+        return lambda copied, total: self.update(key, copied)
+
+    def get_copied(self):
+        with self._lock:
+            return sum(self._copied.values())
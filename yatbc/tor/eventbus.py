@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import TaskEvent
+
+# how often other processes' bell file is checked while waiting, no db query is made
+BELL_CHECK_INTERVAL = 0.5
+# events older than this are removed while publishing
+EVENT_RETENTION = timedelta(hours=1)
+PRUNE_EVERY = 100
+# how long a task have to run to be reported as long running
+LONG_RUNNING_SECONDS = 10
+# how long a task can wait in queue before reporting that worker is not responding
+NO_WORKER_SECONDS = 20
+
+_condition = threading.Condition()
+_local_sequence = 0
+
+
+def get_bell_path():
+    return Path(settings.EVENT_BUS_FILE)
+
+
+def read_bell():
+    try:
+        return os.stat(get_bell_path()).st_mtime_ns
+    except OSError:
+        return None
+
+
+def ring_bell(sequence):
+    global _local_sequence
+    logger = logging.getLogger("torbox")
+    with _condition:
+        _local_sequence = max(_local_sequence, sequence)
+        _condition.notify_all()
+    path = get_bell_path()
+    try:
+        temp = path.with_suffix(".tmp")
+        temp.write_text(str(sequence))
+        os.replace(temp, path)
+    except OSError as e:
+        logger.warning(f"Could not write event bus file: {path}: {e}")
+
+
+def publish(event, task_path=None, task_id=None):
+    entry = TaskEvent.objects.create(event=event, task_path=task_path, task_id=task_id)
+    if entry.id % PRUNE_EVERY == 0:
+        TaskEvent.objects.filter(
+            created_at__lt=timezone.now() - EVENT_RETENTION
+        ).delete()
+    transaction.on_commit(lambda: ring_bell(entry.id))
+    return entry
+
+
+def publish_torrent_changed():
+    return publish(TaskEvent.TORRENT_CHANGED)
+
+
+def publish_task_event(event, task_result):
+    return publish(event, task_result.task.module_path, task_result.id)
+
+
+def on_task_enqueued(sender, task_result, **kwargs):
+    run_after = task_result.task.run_after
+    if run_after and run_after > timezone.now():
+        return  # scheduled for later, it will be reported when it starts
+    publish_task_event(TaskEvent.ENQUEUED, task_result)
+
+
+def on_task_started(sender, task_result, **kwargs):
+    publish_task_event(TaskEvent.STARTED, task_result)
+
+
+def on_task_finished(sender, task_result, **kwargs):
+    publish_task_event(TaskEvent.FINISHED, task_result)
+
+
+def connect_signals():
+    from django_tasks.signals import task_enqueued, task_started, task_finished
+
+    task_enqueued.connect(on_task_enqueued, dispatch_uid="tor.eventbus.enqueued")
+    task_started.connect(on_task_started, dispatch_uid="tor.eventbus.started")
+    task_finished.connect(on_task_finished, dispatch_uid="tor.eventbus.finished")
+
+
+class EventListener:
+    def __init__(self, last_id=None):
+        if last_id is None:
+            last_id = TaskEvent.objects.aggregate(last=Max("id"))["last"] or 0
+        self.last_id = last_id
+        self.bell = read_bell()
+        self.local_sequence = _local_sequence
+
+    def _rang(self):
+        bell = read_bell()
+        if bell != self.bell or _local_sequence != self.local_sequence:
+            self.bell = bell
+            self.local_sequence = _local_sequence
+            return True
+        return False
+
+    def _fetch(self):
+        events = list(TaskEvent.objects.filter(id__gt=self.last_id).order_by("id"))
+        if events:
+            self.last_id = events[-1].id
+        return events
+
+    def wait(self, timeout):
+        # blocks till new events are published or timeout passes, returns new events
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._rang():
+                events = self._fetch()
+                if events:
+                    return events
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            with _condition:
+                if _local_sequence == self.local_sequence:
+                    _condition.wait(min(BELL_CHECK_INTERVAL, remaining))
+
+    async def wait_async(self, timeout):
+        # same as wait, but doesn't hold a thread while waiting
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._rang():
+                events = await sync_to_async(self._fetch)()
+                if events:
+                    return events
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            await asyncio.sleep(min(BELL_CHECK_INTERVAL, remaining))
+
+
+class TaskActivity:
+    # translates task events into statuses understood by event stream in common.js
+    # tasks are keyed by task result id, so parallel runs of one task are tracked apart
+    def __init__(self, running=(), queued=(), ignored=()):
+        now = time.monotonic()
+        self.running = {str(task_id): (path, now) for task_id, path in running}
+        self.queued = {
+            str(task_id): (path, now)
+            for task_id, path in queued
+            if str(task_id) not in self.running
+        }
+        self.ignored = set(ignored)
+
+    def is_idle(self):
+        return not self.running and not self.queued
+
+    def apply(self, event: TaskEvent):
+        path = event.task_path
+        if path in self.ignored:
+            return []
+        task_id = str(event.task_id)
+        now = time.monotonic()
+        if event.event == TaskEvent.ENQUEUED:
+            if task_id not in self.running:
+                self.queued.setdefault(task_id, (path, now))
+            return []
+        if event.event == TaskEvent.STARTED:
+            self.queued.pop(task_id, None)
+            self.running[task_id] = (path, now)
+            return [{"status": "TaskStillWorking", "task": path}]
+        if event.event == TaskEvent.FINISHED:
+            self.running.pop(task_id, None)
+            if self.is_idle():
+                return [{"status": "Update"}]
+            return []
+        if event.event == TaskEvent.TORRENT_CHANGED and not self.running:
+            return [{"status": "Update"}]
+        return []
+
+    def on_timeout(self):
+        now = time.monotonic()
+        if self.running:
+            path, started = min(self.running.values(), key=lambda item: item[1])
+            if now - started > LONG_RUNNING_SECONDS:
+                return [{"status": "LongRunning", "task": path}]
+            return [{"status": "TaskStillWorking", "task": path}]
+        if self.queued:
+            path, queued = min(self.queued.values(), key=lambda item: item[1])
+            if now - queued > NO_WORKER_SECONDS:
+                return [{"status": "NoWorker", "task": path}]
+            return []
+        return [{"status": "NoTasks"}]
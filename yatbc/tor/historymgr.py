@@ -0,0 +1,148 @@
+from .models import (
+    Torrent,
+    TorrentHistory,
+    TorrentHistoryHourly,
+    TorrentHistoryDaily,
+    Level,
+)
+from .commondao import add_log, write_transaction
+import logging
+from datetime import date, timedelta
+from django.db.models import Avg, Max, Count, Sum, F, FloatField
+from django.db.models.functions import TruncHour, TruncDay
+from django.utils import timezone
+from constance import config
+
+ROLLUP_FIELDS = ["download_speed", "upload_speed", "peers", "seeds"]
+DELETE_CHUNK_SIZE = 500
+
+
+def get_raw_cutoff(now):
+    cutoff = timezone.localtime(now - timedelta(days=int(config.HISTORY_RAW_DAYS)))
+    return cutoff.replace(minute=0, second=0, microsecond=0)
+
+
+def get_hourly_cutoff(now):
+    cutoff = timezone.localtime(now - timedelta(days=int(config.HISTORY_HOURLY_DAYS)))
+    return cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def delete_history_in_chunks(queryset):
+    # torrents point to their latest history, so history can't be removed with one fast delete
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list("id", flat=True)[:DELETE_CHUNK_SIZE])
+        if not ids:
+            return deleted
+        TorrentHistory.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def rollup_raw_history(cutoff):
+    aggregates = {}
+    for field in ROLLUP_FIELDS:
+        aggregates[f"avg_{field}"] = Avg(field)
+        aggregates[f"max_{field}"] = Max(field)
+    latest = Torrent.objects.filter(latest_history__isnull=False).values(
+        "latest_history_id"
+    )
+    # latest history stays raw, dashboard and sync need it, so it isn't rolled up
+    old = TorrentHistory.objects.filter(updated_at__lt=cutoff).exclude(id__in=latest)
+    rows = (
+        old.annotate(period_start=TruncHour("updated_at"))
+        .values("torrent_id", "period_start")
+        .annotate(samples=Count("id"), **aggregates)
+        .order_by()
+    )
+    TorrentHistoryHourly.objects.bulk_create(
+        [TorrentHistoryHourly(**row) for row in rows], ignore_conflicts=True
+    )
+    return len(rows), delete_history_in_chunks(old)
+
+
+def rollup_hourly_history(cutoff):
+    aggregates = {}
+    for field in ROLLUP_FIELDS:
+        aggregates[f"sum_{field}"] = Sum(
+            F(f"avg_{field}") * F("samples"), output_field=FloatField()
+        )
+        aggregates[f"max_{field}"] = Max(f"max_{field}")
+    old = TorrentHistoryHourly.objects.filter(period_start__lt=cutoff)
+    rows = (
+        old.annotate(day=TruncDay("period_start"))
+        .values("torrent_id", "day")
+        .annotate(total=Sum("samples"), **aggregates)
+        .order_by()
+    )
+    daily = []
+    for row in rows:
+        entry = TorrentHistoryDaily(
+            torrent_id=row["torrent_id"],
+            period_start=row["day"],
+            samples=row["total"],
+        )
+        for field in ROLLUP_FIELDS:
+            setattr(entry, f"avg_{field}", row[f"sum_{field}"] / row["total"])
+            setattr(entry, f"max_{field}", row[f"max_{field}"])
+        daily.append(entry)
+    TorrentHistoryDaily.objects.bulk_create(daily, ignore_conflicts=True)
+    deleted, _ = old.delete()
+    return len(daily), deleted
+
+
+def apply_history_retention(now=None):
+    logger = logging.getLogger("torbox")
+    if now is None:
+        now = timezone.now()
+    with write_transaction():
+        hourly, raw_deleted = rollup_raw_history(get_raw_cutoff(now))
+    with write_transaction():
+        daily, hourly_deleted = rollup_hourly_history(get_hourly_cutoff(now))
+    logger.debug(
+        f"History retention: hourly added: {hourly}, raw removed: {raw_deleted}, daily added: {daily}, hourly removed: {hourly_deleted}"
+    )
+    add_log(
+        message=f"History retention removed: {raw_deleted} detailed and {hourly_deleted} hourly history entries",
+        level=Level.objects.get_info(),
+        source="historymgr",
+    )
+    return raw_deleted, hourly_deleted
+
+
+def is_history_retention_due():
+    return (
+        config.NEXT_HISTORY_RETENTION is None
+        or config.NEXT_HISTORY_RETENTION <= date.today()
+    )
+
+
+def get_hour(value):
+    return timezone.localtime(value).replace(minute=0, second=0, microsecond=0)
+
+
+def get_day(value):
+    return timezone.localtime(value).date()
+
+
+def get_history_points(torrent, since=None):
+    # every period comes from the finest resolution still kept for it: raw, then hourly, then daily
+    raw = TorrentHistory.objects.filter(torrent=torrent)
+    hourly = TorrentHistoryHourly.objects.filter(torrent=torrent)
+    daily = TorrentHistoryDaily.objects.filter(torrent=torrent)
+    if since:
+        raw = raw.filter(updated_at__gte=since)
+        hourly = hourly.filter(period_start__gte=since)
+        daily = daily.filter(period_start__gte=since)
+    points = list(raw.values("updated_at", *ROLLUP_FIELDS))
+    hours = {get_hour(point["updated_at"]) for point in points}
+    days = {get_day(point["updated_at"]) for point in points}
+    rollup_fields = {field: F(f"avg_{field}") for field in ROLLUP_FIELDS}
+    for point in hourly.values(updated_at=F("period_start"), **rollup_fields):
+        if get_hour(point["updated_at"]) not in hours:
+            points.append(point)
+            days.add(get_day(point["updated_at"]))
+    for point in daily.values(updated_at=F("period_start"), **rollup_fields):
+        if get_day(point["updated_at"]) not in days:
+            points.append(point)
+    points.sort(key=lambda point: point["updated_at"], reverse=True)
+    return points
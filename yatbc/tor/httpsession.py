@@ -0,0 +1,78 @@
+import logging
+import threading
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+
+# number of hosts kept in pool (aria, stash, torbox api, torbox search api, ...)
+POOL_CONNECTIONS = 10
+# number of keep-alive connections kept per host
+POOL_MAXSIZE = 10
+# concurrent requests to one host, from all threads of process
+MAX_REQUESTS_PER_HOST = 4
+
+_session = None
+_lock = threading.Lock()
+_host_slots = {}
+
+
+def create_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+@contextmanager
+def host_slot(host):
+    with _lock:
+        slot = _host_slots.setdefault(
+            host, threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+        )
+    with slot:
+        yield
+
+
+def close_session():
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def get_connection_metrics():
+    # reused = requests that didn't have to open new tcp/tls connection
+    if _session is None:
+        return []
+    result = []
+    pools = _session.get_adapter("https://").poolmanager.pools
+    for key in pools.keys():
+        pool = pools[key]
+        result.append(
+            {
+                "host": f"{key.key_scheme}://{key.key_host}:{key.key_port}",
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "reused": max(pool.num_requests - pool.num_connections, 0),
+            }
+        )
+    return result
+
+
+def log_connection_metrics():
+    logger = logging.getLogger("torbox")
+    for entry in get_connection_metrics():
+        logger.debug(
+            f"Http pool for: {entry['host']}, requests: {entry['requests']}, new connections: {entry['connections']}, reused: {entry['reused']}"
+        )
@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from django.db import (
+    DataError,
+    IntegrityError,
+    OperationalError,
+    connections,
+    transaction,
+)
+from .models import ErrorLog, TorrentErrorLog, ArrErrorLog
+
+# buffered logs are written when buffer is this big, or its oldest entry is this old
+FLUSH_SIZE = 200
+FLUSH_SECONDS = 5
+
+_local = threading.local()
+
+
+class LogBuffer:
+    # filled by task thread, flushed also by timer, so logs of quiet task are not held
+    def __init__(self, flush_size=FLUSH_SIZE, flush_seconds=FLUSH_SECONDS):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.entries = []
+        self.started = None
+        self.timer = None
+        self.owner = transaction.get_connection()  # db connection of task thread
+        self._lock = threading.Lock()
+
+    def add(self, log: ErrorLog, torrent=None, arr=None):
+        with self._lock:
+            if not self.entries:
+                self.started = time.monotonic()
+                self.start_timer()
+            self.entries.append((log, torrent, arr))
+            flush = (
+                len(self.entries) >= self.flush_size
+                or time.monotonic() - self.started >= self.flush_seconds
+            )
+        if flush:
+            self.flush()
+
+    def start_timer(self):
+        self.timer = threading.Timer(self.flush_seconds, self.flush_on_timer)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def stop_timer(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+    def flush_on_timer(self):
+        logger = logging.getLogger("torbox")
+        if self.owner.in_atomic_block:
+            # task could hold write lock, its logs would wait for it
+            with self._lock:
+                if self.entries:
+                    self.start_timer()
+            return
+        try:
+            self.flush()
+        except OperationalError as e:
+            # db is locked by task, logs are written by task thread later
+            logger.debug(f"Could not flush logs on timer: {e}")
+        except Exception as e:
+            logger.error(f"Could not write buffered logs: {e}")
+        finally:
+            connections.close_all()  # only connections of timer thread
+
+    def flush(self):
+        # entries are taken under lock, task thread doesn't wait for timer's write
+        with self._lock:
+            self.stop_timer()
+            entries = self.entries
+            self.entries = []
+        if not entries:
+            return 0
+        try:
+            written = self.write(entries)
+        except OperationalError:
+            with self._lock:
+                self.entries = entries + self.entries
+                self.started = time.monotonic()
+            raise
+        logging.getLogger("torbox").debug(f"Flushed logs: {written}")
+        return written
+
+    def write(self, entries):
+        logger = logging.getLogger("torbox")
+        try:
+            with transaction.atomic():
+                self.write_bulk(entries)
+            return len(entries)
+        except (IntegrityError, DataError, ValueError) as e:
+            logger.warning(f"Could not write logs in bulk, writing one by one: {e}")
+        written = 0
+        for log, torrent, arr in entries:
+            log.pk = None  # could be set by failed bulk insert
+            try:
+                with transaction.atomic():
+                    log.save(force_insert=True)
+                    if torrent:
+                        TorrentErrorLog.objects.create(torrent=torrent, error_log=log)
+                    if arr:
+                        ArrErrorLog.objects.create(arr=arr, error_log=log)
+                written += 1
+            except (IntegrityError, DataError, ValueError) as e:
+                logger.error(f"Could not write log: {log.message}: {e}")
+        return written
+
+    def write_bulk(self, entries):
+        ErrorLog.objects.bulk_create([log for log, _, _ in entries])
+        TorrentErrorLog.objects.bulk_create(
+            [
+                TorrentErrorLog(torrent=torrent, error_log=log)
+                for log, torrent, _ in entries
+                if torrent
+            ]
+        )
+        ArrErrorLog.objects.bulk_create(
+            [ArrErrorLog(arr=arr, error_log=log) for log, _, arr in entries if arr]
+        )
+
+
+def get_log_buffer():
+    return getattr(_local, "buffer", None)
+
+
+def start_log_buffer(**kwargs):
+    stop_log_buffer()  # previous task could die without flushing
+    _local.buffer = LogBuffer(**kwargs)
+    return _local.buffer
+
+
+def stop_log_buffer():
+    buffer = get_log_buffer()
+    _local.buffer = None
+    if buffer:
+        return buffer.flush()
+    return 0
+
+
+@contextmanager
+def buffered_logs(**kwargs):
+    buffer = start_log_buffer(**kwargs)
+    try:
+        yield buffer
+    finally:
+        stop_log_buffer()
+
+
+def on_task_started(sender, task_result, **kwargs):
+    start_log_buffer()
+
+
+def on_task_finished(sender, task_result, **kwargs):
+    # sent also when task raised, so nothing logged before exception is lost
+    try:
+        stop_log_buffer()
+    except Exception as e:
+        logging.getLogger("torbox").error(f"Could not write buffered logs: {e}")
+
+
+def connect_signals():
+    from django_tasks.signals import task_started, task_finished
+
+    task_started.connect(on_task_started, dispatch_uid="tor.logbuffer.started")
+    task_finished.connect(on_task_finished, dispatch_uid="tor.logbuffer.finished")
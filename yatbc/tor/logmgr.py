@@ -0,0 +1,119 @@
+from .models import ErrorLog, TorrentErrorLog, ArrErrorLog, Level
+from .commondao import add_log
+import gzip
+import json
+import logging
+from pathlib import Path
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from constance import config
+
+# each chunk is removed in own transaction, so sqlite is not locked for long
+DELETE_CHUNK_SIZE = 500
+LEVEL_RETENTION = {
+    "DEBUG": "LOG_DEBUG_DAYS",
+    "INFO": "LOG_INFO_DAYS",
+    "WARNING": "LOG_WARNING_DAYS",
+    "ERROR": "LOG_ERROR_DAYS",
+}
+
+
+def get_retention_days(level_name):
+    key = LEVEL_RETENTION.get(level_name, "LOG_ERROR_DAYS")
+    return int(getattr(config, key))
+
+
+def create_archive_path(now):
+    archive_dir = Path(settings.LOG_ARCHIVE_DIR)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    return archive_dir / f"errorlog-{now.strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+
+
+def logs_to_archive(ids):
+    torrents = {}
+    for log_id, torrent_id in TorrentErrorLog.objects.filter(
+        error_log_id__in=ids
+    ).values_list("error_log_id", "torrent_id"):
+        torrents.setdefault(log_id, []).append(torrent_id)
+    arrs = {}
+    for log_id, arr_id in ArrErrorLog.objects.filter(error_log_id__in=ids).values_list(
+        "error_log_id", "arr_id"
+    ):
+        arrs.setdefault(log_id, []).append(arr_id)
+    return [
+        {
+            "id": log.id,
+            "created_at": log.created_at.isoformat(),
+            "level": log.level.name,
+            "source": log.source,
+            "message": log.message,
+            "torrents": torrents.get(log.id, []),
+            "arrs": arrs.get(log.id, []),
+        }
+        for log in ErrorLog.objects.filter(id__in=ids)
+        .select_related("level")
+        .order_by("id")
+    ]
+
+
+def prune_level(level, cutoff, archive=None):
+    pruned = 0
+    old = ErrorLog.objects.filter(level=level, created_at__lt=cutoff).order_by("id")
+    while True:
+        ids = list(old.values_list("id", flat=True)[:DELETE_CHUNK_SIZE])
+        if not ids:
+            return pruned
+        if archive:
+            for entry in logs_to_archive(ids):
+                archive.write(json.dumps(entry) + "\n")
+            archive.flush()
+        with transaction.atomic():
+            ErrorLog.objects.filter(id__in=ids).delete()
+        pruned += len(ids)
+
+
+def prune_logs(now=None, archive_logs=None):
+    logger = logging.getLogger("torbox")
+    if now is None:
+        now = timezone.now()
+    if archive_logs is None:
+        archive_logs = config.ARCHIVE_PRUNED_LOGS
+    archive = None
+    archive_path = None
+    pruned = {}
+    try:
+        if archive_logs:
+            archive_path = create_archive_path(now)
+            archive = gzip.open(archive_path, "wt", encoding="utf-8")
+        for level in Level.objects.all():
+            cutoff = now - timedelta(days=get_retention_days(level.name))
+            pruned[level.name] = prune_level(level, cutoff, archive=archive)
+    except OSError as e:
+        logger.error(f"Could not archive logs to: {archive_path}: {e}")
+        add_log(
+            message=f"Log retention stopped, could not archive logs to: {archive_path}: {e}",
+            level=Level.objects.get_error(),
+            source="logmgr",
+        )
+        return pruned
+    finally:
+        if archive:
+            archive.close()
+    logger.debug(f"Log retention removed: {pruned}, archive: {archive_path}")
+    total = sum(pruned.values())
+    if archive_path and not total:
+        archive_path.unlink(missing_ok=True)
+    add_log(
+        message=f"Log retention removed: {total} logs",
+        level=Level.objects.get_info(),
+        source="logmgr",
+    )
+    return pruned
+
+
+def is_log_retention_due():
+    return (
+        config.NEXT_LOG_RETENTION is None or config.NEXT_LOG_RETENTION <= date.today()
+    )
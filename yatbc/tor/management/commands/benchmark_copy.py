@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from ...copymgr import copy_file
+
+WRITE_CHUNK = 16 * 1024 * 1024
+
+
+def create_source(path, size):
+    # random data, so file systems can't compress or dedupe it
+    with open(path, "wb") as file:
+        left = size
+        while left > 0:
+            chunk = min(WRITE_CHUNK, left)
+            file.write(os.urandom(chunk))
+            left -= chunk
+
+
+def measure(copy, source, target):
+    target.unlink(missing_ok=True)
+    start = time.perf_counter()
+    copy(source, target)
+    with open(target, "rb") as file:
+        os.fsync(file.fileno())  # include flush, page cache hides slow disks
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = "Compares copy engine of finish actions with shutil. Use dirs on different mounts to measure copy between volumes, e.g. aria2 dir and library"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=2048, help="File size in MB")
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument("--source-dir", default=None)
+        parser.add_argument("--target-dir", default=None)
+
+    def handle(self, *args, **options):
+        size = options["size"] * 1024 * 1024
+        with tempfile.TemporaryDirectory(
+            dir=options["source_dir"]
+        ) as source_dir, tempfile.TemporaryDirectory(
+            dir=options["target_dir"]
+        ) as target_dir:
+            source = Path(source_dir) / "source.bin"
+            target = Path(target_dir) / "target.bin"
+            create_source(source, size)
+            engines = {"shutil": shutil.copyfile, "copymgr": copy_file}
+            for name, copy in engines.items():
+                durations = [
+                    measure(copy, source, target) for _ in range(options["runs"])
+                ]
+                best = min(durations)
+                self.stdout.write(
+                    f"{name}: best: {best:.2f}s, avg: {sum(durations) / len(durations):.2f}s, "
+                    f"throughput: {size / best / 1024 / 1024:.0f}MB/s"
+                )
@@ -0,0 +1,111 @@
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def open_connection(path, pragmas):
+    # separate connection per thread, like gui and worker processes
+    conn = sqlite3.connect(
+        path,
+        timeout=int(pragmas.get("busy_timeout", 5000)) / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+    )
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def write_batches(path, pragmas, batches, batch_size, errors):
+    conn = open_connection(path, pragmas)
+    try:
+        for batch in range(batches):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO history (torrent_id, updated_at, speed) VALUES (?, ?, ?)",
+                    [
+                        (i % 100, time.time(), batch * batch_size + i)
+                        for i in range(batch_size)
+                    ],
+                )
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+                conn.execute("ROLLBACK")
+    finally:
+        conn.close()
+
+
+def read_until_done(path, pragmas, writer, latencies, errors):
+    conn = open_connection(path, pragmas)
+    try:
+        running = True
+        while running:
+            running = writer.is_alive()  # one more read after writer is done
+            start = time.perf_counter()
+            try:
+                conn.execute(
+                    "SELECT torrent_id, max(updated_at), avg(speed) FROM history GROUP BY torrent_id"
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+                continue
+            latencies.append(time.perf_counter() - start)
+    finally:
+        conn.close()
+
+
+def run_profile(pragmas, batches, batch_size):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "benchmark.sqlite3"
+        conn = open_connection(path, pragmas)
+        conn.execute(
+            "CREATE TABLE history (id INTEGER PRIMARY KEY, torrent_id INTEGER, updated_at REAL, speed INTEGER)"
+        )
+        conn.close()
+        latencies = []
+        write_errors = []
+        read_errors = []
+        start = time.perf_counter()
+        writer = threading.Thread(
+            target=write_batches,
+            args=(path, pragmas, batches, batch_size, write_errors),
+        )
+        writer.start()
+        read_until_done(path, pragmas, writer, latencies, read_errors)
+        writer.join()
+        return {
+            "duration": time.perf_counter() - start,
+            "reads": len(latencies),
+            "read_p50": statistics.median(latencies) if latencies else 0,
+            "read_max": max(latencies) if latencies else 0,
+            "read_errors": len(read_errors),
+            "write_errors": len(write_errors),
+        }
+
+
+class Command(BaseCommand):
+    help = "Measures gui reads during worker bulk writes, for default and configured sqlite pragmas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batches", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        profiles = {
+            "default": {"busy_timeout": settings.SQLITE_PRAGMAS["busy_timeout"]},
+            "configured": settings.SQLITE_PRAGMAS,
+        }
+        for name, pragmas in profiles.items():
+            result = run_profile(pragmas, options["batches"], options["batch_size"])
+            self.stdout.write(
+                f"{name}: duration: {result['duration']:.2f}s, reads: {result['reads']}, "
+                f"read p50: {result['read_p50'] * 1000:.2f}ms, read max: {result['read_max'] * 1000:.2f}ms, "
+                f"read errors: {result['read_errors']}, write errors: {result['write_errors']}"
+            )
@@ -0,0 +1,132 @@
+from pathlib import Path
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.utils import load_backend
+from django.db.migrations.recorder import MigrationRecorder
+
+SOURCE_ALIAS = "sqlite_source"
+COPIED_APPS = ["tor", "constance", "django_tasks_database"]
+
+
+def get_copied_models():
+    models = []
+    for label in COPIED_APPS:
+        models.extend(
+            model
+            for model in apps.get_app_config(label).get_models(
+                include_auto_created=True
+            )
+            if model._meta.managed and not model._meta.proxy
+        )
+    return models
+
+
+def add_source_connection(path):
+    # configure_settings only fills defaults, it requires default alias
+    settings_dict = connections.configure_settings(
+        {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": str(path)}}
+    )["default"]
+    connections[SOURCE_ALIAS] = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(
+        settings_dict, SOURCE_ALIAS
+    )
+    return connections[SOURCE_ALIAS]
+
+
+def remove_source_connection():
+    connections[SOURCE_ALIAS].close()
+    del connections[SOURCE_ALIAS]
+
+
+def get_applied_migrations(alias):
+    return {
+        key
+        for key in MigrationRecorder(connections[alias]).applied_migrations()
+        if key[0] in COPIED_APPS
+    }
+
+
+def copy_model(model, source, target, chunk_size):
+    # rows are copied as they are, without save signals or auto_now overrides
+    connection = connections[target]
+    fields = model._meta.local_concrete_fields  # parents are copied on their own
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(model._meta.db_table),
+        ", ".join(quote(field.column) for field in fields),
+        ", ".join(["%s"] * len(fields)),
+    )
+    query = model._base_manager.using(source).order_by("pk")
+    last_pk = None
+    copied = 0
+    while True:
+        chunk = query if last_pk is None else query.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return copied
+        params = [
+            [
+                field.get_db_prep_save(getattr(row, field.attname), connection)
+                for field in fields
+            ]
+            for row in rows
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+        last_pk = rows[-1].pk
+        copied += len(rows)
+
+
+class Command(BaseCommand):
+    help = "Copies tor, constance and task data from sqlite file into configured database (e.g. PostgreSQL). Target has to be migrated, its existing rows in copied tables are replaced."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            default=str(settings.PERSISTENT_DIR / "db.sqlite3"),
+            help="Path to sqlite database",
+        )
+        parser.add_argument(
+            "--target", default="default", help="Target database alias"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        source_path = Path(options["source"])
+        target = options["target"]
+        if not source_path.exists():
+            raise CommandError(f"Sqlite database not found: {source_path}")
+        if str(connections[target].settings_dict["NAME"]) == str(source_path):
+            raise CommandError("Source and target are the same database")
+        add_source_connection(source_path)
+        try:
+            missing = get_applied_migrations(target) ^ get_applied_migrations(
+                SOURCE_ALIAS
+            )
+            if missing:
+                raise CommandError(
+                    f"Source and target are not migrated to the same state, run migrate on both first: {sorted(missing)}"
+                )
+            self.copy(target, options["chunk_size"])
+        finally:
+            remove_source_connection()
+
+    def copy(self, target, chunk_size):
+        connection = connections[target]
+        models = get_copied_models()
+        # foreign keys are deferred till commit, so tables can be copied in any order
+        with transaction.atomic(using=target):
+            connection.ops.execute_sql_flush(
+                connection.ops.sql_flush(
+                    no_style(), [model._meta.db_table for model in models]
+                )
+            )
+            for model in models:
+                copied = copy_model(model, SOURCE_ALIAS, target, chunk_size)
+                self.stdout.write(f"{model._meta.label}: {copied}")
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS("Copy done"))
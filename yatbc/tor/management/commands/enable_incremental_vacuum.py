@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from ...taskresultmgr import enable_incremental_vacuum
+
+
+class Command(BaseCommand):
+    help = "Switches sqlite database to incremental vacuum, so task result cleanup can return free pages. Rewrites whole database once, run it when app is stopped"
+
+    def handle(self, *args, **options):
+        if enable_incremental_vacuum():
+            self.stdout.write(self.style.SUCCESS("Incremental vacuum enabled"))
+        else:
+            self.stdout.write("Nothing to do")
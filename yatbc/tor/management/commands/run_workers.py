@@ -0,0 +1,43 @@
+import logging
+import signal
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_tasks.utils import get_random_id
+from ...workermgr import WorkerPool
+
+
+class Command(BaseCommand):
+    help = "Runs pool of task workers, with lanes and per task concurrency limits from settings: TASK_WORKER_LANES, TASK_CONCURRENCY_LIMITS"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=1)
+        parser.add_argument("--backend", default="default", dest="backend_name")
+        parser.add_argument("--worker-id-prefix", default=None)
+
+    def handle(self, *args, **options):
+        prefix = options["worker_id_prefix"]
+        if prefix is None:
+            prefix = get_random_id()[:16] + "-"
+        self.pool = WorkerPool(
+            lanes=settings.TASK_WORKER_LANES,
+            limits=settings.TASK_CONCURRENCY_LIMITS,
+            interval=options["interval"],
+            backend_name=options["backend_name"],
+            prefix=prefix,
+        )
+        for name in ["SIGINT", "SIGTERM", "SIGQUIT"]:
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), self.shutdown)
+        self.pool.start()
+        while not self.pool.join(timeout=1):
+            pass
+        logging.getLogger("torbox").info("All workers stopped")
+
+    def shutdown(self, signum, frame):
+        logger = logging.getLogger("torbox")
+        if self.pool.stopping.is_set():
+            logger.warning("Stopping workers without waiting for running tasks")
+            sys.exit(1)  # worker threads are daemons
+        logger.warning("Stopping workers after running tasks are done")
+        self.pool.stop()
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0038_torrenttorboxsearchresult_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.CharField(max_length=50)),
+                ('task_path', models.CharField(blank=True, default=None, max_length=255, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_latest_history(apps, schema_editor):
+    Torrent = apps.get_model('tor', 'Torrent')
+    TorrentHistory = apps.get_model('tor', 'TorrentHistory')
+    latest = (
+        TorrentHistory.objects.filter(torrent_id=OuterRef('pk'))
+        .order_by('-updated_at', '-pk')
+        .values('pk')[:1]
+    )
+    Torrent.objects.update(latest_history=Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0039_taskevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='torrent',
+            name='latest_history',
+            field=models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tor.torrenthistory'),
+        ),
+        migrations.RunPython(fill_latest_history, migrations.RunPython.noop),
+    ]
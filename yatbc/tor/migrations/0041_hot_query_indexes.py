@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0040_torrent_latest_history'),
+        ('django_tasks_database', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ariadownloadstatus',
+            index=models.Index(condition=models.Q(('done', False)), fields=['internal_id'], name='aria_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='errorlog',
+            index=models.Index(fields=['created_at'], name='errorlog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='torrent',
+            index=models.Index(fields=['hash', 'client'], name='torrent_hash_client_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='torrent',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['client'], name='torrent_active_client_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='torrenthistory',
+            index=models.Index(fields=['torrent', 'updated_at'], name='history_torrent_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='torrenttorboxsearch',
+            index=models.Index(fields=['query', 'season', 'episode', 'date'], name='search_query_idx'),
+        ),
+        # DBTaskResult belongs to django_tasks, so its index can't be declared on the model
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS tor_dbtaskresult_path_status_idx '
+            'ON django_tasks_database_dbtaskresult (task_path, status)',
+            'DROP INDEX IF EXISTS tor_dbtaskresult_path_status_idx',
+        ),
+    ]
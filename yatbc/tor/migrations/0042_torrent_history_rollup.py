@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0041_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TorrentHistoryDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField()),
+                ('samples', models.IntegerField(default=0)),
+                ('avg_download_speed', models.FloatField(default=0.0)),
+                ('max_download_speed', models.IntegerField(default=0)),
+                ('avg_upload_speed', models.FloatField(default=0.0)),
+                ('max_upload_speed', models.IntegerField(default=0)),
+                ('avg_peers', models.FloatField(default=0.0)),
+                ('max_peers', models.IntegerField(default=0)),
+                ('avg_seeds', models.FloatField(default=0.0)),
+                ('max_seeds', models.IntegerField(default=0)),
+                ('torrent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tor.torrent')),
+            ],
+            options={
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('torrent', 'period_start'), name='torrenthistorydaily_torrent_period')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TorrentHistoryHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField()),
+                ('samples', models.IntegerField(default=0)),
+                ('avg_download_speed', models.FloatField(default=0.0)),
+                ('max_download_speed', models.IntegerField(default=0)),
+                ('avg_upload_speed', models.FloatField(default=0.0)),
+                ('max_upload_speed', models.IntegerField(default=0)),
+                ('avg_peers', models.FloatField(default=0.0)),
+                ('max_peers', models.IntegerField(default=0)),
+                ('avg_seeds', models.FloatField(default=0.0)),
+                ('max_seeds', models.IntegerField(default=0)),
+                ('torrent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tor.torrent')),
+            ],
+            options={
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('torrent', 'period_start'), name='torrenthistoryhourly_torrent_period')],
+            },
+        ),
+    ]
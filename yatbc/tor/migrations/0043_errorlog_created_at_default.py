@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0042_torrent_history_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='errorlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0043_errorlog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ariadownloadstatus',
+            name='reported_progress',
+            field=models.FloatField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='ariadownloadstatus',
+            name='reported_status',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
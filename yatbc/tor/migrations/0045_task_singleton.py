@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0044_aria_reported_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSingleton',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_path', models.CharField(max_length=255)),
+                ('args_hash', models.CharField(max_length=64)),
+                ('result_id', models.UUIDField(blank=True, default=None, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('task_path', 'args_hash'), name='task_singleton_key')],
+            },
+        ),
+    ]
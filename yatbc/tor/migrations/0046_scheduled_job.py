@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0045_task_singleton'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('interval', models.IntegerField(default=0)),
+                ('active', models.BooleanField(default=False)),
+                ('last_run_at', models.DateTimeField(blank=True, default=None, null=True)),
+                ('next_run_at', models.DateTimeField(blank=True, default=None, null=True)),
+            ],
+        ),
+    ]
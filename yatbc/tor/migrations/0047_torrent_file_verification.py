@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0046_scheduled_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='torrentfile',
+            name='md5',
+            field=models.CharField(blank=True, default=None, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='torrentfile',
+            name='verified',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tor', '0047_torrent_file_verification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskevent',
+            name='task_id',
+            field=models.UUIDField(blank=True, default=None, null=True),
+        ),
+    ]
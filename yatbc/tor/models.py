@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.cache import cache
 from django.db.models import Q
+from django.utils import timezone
 
 
 def get_or_set(key, getter, timeout=3600):
@@ -37,10 +38,15 @@ class Level(models.Model):
 
 class ErrorLog(models.Model):
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(
+        default=timezone.now
+    )  # not auto_now_add, buffered logs keep time when they were added
     level = models.ForeignKey(Level, on_delete=models.CASCADE)
     source = models.CharField(max_length=100, null=True, blank=True, default=None)
 
+    class Meta:
+        indexes = [models.Index(fields=["created_at"], name="errorlog_created_idx")]
+
 
 class TorrentStatus(models.Model):
     name = models.CharField(max_length=100)
@@ -71,6 +77,8 @@ class TorrentType(models.Model):
     ACTION_DO_NOTHING = "Nothing"
     ACTION_COPY = "Copy"
     ACTION_MOVE = "Move"
+    ACTION_HARDLINK = "Hardlink"
+    ACTION_REFLINK = "Reflink"
     name = models.CharField(max_length=255)
     action_on_finish = models.CharField(default="Nothing", max_length=50)
     target_dir = models.TextField(null=True, blank=True, default=None)
@@ -105,6 +113,24 @@ class Torrent(models.Model):
     finished_at = models.DateTimeField(default=None, null=True)
     cached = models.BooleanField(default=False)  # was cached on remote client?
     private = models.BooleanField(default=False)  # is from private tracker
+    latest_history = models.ForeignKey(
+        "TorrentHistory",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        default=None,
+        related_name="+",
+    )  # maintained by sync, so readers don't have to look for newest history
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["hash", "client"], name="torrent_hash_client_idx"),
+            models.Index(
+                fields=["client"],
+                condition=Q(deleted=False),
+                name="torrent_active_client_idx",
+            ),
+        ]
 
 
 class TorrentQueue(models.Model):
@@ -135,6 +161,44 @@ class TorrentHistory(models.Model):
     availability = models.FloatField(default=0.0)
     state = models.TextField(default="Unknown")
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["torrent", "updated_at"], name="history_torrent_updated_idx"
+            )
+        ]
+
+
+class TorrentHistoryRollup(models.Model):
+    # history older than retention period aggregated per period
+    torrent = models.ForeignKey(Torrent, on_delete=models.CASCADE)
+    period_start = models.DateTimeField()
+    samples = models.IntegerField(default=0)
+    avg_download_speed = models.FloatField(default=0.0)
+    max_download_speed = models.IntegerField(default=0)
+    avg_upload_speed = models.FloatField(default=0.0)
+    max_upload_speed = models.IntegerField(default=0)
+    avg_peers = models.FloatField(default=0.0)
+    max_peers = models.IntegerField(default=0)
+    avg_seeds = models.FloatField(default=0.0)
+    max_seeds = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=["torrent", "period_start"], name="%(class)s_torrent_period"
+            )
+        ]
+
+
+class TorrentHistoryHourly(TorrentHistoryRollup):
+    pass
+
+
+class TorrentHistoryDaily(TorrentHistoryRollup):
+    pass
+
 
 class AriaDownloadStatus(models.Model):
     internal_id = models.CharField(max_length=255, null=True, blank=True, default=None)
@@ -145,6 +209,18 @@ class AriaDownloadStatus(models.Model):
     status = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     finished_at = models.DateTimeField(null=True, default=None)
+    # last progress and status written to log, so unchanged polls are not logged again
+    reported_progress = models.FloatField(null=True, default=None)
+    reported_status = models.CharField(max_length=100, default="", blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["internal_id"],
+                condition=Q(done=False),
+                name="aria_pending_idx",
+            )
+        ]
 
 
 class TorrentFile(models.Model):
@@ -160,9 +236,11 @@ class TorrentFile(models.Model):
     short_name = models.TextField(null=True, blank=True)
     size = models.IntegerField()
     hash = models.CharField(max_length=255, null=True, blank=True)
+    md5 = models.CharField(max_length=32, null=True, blank=True, default=None)
     mime_type = models.CharField(max_length=100, null=True, blank=True)
     internal_id = models.CharField(max_length=100, null=True, blank=True, default=None)
     action_on_finish_done = models.BooleanField(default=False)
+    verified = models.BooleanField(default=False)
 
 
 class TorrentTorBoxSearchManager(models.Manager):
@@ -182,6 +260,14 @@ class TorrentTorBoxSearch(models.Model):
     episode = models.IntegerField(null=True, blank=True, default=None)
     objects = TorrentTorBoxSearchManager()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["query", "season", "episode", "date"],
+                name="search_query_idx",
+            )
+        ]
+
 
 class TorrentTorBoxSearchResultManager(models.Manager):
     def filter_by_torrent(self, torrent: Torrent):
@@ -253,3 +339,39 @@ class ArrMovieSeries(ArrBase):
 class ArrErrorLog(models.Model):
     arr = models.ForeignKey(ArrBase, on_delete=models.CASCADE)
     error_log = models.ForeignKey(ErrorLog, on_delete=models.CASCADE)
+
+
+class TaskEvent(models.Model):
+    # change-sequence table, GUI event stream reads rows with id greater than last seen
+    ENQUEUED = "Enqueued"
+    STARTED = "Started"
+    FINISHED = "Finished"
+    TORRENT_CHANGED = "TorrentChanged"
+    created_at = models.DateTimeField(auto_now_add=True)
+    event = models.CharField(max_length=50)
+    task_path = models.CharField(max_length=255, null=True, blank=True, default=None)
+    task_id = models.UUIDField(null=True, blank=True, default=None)
+
+
+class TaskSingleton(models.Model):
+    # one row per task path and arguments, points to last enqueued task result
+    task_path = models.CharField(max_length=255)
+    args_hash = models.CharField(max_length=64)
+    result_id = models.UUIDField(null=True, blank=True, default=None)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["task_path", "args_hash"], name="task_singleton_key"
+            )
+        ]
+
+
+class ScheduledJob(models.Model):
+    # state of periodic job run by scheduler, interval grows while job is idle
+    name = models.CharField(max_length=100, unique=True)
+    interval = models.IntegerField(default=0)  # seconds
+    active = models.BooleanField(default=False)
+    last_run_at = models.DateTimeField(null=True, blank=True, default=None)
+    next_run_at = models.DateTimeField(null=True, blank=True, default=None)
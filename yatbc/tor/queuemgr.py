@@ -2,7 +2,6 @@ from .models import (
     TorrentQueue,
     TorrentType,
     TorrentErrorLog,
-    TorrentHistory,
     Torrent,
     Level,
 )
@@ -129,9 +128,6 @@ def clean_active_downloads():
     )
     cleaned = 0
     for torrent in active_downloads:
-        history = None
-        if torrent.latest_history_id:
-            history = TorrentHistory.objects.get(id=torrent.latest_history_id)
         if torrent.private:
             logger.debug(f"skipping torrent: {torrent}, it is marked as private")
             continue
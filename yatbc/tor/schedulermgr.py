@@ -0,0 +1,91 @@
+from .models import ScheduledJob, Torrent, AriaDownloadStatus
+import logging
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Optional
+from django.utils import timezone
+
+# next runs are spread by this fraction of interval, so jobs don't fire together
+JITTER = 0.1
+# scheduler is never woken more often than this
+MIN_SCHEDULER_DELAY = 5
+
+
+@dataclass
+class Job:
+    name: str
+    run: Callable
+    idle_interval: int
+    active_interval: Optional[int] = None
+    max_interval: Optional[int] = None
+    is_active: Optional[Callable] = None
+    is_enabled: Optional[Callable] = None
+
+
+def has_active_local_downloads():
+    # same downloads as checked by check_local_download_status, errors wait for user
+    return AriaDownloadStatus.objects.filter(
+        done=False, error="", internal_id__isnull=False
+    ).exists()
+
+
+def has_active_remote_downloads(client):
+    return Torrent.objects.filter(
+        client=client, deleted=False, download_finished=False
+    ).exists()
+
+
+def get_next_interval(job: Job, previous, active):
+    if job.is_active is None:
+        return job.idle_interval
+    if active:
+        return job.active_interval
+    if previous < job.idle_interval:
+        return job.idle_interval
+    return min(previous * 2, job.max_interval)
+
+
+def add_jitter(seconds):
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def run_due_jobs(jobs, now=None):
+    logger = logging.getLogger("torbox")
+    if now is None:
+        now = timezone.now()
+    states = {state.name: state for state in ScheduledJob.objects.all()}
+    next_runs = []
+    for job in jobs:
+        if job.is_enabled and not job.is_enabled():
+            continue
+        state = states.get(job.name)
+        if state is None:
+            state = ScheduledJob.objects.create(name=job.name)
+        if state.next_run_at and state.next_run_at > now:
+            next_runs.append(state.next_run_at)
+            continue
+        job.run()
+        state.active = bool(job.is_active and job.is_active())
+        state.interval = get_next_interval(job, state.interval, state.active)
+        state.last_run_at = now
+        state.next_run_at = now + timedelta(seconds=add_jitter(state.interval))
+        state.save()
+        logger.debug(
+            f"Job: {job.name} done, active: {state.active}, next run: {state.next_run_at}"
+        )
+        next_runs.append(state.next_run_at)
+    return max(
+        min(next_runs, default=now), now + timedelta(seconds=MIN_SCHEDULER_DELAY)
+    )
+
+
+def reset_jobs(jobs):
+    # back to fastest polling, when user is expecting changes
+    ScheduledJob.objects.filter(
+        name__in=[job.name for job in jobs if job.is_active]
+    ).update(interval=0, next_run_at=None)
+
+
+def get_scheduled_jobs():
+    return ScheduledJob.objects.order_by("next_run_at", "name")
@@ -1,5 +1,5 @@
 from constance import config
-import requests
+from .httpsession import get_session
 import logging
 import json
 
@@ -49,7 +49,7 @@ class StashApi:
             }
 
             self._log_query(query)
-            result = requests.post(self.stash, json=query)
+            result = get_session().post(self.stash, json=query)
 
             if result.ok:
                 json_result = json.loads(result.content)
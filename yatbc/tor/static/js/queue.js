@@ -2,6 +2,8 @@ function getData() {
     return {
         ...commonCallApi(),
         queue: [],
+        jobs: [],
+        metrics: null,
         torrent_types: [],
         fetchTorrentTypes() {
             fetch(`/api/get_torrent_type_list`)
@@ -56,6 +58,27 @@ function getData() {
                 (onError = null)
             );
         },
+        fetchJobs() {
+            fetch(`/api/get_scheduled_jobs`)
+                .then((res) => res.json())
+                .then((data) => {
+                    this.jobs = data.jobs;
+                });
+        },
+        fetchMetrics() {
+            fetch(`/api/get_task_metrics`)
+                .then((res) => res.json())
+                .then((data) => {
+                    this.metrics = data.metrics;
+                })
+                .catch((error) => {
+                    console.error("Failed to read task metrics:", error);
+                    this.metrics = null;
+                });
+        },
+        formatJobDate(value) {
+            return value ? new Date(value).toLocaleString() : "-";
+        },
         handleSelection(queueId, newTorrentTypeId) {
             console.log(
                 `Queue ID: ${queueId}, newTorrentTypeId: ${newTorrentTypeId}`
@@ -74,9 +97,13 @@ function getData() {
                     } else {
                         this.fetchData();
                     }
+                    this.fetchJobs();
+                    this.fetchMetrics();
                 })
             );
             this.fetchTorrentTypes();
+            this.fetchJobs();
+            this.fetchMetrics();
 
 
         },
@@ -1,7 +1,15 @@
-from .models import TorrentStatus, Torrent, Level, TorrentFile, TorrentType
+from .models import (
+    TorrentStatus,
+    Torrent,
+    Level,
+    TorrentFile,
+    TorrentType,
+    AriaDownloadStatus,
+)
 from .commondao import add_log, format_log_value, torrent_to_log, torrent_file_to_log
 from django.utils import timezone
 from pathlib import Path
+from constance import config
 import logging
 
 
@@ -42,11 +50,15 @@ class StatusMgr:
             local_status=self.client_done,
             torrent=torrent,
         )
-        request_torrent_files.enqueue(torrent.id)
+        from .tasks import enqueue_once
 
-    def remote_client_added_torrent(self, torrent: Torrent):
+        # sync reports torrent again till its links are added, links are requested once
+        enqueue_once(request_torrent_files, torrent.id)
+
+    def remote_client_added_torrent(self, torrent: Torrent, save=True):
         torrent.local_status = self.client_added
-        torrent.save()
+        if save:
+            torrent.save()
         add_log(
             message=f"Torrent: {torrent_to_log(torrent)} added to client: {format_log_value(torrent.client)}",
             level=Level.objects.get_info(),
@@ -54,14 +66,19 @@ class StatusMgr:
             torrent=torrent,
         )
 
-    def remote_client_progress(self, torrent: Torrent):
+    def remote_client_progress(self, torrent: Torrent, save=True):
+        if torrent.local_status_id == self.client_progress.id:
+            return False  # already reported
+        torrent.local_status = self.client_progress
+        if save:
+            torrent.save()
         add_log(
             message=f"Remote client is working on {torrent_to_log(torrent)}",
             level=Level.objects.get_info(),
             source=self.SOURCE,
             torrent=torrent,
-            local_status=self.client_progress,
         )
+        return True
 
     def remote_client_error(self, torrent: Torrent):
         add_log(
@@ -164,19 +181,46 @@ class StatusMgr:
                     torrent=torrent,
                 )
 
-    def aria_error(self, torrent, message):
+    def aria_error(self, torrent, message, save=True):
+        local_status = self.local_error
+        if torrent and not save:  # caller saves torrent
+            torrent.local_status = local_status
+            local_status = None
         add_log(
             message=message,
             level=Level.objects.get_error(),
             source=self.SOURCE,
             torrent=torrent,
-            local_status=self.local_error,
+            local_status=local_status,
         )
 
-    def aria_progress(self, torrent, message, done_downloading=False, file=None):
+    def aria_status_changed(self, status: AriaDownloadStatus):
+        # updates reported marker, caller saves it together with status
+        changed = (
+            status.error
+            or status.done
+            or status.reported_progress is None
+            or status.status != status.reported_status
+            or status.progress - status.reported_progress
+            >= float(config.ARIA_PROGRESS_LOG_STEP)
+        )
+        if changed:
+            status.reported_progress = status.progress
+            status.reported_status = status.status
+        return bool(changed)
+
+    def aria_progress(
+        self, torrent, message, done_downloading=False, file=None, save=True
+    ):
+        local_status = None
+        if torrent is None or torrent.local_status_id != self.local_progress.id:
+            local_status = self.local_progress
+        if torrent and local_status and not save:  # caller saves torrent
+            torrent.local_status = local_status
+            local_status = None
         add_log(
             torrent=torrent,
-            local_status=self.local_progress,
+            local_status=local_status,
             message=message,
             level=Level.objects.get_info(),
             source=self.SOURCE,
@@ -200,9 +244,9 @@ class StatusMgr:
             torrent=torrent,
             local_status=self.local_done,
         )
-        from .tasks import exec_action_on_file_task
+        from .tasks import exec_action_on_file_task, enqueue_once
 
-        exec_action_on_file_task.enqueue(torrent.id)
+        enqueue_once(exec_action_on_file_task, torrent.id)
 
     @classmethod
     def get_instance(cls, override=None):
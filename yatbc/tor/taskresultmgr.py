@@ -0,0 +1,134 @@
+from .models import Level, TaskSingleton
+from .commondao import add_log
+import logging
+from datetime import date, timedelta
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from django_tasks.backends.database.models import DBTaskResult, ResultStatus
+from constance import config
+
+# each chunk is removed in own transaction, so sqlite is not locked for long
+DELETE_CHUNK_SIZE = 500
+# free pages returned to file system per cleanup
+VACUUM_PAGES = 2000
+INCREMENTAL_VACUUM = 2  # PRAGMA auto_vacuum value
+FINISHED = [ResultStatus.SUCCEEDED, ResultStatus.FAILED]
+
+
+def delete_task_results(cutoff):
+    deleted = 0
+    # no ordering, so each chunk query can stop at first matching rows
+    old = DBTaskResult.objects.filter(
+        status__in=FINISHED, finished_at__lt=cutoff
+    ).order_by()
+    while True:
+        ids = list(old.values_list("id", flat=True)[:DELETE_CHUNK_SIZE])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            DBTaskResult.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def delete_idle_singletons(cutoff):
+    # rows are created again on next enqueue, so rows of gone torrents don't pile up
+    live = DBTaskResult.objects.filter(
+        status__in=[ResultStatus.READY, ResultStatus.RUNNING]
+    ).values("id")
+    deleted, _ = (
+        TaskSingleton.objects.filter(updated_at__lt=cutoff)
+        .exclude(result_id__in=live)
+        .delete()
+    )
+    return deleted
+
+
+def vacuum_database():
+    logger = logging.getLogger("torbox")
+    if connection.in_atomic_block:
+        logger.warning("Database can't be vacuumed inside transaction")
+        return False
+    table = connection.ops.quote_name(DBTaskResult._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"VACUUM ANALYZE {table}")
+            return True
+        if connection.vendor != "sqlite":
+            return False
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != INCREMENTAL_VACUUM:
+            # full vacuum locks whole database, it is done by enable_incremental_vacuum
+            logger.info(
+                "Sqlite is not in incremental vacuum mode, run enable_incremental_vacuum command"
+            )
+            return False
+        cursor.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+        cursor.fetchall()
+    return True
+
+
+def enable_incremental_vacuum():
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == INCREMENTAL_VACUUM:
+            return False
+        # mode can only be changed by full vacuum, needed once per database
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+    return True
+
+
+def get_task_result_metrics():
+    metrics = {
+        "rows": DBTaskResult.objects.count(),
+        "statuses": {
+            status: count
+            for status, count in DBTaskResult.objects.order_by()
+            .values_list("status")
+            .annotate(count=Count("id"))
+        },
+    }
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("PRAGMA page_size")
+            page_size = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_count")
+            metrics["database_size"] = cursor.fetchone()[0] * page_size
+            cursor.execute("PRAGMA freelist_count")
+            metrics["free_size"] = cursor.fetchone()[0] * page_size
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT pg_total_relation_size(%s)", [DBTaskResult._meta.db_table]
+            )
+            metrics["table_size"] = cursor.fetchone()[0]
+    return metrics
+
+
+def clean_task_results(now=None):
+    logger = logging.getLogger("torbox")
+    if now is None:
+        now = timezone.now()
+    cutoff = now - timedelta(days=int(config.TASK_RESULT_DAYS))
+    deleted = delete_task_results(cutoff)
+    singletons = delete_idle_singletons(cutoff)
+    vacuum_database()
+    metrics = get_task_result_metrics()
+    logger.info(
+        f"Task results removed: {deleted}, idle singletons removed: {singletons}, metrics: {metrics}"
+    )
+    add_log(
+        message=f"Task result cleanup removed: {deleted} results, left: {metrics['rows']}",
+        level=Level.objects.get_info(),
+        source="taskresultmgr",
+    )
+    return deleted
+
+
+def is_task_result_cleanup_due():
+    return (
+        config.NEXT_TASK_RESULT_CLEANUP is None
+        or config.NEXT_TASK_RESULT_CLEANUP <= date.today()
+    )
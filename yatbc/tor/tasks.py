@@ -14,14 +14,26 @@ from .transmissionapi import (
 )
 from .arrmanager import get_next_arrs, process_arr, arrs_to_str
 from .ariaapi import check_local_download_status, exec_action_on_finish
+import hashlib
+import json
 import logging
-from datetime import timedelta
+from dataclasses import replace
+from datetime import date, timedelta
 from django.utils import timezone
-from .models import Torrent
+from .models import Torrent, TaskSingleton
 from django_tasks.backends.database.models import DBTaskResult, ResultStatus
 from .common import TORBOX_CLIENT, TRANSMISSION_CLIENT
+from .commondao import write_transaction
 from django.db.models import Case, When, Value, IntegerField
 from constance import config
+from .httpsession import log_connection_metrics
+from .schedulermgr import (
+    Job,
+    run_due_jobs,
+    reset_jobs,
+    has_active_local_downloads,
+    has_active_remote_downloads,
+)
 
 
 @task(priority=-10)
@@ -142,6 +154,39 @@ def exec_action_on_file_task(torrent_id):
     logger.info("Action on file task done")
 
 
+@task(priority=-1)
+def history_retention_task():
+    from .historymgr import apply_history_retention
+
+    logger = logging.getLogger("torbox")
+    logger.info("Starting history retention")
+    apply_history_retention()
+    config.NEXT_HISTORY_RETENTION = date.today() + timedelta(days=1)
+    logger.info("History retention done")
+
+
+@task(priority=-1)
+def log_retention_task():
+    from .logmgr import prune_logs
+
+    logger = logging.getLogger("torbox")
+    logger.info("Starting log retention")
+    prune_logs()
+    config.NEXT_LOG_RETENTION = date.today() + timedelta(days=1)
+    logger.info("Log retention done")
+
+
+@task(priority=-1)
+def task_result_cleanup_task():
+    from .taskresultmgr import clean_task_results
+
+    logger = logging.getLogger("torbox")
+    logger.info("Starting task result cleanup")
+    clean_task_results()
+    config.NEXT_TASK_RESULT_CLEANUP = date.today() + timedelta(days=1)
+    logger.info("Task result cleanup done")
+
+
 @task(priority=-1)  # process in free time, to not spam
 def process_arr_task(arr_id: int):
     logger = logging.getLogger("torbox")
@@ -186,116 +231,184 @@ def get_tasks(exclude_tasks_type=[], status=[]):
     return query
 
 
-def get_task(task_type, status):
-    query = DBTaskResult.objects.filter(task_path=task_type, status__in=status)[:1]
-    if len(query) > 0:
-        return query[0]
-    return None
+def get_args_hash(args, kwargs):
+    return hashlib.sha256(
+        json.dumps([args, kwargs], sort_keys=True, default=str).encode()
+    ).hexdigest()
 
 
-def get_task_queued_or_running(task_type):
-    return get_task(
-        task_type=task_type, status=[ResultStatus.READY, ResultStatus.RUNNING]
+def lock_singleton(task, args, kwargs):
+    singleton, _ = TaskSingleton.objects.select_for_update().get_or_create(
+        task_path=task.module_path, args_hash=get_args_hash(args, kwargs)
     )
+    return singleton
 
 
-not_status_checking = ["tor.tasks.schedule_tasks", "tor.tasks.schedule_arrs_tasks"]
+def enqueue_singleton(singleton, task, *args, **kwargs):
+    logger = logging.getLogger("torbox")
+    logger.info(f"Queuing: {task.module_path}")
+    result = replace(task, enqueue_on_commit=False).enqueue(*args, **kwargs)
+    singleton.result_id = result.id
+    singleton.save(update_fields=["result_id", "updated_at"])
+    return result
 
 
-def queue_transmission_status():
+def enqueue_once(task, *args, **kwargs):
     logger = logging.getLogger("torbox")
-    task_type = "tor.tasks.transmission_status_task"
-    result = get_task_queued_or_running(task_type)
-    if not result:
-        logger.info(f"Queuing: {task_type}")
-        return transmission_status_task.enqueue()
-    else:
-        logger.debug(f"Task {task_type} is already queued or running: {result}")
-        return result
+    # unique task_path/args_hash row is locked, so check and enqueue is one step
+    with write_transaction():
+        singleton = lock_singleton(task, args, kwargs)
+        if singleton.result_id:
+            result = DBTaskResult.objects.filter(
+                id=singleton.result_id,
+                status__in=[ResultStatus.READY, ResultStatus.RUNNING],
+            ).first()
+            if result:
+                logger.debug(
+                    f"Task {task.module_path} is already queued or running: {result}"
+                )
+                return result
+        return enqueue_singleton(singleton, task, *args, **kwargs)
+
+
+def reschedule(task, run_after):
+    # enqueued even when task is running, used by task to schedule itself again
+    with write_transaction():
+        singleton = lock_singleton(task, (), {})
+        pending = None
+        if singleton.result_id:
+            pending = DBTaskResult.objects.filter(
+                id=singleton.result_id, status=ResultStatus.READY
+            ).first()
+        if pending:
+            # next run of the chain is already queued, so no second chain is started
+            if pending.run_after is None or pending.run_after > run_after:
+                pending.run_after = run_after
+                pending.save(update_fields=["run_after"])
+            return pending
+        return enqueue_singleton(singleton, task.using(run_after=run_after))
+
+
+not_status_checking = [
+    "tor.tasks.schedule_tasks",
+    "tor.tasks.schedule_arrs_tasks",
+    "tor.tasks.history_retention_task",
+    "tor.tasks.log_retention_task",
+    "tor.tasks.task_result_cleanup_task",
+]
+
+
+def queue_transmission_status():
+    return enqueue_once(transmission_status_task)
 
 
 def queue_schedule_arrs_tasks():
-    logger = logging.getLogger("torbox")
-    task_type = "tor.tasks.schedule_arrs_tasks"
-    result = get_task_queued_or_running(task_type)
-    if not result:
-        logger.info(f"Queuing: {task_type}")
-        return schedule_arrs_tasks.enqueue()
-    else:
-        logger.debug(f"Task {task_type} is already queued or running: {result}")
-        return result
+    return enqueue_once(schedule_arrs_tasks)
 
 
 def queue_torbox_status():
-    logger = logging.getLogger("torbox")
-    task_type = "tor.tasks.torbox_status_task"
-    result = get_task_queued_or_running(task_type)
-    if not result:
-        logger.info(f"Queuing: {task_type}")
-        return torbox_status_task.enqueue()
-    else:
-        logger.debug(f"Task {task_type} is already queued or running: {result}")
-        return result
+    return enqueue_once(torbox_status_task)
 
 
 def queue_check_local_download_status():
-    logger = logging.getLogger("torbox")
-    task_type = "tor.tasks.check_local_download_status_task"
-    result = get_task_queued_or_running(task_type)
-    if not result:
-        logger.info(f"Queuening: {task_type}")
-        return check_local_download_status_task.enqueue()
-    else:
-        logger.debug(f"Task {task_type} is already queued or running: {result}")
-        return result
+    return enqueue_once(check_local_download_status_task)
 
 
 def queue_scheduler():
-    logger = logging.getLogger("torbox")
-    task_type = "tor.tasks.schedule_tasks"
-    result = get_task_queued_or_running(task_type)
-    if not result:
-        logger.info(f"Scheduling task: {task_type}")
-        return schedule_tasks.enqueue()
-    else:
-        logger.debug(f"Task {task_type} is already queued or running: {result}")
-        return result
+    return enqueue_once(schedule_tasks)
 
 
 def queue_import_from_queue_folders():
-    logger = logging.getLogger("torbox")
-    task_type = "tor.tasks.import_form_queue_folders_task"
-    result = get_task_queued_or_running(task_type)
-    if not result:
-        logger.info(f"Scheduling task: {task_type}")
-        return import_form_queue_folders_task.enqueue()
-    else:
-        logger.debug(f"Task {task_type} is already queued or running: {result}")
-        return result
+    return enqueue_once(import_form_queue_folders_task)
 
 
 def queue_process_queue():
-    logger = logging.getLogger("torbox")
-    task_type = "tor.tasks.process_queue_task"
-    result = get_task_queued_or_running(task_type)
-    if not result:
-        logger.info(f"Scheduling task: {task_type}")
-        return process_queue_task.enqueue()
-    else:
-        logger.debug(f"Task {task_type} is already queued or running: {result}")
-        return result
+    return enqueue_once(process_queue_task)
+
+
+def queue_history_retention():
+    from .historymgr import is_history_retention_due
+
+    if not is_history_retention_due():
+        return None
+    return enqueue_once(history_retention_task)
+
+
+def queue_log_retention():
+    from .logmgr import is_log_retention_due
+
+    if not is_log_retention_due():
+        return None
+    return enqueue_once(log_retention_task)
+
+
+def queue_task_result_cleanup():
+    from .taskresultmgr import is_task_result_cleanup_due
+
+    if not is_task_result_cleanup_due():
+        return None
+    return enqueue_once(task_result_cleanup_task)
+
+
+SCHEDULED_JOBS = [
+    Job(
+        name="check_local_download_status",
+        run=queue_check_local_download_status,
+        active_interval=20,
+        idle_interval=60,
+        max_interval=600,
+        is_active=has_active_local_downloads,
+    ),
+    Job(
+        name="torbox_status",
+        run=queue_torbox_status,
+        active_interval=30,
+        idle_interval=60,
+        max_interval=600,
+        is_active=lambda: has_active_remote_downloads(TORBOX_CLIENT),
+    ),
+    Job(
+        name="transmission_status",
+        run=queue_transmission_status,
+        active_interval=30,
+        idle_interval=60,
+        max_interval=600,
+        is_active=lambda: has_active_remote_downloads(TRANSMISSION_CLIENT),
+        is_enabled=lambda: config.USE_TRANSMISSION,
+    ),
+    Job(
+        name="import_from_queue_folders",
+        run=queue_import_from_queue_folders,
+        idle_interval=600,
+    ),
+    Job(name="process_queue", run=queue_process_queue, idle_interval=600),
+    Job(name="schedule_arrs", run=queue_schedule_arrs_tasks, idle_interval=600),
+    Job(name="history_retention", run=queue_history_retention, idle_interval=3600),
+    Job(name="log_retention", run=queue_log_retention, idle_interval=3600),
+    Job(
+        name="task_result_cleanup",
+        run=queue_task_result_cleanup,
+        idle_interval=3600,
+    ),
+    Job(name="connection_metrics", run=log_connection_metrics, idle_interval=600),
+]
+
+
+def wake_scheduler():
+    reset_jobs(SCHEDULED_JOBS)
+    now = timezone.now()
+    DBTaskResult.objects.filter(
+        task_path="tor.tasks.schedule_tasks",
+        status=ResultStatus.READY,
+        run_after__gt=now,
+    ).update(run_after=now)
+    return queue_scheduler()
 
 
 @task()
 def schedule_tasks():
-    start_time = timezone.now()
-    start_time += timedelta(minutes=10)
     logger = logging.getLogger("torbox")
-    logger.info(f"Scheduling tasks every 10 min")
-    check_status()
-    queue_import_from_queue_folders()
-    queue_process_queue()
-    queue_schedule_arrs_tasks()
-    next_schedule = schedule_tasks.using(run_after=start_time)
-    next_schedule.enqueue()
-    logger.info("Scheduling done")
+    logger.info("Scheduling due jobs")
+    next_run = run_due_jobs(SCHEDULED_JOBS)
+    reschedule(schedule_tasks, run_after=next_run)
+    logger.info(f"Scheduling done, next run: {next_run}")
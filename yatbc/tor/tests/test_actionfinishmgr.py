@@ -13,6 +13,8 @@ from ..actiononfinishmgr import (
     ActionNothing,
     ActionCopy,
     ActionMove,
+    ActionHardlink,
+    ActionReflink,
     normalize_movie_series_file_name,
     get_metadata_by_file,
     get_metadata_by_search,
@@ -21,8 +23,10 @@ from ..actiononfinishmgr import (
     find_season_dir,
 )
 from ..statusmgr import StatusMgr
+from ..copymgr import copy_file, VerificationError
 from unittest.mock import patch, Mock
 import shutil
+import hashlib
 from pathlib import Path
 import logging
 from .temp_settings import console_logging_config
@@ -104,7 +108,9 @@ class ActionMgrTests(TestCase):
             torrent = create_torrent(torrent_type)
         else:
             torrent = old_torrent
-        file = create_torrent_file(torrent, aria=aria, name=temp_file.name)
+        file = create_torrent_file(
+            torrent, aria=aria, name=temp_file.name, size=temp_file.stat().st_size
+        )
         return file, temp_file, work_dir
 
     def test_find_season_dir(self):
@@ -264,6 +270,147 @@ class ActionMgrTests(TestCase):
         self.assertTrue(isinstance(action, ActionMove))
         shutil.rmtree(work_dir)
 
+    def test_action_factory_links(self):
+        self.other.action_on_finish = TorrentType.ACTION_HARDLINK
+        self.other.save()
+        file, temp_file, work_dir = self._prepare_test(self.other)
+        factory = ActionFactory()
+        action = factory.create_action(
+            torrent=file.torrent, torrent_dir="", files=[file]
+        )
+        self.assertTrue(isinstance(action, ActionHardlink))
+
+        self.other.action_on_finish = TorrentType.ACTION_REFLINK
+        self.other.save()
+        file.torrent.refresh_from_db()
+        action = factory.create_action(
+            torrent=file.torrent, torrent_dir="", files=[file]
+        )
+        self.assertTrue(isinstance(action, ActionReflink))
+        shutil.rmtree(work_dir)
+
+    def test_copy_error_in_one_file(self):
+        self.other.target_dir = "target"
+        self.other.save()
+        file, temp_file, work_dir = self._prepare_test(self.other)
+        file2, temp_file2, _ = self._prepare_test(
+            self.other,
+            file_name="test2.txt",
+            old_torrent=file.torrent,
+            work_dir=work_dir,
+        )
+        target = create_work_dir(self.other.target_dir)
+
+        def fail_first(source, target, progress=None, md5=None):
+            if source.name == temp_file.name:
+                raise OSError("Disk error")
+            return copy_file(source, target, progress, md5)
+
+        with patch(
+            "tor.actiononfinishmgr.copy_file", side_effect=fail_first
+        ), self.assertRaises(OSError):
+            ActionMgr().run(file.torrent)
+
+        file.refresh_from_db()
+        file2.refresh_from_db()
+        file.torrent.refresh_from_db()
+        self.assertEqual(len(list(target.rglob(temp_file2.name))), 1)
+        self.assertEqual(len(list(target.rglob(temp_file.name))), 0)
+        self.assertFalse(file.action_on_finish_done)
+        self.assertFalse(file2.action_on_finish_done)
+        self.assertEqual(file.torrent.local_status, self.status_mgr.finish_error)
+        shutil.rmtree(target)
+        shutil.rmtree(work_dir)
+
+    def test_copy_verified(self):
+        self.other.target_dir = "target"
+        self.other.save()
+        file, temp_file, work_dir = self._prepare_test(self.other)
+        file2, _, _ = self._prepare_test(
+            self.other,
+            file_name="test2.txt",
+            old_torrent=file.torrent,
+            work_dir=work_dir,
+        )
+        file.md5 = hashlib.md5(temp_file.read_bytes()).hexdigest()
+        file.save()
+        target = create_work_dir(self.other.target_dir)
+
+        ActionMgr().run(file.torrent)
+
+        file.refresh_from_db()
+        file2.refresh_from_db()
+        self.assertTrue(file.verified)
+        self.assertTrue(file.action_on_finish_done)
+        self.assertFalse(file2.verified)  # copied, but there was no md5
+        self.assertTrue(file2.action_on_finish_done)
+        shutil.rmtree(target)
+        shutil.rmtree(work_dir)
+
+    def test_link_not_verified(self):
+        self.other.target_dir = "target"
+        self.other.action_on_finish = TorrentType.ACTION_HARDLINK
+        self.other.save()
+        file, temp_file, work_dir = self._prepare_test(self.other)
+        file.md5 = hashlib.md5(temp_file.read_bytes()).hexdigest()
+        file.save()
+        target = create_work_dir(self.other.target_dir)
+
+        ActionMgr().run(file.torrent)
+
+        file.refresh_from_db()
+        self.assertTrue(file.action_on_finish_done)
+        self.assertFalse(file.verified)  # linked, so no digest was compared
+        shutil.rmtree(target)
+        shutil.rmtree(work_dir)
+
+    def test_copy_verification_failed(self):
+        self.other.target_dir = "target"
+        self.other.save()
+        file, temp_file, work_dir = self._prepare_test(self.other)
+        file2, temp_file2, _ = self._prepare_test(
+            self.other,
+            file_name="test2.txt",
+            old_torrent=file.torrent,
+            work_dir=work_dir,
+        )
+        file.md5 = hashlib.md5(b"other").hexdigest()
+        file.save()
+        file2.size += 1
+        file2.save()
+        target = create_work_dir(self.other.target_dir)
+
+        with self.assertRaises(VerificationError):
+            ActionMgr().run(file.torrent)
+
+        file.refresh_from_db()
+        file2.refresh_from_db()
+        file.torrent.refresh_from_db()
+        self.assertEqual(list(target.rglob("*test*")), [])
+        self.assertFalse(file.verified)
+        self.assertFalse(file2.verified)
+        self.assertFalse(file.action_on_finish_done)
+        self.assertEqual(file.torrent.local_status, self.status_mgr.finish_error)
+        shutil.rmtree(target)
+        shutil.rmtree(work_dir)
+
+    def test_hardlink(self):
+        self.other.action_on_finish = TorrentType.ACTION_HARDLINK
+        self.other.target_dir = "target"
+        self.other.save()
+        file, temp_file, work_dir = self._prepare_test(self.other)
+        target = create_work_dir(self.other.target_dir)
+
+        ActionMgr().run(file.torrent)
+
+        file.refresh_from_db()
+        linked = list(target.rglob(temp_file.name))
+        self.assertEqual(len(linked), 1)
+        self.assertTrue(linked[0].samefile(temp_file))
+        self.assertTrue(file.action_on_finish_done)
+        shutil.rmtree(target)
+        shutil.rmtree(work_dir)
+
     def test_move_series_new_dir(self):
         file, temp_file, work_dir = self._prepare_test(
             self.movie_series, file_name="test.mp4"
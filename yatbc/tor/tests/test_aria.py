@@ -1,14 +1,22 @@
 from django.test import TestCase, override_settings
-from ..models import Torrent, TorrentFile, TorrentType, AriaDownloadStatus
+from ..models import Torrent, TorrentFile, TorrentType, AriaDownloadStatus, ErrorLog
 from ..ariaapi import (
     calculate_progress,
     exec_action_on_finish,
     update_status,
+    update_statuses,
+    check_local_download_status,
+    AriaApi,
 )
 import unittest
 import json
+import shutil
+import tempfile
 from pathlib import Path
 import logging
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ..statusmgr import StatusMgr
 from .temp_settings import console_logging_config
 from .utils import create_torrent, create_torrent_file
 
@@ -27,8 +35,7 @@ class AriaApiTests(TestCase):
 
     def setUp(self):
         logging.config.dictConfig(console_logging_config)
-        self.test_data_dir = Path("test_data")
-        self.test_data_dir.mkdir(exist_ok=True)
+        self.test_data_dir = Path(tempfile.mkdtemp(prefix="yatbc_aria_test_"))
         self.target_dir = self.test_data_dir / "target"
         self.target_dir.mkdir(exist_ok=True)
         self.source_dir = self.test_data_dir / "source"
@@ -36,6 +43,7 @@ class AriaApiTests(TestCase):
         self.test_file = self.source_dir / "test.txt"
         with open(self.test_file, "w") as f:
             f.write("This is a test file for AriaAPI tests.")
+        self.addCleanup(shutil.rmtree, self.test_data_dir, ignore_errors=True)
         self.test_type = TorrentType.objects.create(
             name="Test",
             action_on_finish=TorrentType.ACTION_COPY,
@@ -57,7 +65,39 @@ class AriaApiTests(TestCase):
         self.all_done_progress = [1, 1, 1]
         for progress in self.all_done_progress:
             aria = self._create_aria(progress, done=progress == 1)
-            create_torrent_file(aria=aria, torrent=self.all_done_torrent)
+            create_torrent_file(
+                aria=aria,
+                torrent=self.all_done_torrent,
+                size=self.test_file.stat().st_size,
+            )
+
+    def test_download_files_in_one_multicall(self):
+        session = unittest.mock.Mock()
+        session.post.return_value = unittest.mock.Mock(
+            ok=True,
+            content=json.dumps(
+                {"result": [["gid1"], {"code": 1, "message": "error"}]}
+            ),
+        )
+        api = AriaApi(host="aria", port=6800, secret="secret")
+
+        with unittest.mock.patch("tor.ariaapi.get_session", return_value=session):
+            ok, ids = api.download_files(
+                [("http://1", "one.mkv", "/dir"), ("http://2", "two.mkv", "/dir")]
+            )
+
+        self.assertTrue(ok)
+        self.assertEqual(ids, ["gid1", None])
+        session.post.assert_called_once()
+        query = json.loads(session.post.call_args.kwargs["data"])
+        self.assertEqual(query["method"], "system.multicall")
+        self.assertEqual(
+            [call["params"][1:] for call in query["params"][0]],
+            [
+                [["http://1"], {"dir": "/dir", "out": "one.mkv"}],
+                [["http://2"], {"dir": "/dir", "out": "two.mkv"}],
+            ],
+        )
 
     def test_minimal_progress(self):
         files = TorrentFile.objects.filter(torrent=self.minimal_progress_torrent)
@@ -116,6 +156,115 @@ class AriaApiTests(TestCase):
         aria = AriaDownloadStatus.objects.get(internal_id=aria_id)
         self.assertAlmostEqual(aria.progress, 0.09166666)
 
+    def test_ok_update_statuses_in_one_call(self):
+        first = AriaDownloadStatus.objects.create(
+            path="/aria2/a.a", internal_id="1", status=""
+        )
+        second = AriaDownloadStatus.objects.create(
+            path="/aria2/b.b", internal_id="2", status=""
+        )
+        create_torrent_file(self.minimal_progress_torrent, aria=first)
+        create_torrent_file(self.minimal_progress_torrent, aria=second)
+        api = unittest.mock.Mock()
+        api.tellStatusBatch.return_value = (
+            True,
+            [
+                {
+                    "gid": "1",
+                    "status": "active",
+                    "completedLength": "30",
+                    "totalLength": "120",
+                    "files": [{"path": "/aria2/a.a"}],
+                },
+                {
+                    "gid": "2",
+                    "status": "complete",
+                    "completedLength": "120",
+                    "totalLength": "120",
+                    "files": [{"path": "/aria2/b.b"}],
+                },
+            ],
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            update_statuses([first, second], api=api)
+
+        api.tellStatusBatch.assert_called_once_with(["1", "2"])
+        torrent_updates = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "tor_torrent"')
+        ]
+        self.assertEqual(len(torrent_updates), 1)
+        self.minimal_progress_torrent.refresh_from_db()
+        self.assertEqual(
+            self.minimal_progress_torrent.local_status,
+            StatusMgr.get_instance().local_progress,
+        )
+        api.tellStatus.assert_not_called()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertAlmostEqual(first.progress, 0.25)
+        self.assertFalse(first.done)
+        self.assertTrue(second.done)
+        self.assertIsNotNone(second.finished_at)
+
+    def test_update_statuses_logs_only_changes(self):
+        aria = AriaDownloadStatus.objects.create(
+            path="/aria2/a.a", internal_id="1", status=""
+        )
+        create_torrent_file(self.minimal_progress_torrent, aria=aria)
+        api = unittest.mock.Mock()
+
+        def poll(completed):
+            api.tellStatusBatch.return_value = (
+                True,
+                [
+                    {
+                        "gid": "1",
+                        "status": "active",
+                        "completedLength": str(completed),
+                        "totalLength": "100",
+                        "files": [{"path": "/aria2/a.a"}],
+                    }
+                ],
+            )
+            statuses = list(AriaDownloadStatus.objects.filter(id=aria.id))
+            update_statuses(statuses, api=api)
+            return ErrorLog.objects.filter(message__contains="Aria download updated")
+
+        self.assertEqual(poll(10).count(), 1)
+        self.assertEqual(poll(15).count(), 1)
+        self.assertEqual(poll(25).count(), 2)
+        aria.refresh_from_db()
+        self.assertEqual(aria.reported_progress, 0.25)
+
+    def test_update_statuses_with_failed_entry(self):
+        aria = AriaDownloadStatus.objects.create(
+            path="/aria2/a.a", internal_id="1", status=""
+        )
+        api = unittest.mock.Mock()
+        api.tellStatusBatch.return_value = (True, [None])
+
+        update_statuses([aria], api=api)
+
+        aria.refresh_from_db()
+        self.assertEqual(aria.progress, 0)
+        self.assertFalse(aria.done)
+
+    def test_check_local_download_status_updates_progress(self):
+        AriaDownloadStatus.objects.filter(done=False).update(error="stopped")
+        api = unittest.mock.Mock()
+
+        check_local_download_status(api=api)
+
+        api.tellStatusBatch.assert_not_called()
+        self.minimal_progress_torrent.refresh_from_db()
+        self.assertAlmostEqual(
+            self.minimal_progress_torrent.local_download_progress,
+            sum(self.minimal_progress) / len(self.minimal_progress),
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -35,6 +35,14 @@ class CommonDaoTests(TestCase):
         result = get_active_torrents_with_current_history()
         self.assertEqual(len(result), 6)
 
+    def test_add_torrent_history_keeps_newest(self):
+        torrent = create_torrent(TorrentType.objects.get_no_type())
+        newest = create_history(torrent, updated_at="2024-01-02 10:00")
+        create_history(torrent, updated_at="2024-01-01 10:00")
+
+        torrent.refresh_from_db()
+        self.assertEqual(torrent.latest_history_id, newest.id)
+
     def test_get_active_torrents_days_ago(self):
         Torrent.objects.all().delete()
         days = timezone.now() - timezone.timedelta(days=5)
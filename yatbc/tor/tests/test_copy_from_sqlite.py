@@ -0,0 +1,87 @@
+from django.core.management import call_command, CommandError
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from ..models import Torrent, TorrentType, TorrentHistory, ErrorLog, Level
+from ..management.commands.copy_from_sqlite import (
+    SOURCE_ALIAS,
+    add_source_connection,
+    remove_source_connection,
+    get_copied_models,
+    copy_model,
+)
+from io import StringIO
+from pathlib import Path
+from datetime import timedelta
+import tempfile
+import unittest
+import logging
+from .temp_settings import console_logging_config
+from .utils import create_torrent, create_history
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class CopyFromSqliteTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = Path(self.temp_dir.name) / "db.sqlite3"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _create_source(self):
+        source = add_source_connection(self.source)
+        with source.schema_editor() as editor:
+            for model in get_copied_models():
+                editor.create_model(model)
+        recorder = MigrationRecorder(source)
+        recorder.ensure_schema()
+        applied = MigrationRecorder(connections["default"]).applied_migrations()
+        for app, name in applied:
+            recorder.record_applied(app, name)
+        with transaction.atomic(using=SOURCE_ALIAS):
+            for model in get_copied_models():
+                copy_model(model, "default", SOURCE_ALIAS, 100)
+        remove_source_connection()
+
+    def test_copy_replaces_target_data(self):
+        torrent = create_torrent(TorrentType.objects.get_no_type())
+        history = create_history(torrent)
+        created_at = timezone.now() - timedelta(days=10)
+        log = ErrorLog.objects.create(
+            message="old", level=Level.objects.get_info(), created_at=created_at
+        )
+        self._create_source()
+        Torrent.objects.all().delete()
+        ErrorLog.objects.create(message="new", level=Level.objects.get_info())
+
+        out = StringIO()
+        call_command(
+            "copy_from_sqlite", source=str(self.source), chunk_size=1, stdout=out
+        )
+
+        self.assertIn("tor.Torrent: 1", out.getvalue())
+        torrent = Torrent.objects.get(id=torrent.id)
+        self.assertEqual(torrent.latest_history, history)
+        self.assertEqual(list(TorrentHistory.objects.all()), [history])
+        self.assertEqual(list(ErrorLog.objects.all()), [log])
+        self.assertEqual(ErrorLog.objects.get().created_at, created_at)
+        self.assertGreater(Level.objects.count(), 0)
+
+    def test_not_migrated_source(self):
+        self._create_source()
+        source = add_source_connection(self.source)
+        MigrationRecorder(source).record_unapplied("tor", "0001_initial")
+        remove_source_connection()
+
+        with self.assertRaises(CommandError):
+            call_command(
+                "copy_from_sqlite", source=str(self.source), stdout=StringIO()
+            )
+        self.assertTrue(Level.objects.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
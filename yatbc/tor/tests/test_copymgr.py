@@ -0,0 +1,246 @@
+from django.test import TestCase, override_settings
+from ..copymgr import (
+    copy_file,
+    move_file,
+    copy_stream,
+    link_file,
+    reflink_file,
+    device_slot,
+    get_device,
+    ProgressTracker,
+    get_temp_path,
+    get_checkpoint_path,
+    write_checkpoint,
+    user_copy,
+    VerificationError,
+)
+from unittest.mock import patch
+import errno
+import hashlib
+import json
+import threading
+import time
+import os
+import shutil
+import logging
+from .temp_settings import console_logging_config
+from .utils import create_work_dir
+
+
+def write_data(path, size):
+    data = bytes(i % 251 for i in range(size))
+    with open(path, "wb") as file:
+        file.write(data)
+    return data
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class CopyMgrTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        self.work_dir = create_work_dir("./copy_test/")
+        self.source = self.work_dir / "source.bin"
+        self.target = self.work_dir / "target.bin"
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def read(self, path):
+        with open(path, "rb") as file:
+            return file.read()
+
+    @patch("tor.copymgr.CHUNK_SIZE", 1000)
+    def test_copy_in_chunks_with_progress(self):
+        data = write_data(self.source, 4500)
+        reports = []
+
+        copied = copy_file(self.source, self.target, lambda *args: reports.append(args))
+
+        self.assertEqual(copied, 4500)
+        self.assertEqual(self.read(self.target), data)
+        self.assertEqual(
+            [copied for copied, _ in reports], [1000, 2000, 3000, 4000, 4500]
+        )
+        self.assertTrue(self.source.exists())
+
+    def test_fallback_to_next_method(self):
+        data = write_data(self.source, 3000)
+        error = OSError(errno.EXDEV, "Cross device")
+        with patch("tor.copymgr.kernel_copy", side_effect=error), patch(
+            "tor.copymgr.send_copy", return_value=0
+        ):
+            copy_file(self.source, self.target)
+        self.assertEqual(self.read(self.target), data)
+
+    def test_other_errors_raised(self):
+        write_data(self.source, 3000)
+        error = OSError(errno.ENOSPC, "No space")
+        with patch("tor.copymgr.kernel_copy", side_effect=error), self.assertRaises(
+            OSError
+        ):
+            copy_file(self.source, self.target)
+
+    def test_short_source_raises(self):
+        write_data(self.source, 100)
+        with open(self.source, "rb") as source, open(self.target, "wb") as target:
+            with self.assertRaises(OSError):
+                copy_stream(source.fileno(), target.fileno(), 200)
+
+    def test_move_same_device(self):
+        data = write_data(self.source, 3000)
+        move_file(self.source, self.target)
+        self.assertFalse(self.source.exists())
+        self.assertEqual(self.read(self.target), data)
+
+    def test_move_other_device(self):
+        data = write_data(self.source, 3000)
+        os.chmod(self.source, 0o640)
+        with patch("tor.copymgr.os.rename", side_effect=OSError(errno.EXDEV, "")):
+            move_file(self.source, self.target)
+        self.assertFalse(self.source.exists())
+        self.assertEqual(self.read(self.target), data)
+        self.assertEqual(os.stat(self.target).st_mode & 0o777, 0o640)
+
+    def test_link_same_device(self):
+        write_data(self.source, 3000)
+        self.assertTrue(link_file(self.source, self.target))
+        self.assertTrue(self.target.samefile(self.source))
+
+    def test_link_falls_back_to_copy(self):
+        data = write_data(self.source, 3000)
+        with patch("tor.copymgr.os.link", side_effect=OSError(errno.EXDEV, "")):
+            self.assertFalse(link_file(self.source, self.target))
+        self.assertFalse(self.target.samefile(self.source))
+        self.assertEqual(self.read(self.target), data)
+
+    def test_reflink(self):
+        write_data(self.source, 3000)
+        with patch("tor.copymgr.fcntl") as fcntl:
+            self.assertTrue(reflink_file(self.source, self.target))
+        fcntl.ioctl.assert_called_once()
+
+    def test_reflink_falls_back_to_copy(self):
+        data = write_data(self.source, 3000)
+        with patch("tor.copymgr.fcntl") as fcntl:
+            fcntl.ioctl.side_effect = OSError(errno.EOPNOTSUPP, "")
+            self.assertFalse(reflink_file(self.source, self.target))
+        self.assertEqual(self.read(self.target), data)
+
+    @patch("tor.copymgr.MAX_OPERATIONS_PER_DEVICE", 2)
+    @patch.dict("tor.copymgr._device_slots", clear=True)
+    def test_device_slot_limits_operations(self):
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def operation():
+            with device_slot(self.work_dir, self.source.parent):
+                with lock:
+                    running.append(1)
+                    max_running.append(len(running))
+                time.sleep(0.05)
+                with lock:
+                    running.pop()
+
+        threads = [threading.Thread(target=operation) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(max_running), 2)
+
+    def test_device_of_missing_dir(self):
+        self.assertEqual(
+            get_device(self.work_dir / "not" / "created"), get_device(self.work_dir)
+        )
+
+    def test_progress_tracker(self):
+        tracker = ProgressTracker(300)
+        first = tracker.file_progress(1)
+        first(50, 100)
+        first(100, 100)
+        tracker.file_progress(2)(120, 200)
+        self.assertEqual(tracker.get_copied(), 220)
+
+    @patch("tor.copymgr.CHUNK_SIZE", 1000)
+    @patch("tor.copymgr.CHECKPOINT_SIZE", 2000)
+    def test_interrupted_copy_resumed(self):
+        data = write_data(self.source, 5500)
+        calls = []
+
+        def crash_after_checkpoint(source_fd, target_fd, count):
+            if len(calls) == 3:
+                raise OSError(errno.EIO, "Worker restarted")
+            calls.append(count)
+            return user_copy(source_fd, target_fd, count)
+
+        with patch(
+            "tor.copymgr.get_copy_methods", return_value=[crash_after_checkpoint]
+        ), self.assertRaises(OSError):
+            copy_file(self.source, self.target)
+        temp = get_temp_path(self.target)
+        checkpoint = get_checkpoint_path(temp)
+        self.assertFalse(self.target.exists())
+        self.assertEqual(json.loads(checkpoint.read_text())["offset"], 2000)
+
+        reports = []
+        copy_file(self.source, self.target, lambda *args: reports.append(args))
+
+        self.assertEqual(self.read(self.target), data)
+        self.assertEqual(reports[0], (3000, 5500))
+        self.assertFalse(temp.exists())
+        self.assertFalse(checkpoint.exists())
+
+    def test_copy_resumed_from_checkpoint_only(self):
+        data = write_data(self.source, 3000)
+        temp = get_temp_path(self.target)
+        # tail after checkpoint could be lost on crash, so it is copied again
+        with open(temp, "wb") as file:
+            file.write(b"x" * 1000 + data[1000:2500])
+        write_checkpoint(get_checkpoint_path(temp), os.stat(self.source), 1000)
+
+        copy_file(self.source, self.target)
+
+        self.assertEqual(self.read(self.target), b"x" * 1000 + data[1000:])
+
+    def test_changed_source_not_resumed(self):
+        data = write_data(self.source, 3000)
+        temp = get_temp_path(self.target)
+        with open(temp, "wb") as file:
+            file.write(b"x" * 1000)
+        stat = os.stat(self.source)
+        write_checkpoint(get_checkpoint_path(temp), stat, 1000)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        copy_file(self.source, self.target)
+
+        self.assertEqual(self.read(self.target), data)
+
+    def test_copy_verified_with_md5(self):
+        data = write_data(self.source, 3000)
+        with patch("tor.copymgr.kernel_copy") as kernel_copy:
+            copy_file(self.source, self.target, md5=hashlib.md5(data).hexdigest())
+        kernel_copy.assert_not_called()  # hashed while copied, no second read
+        self.assertEqual(self.read(self.target), data)
+
+    def test_md5_mismatch(self):
+        write_data(self.source, 3000)
+        with self.assertRaises(VerificationError):
+            copy_file(self.source, self.target, md5=hashlib.md5(b"other").hexdigest())
+        self.assertFalse(self.target.exists())
+        self.assertFalse(get_temp_path(self.target).exists())
+
+    @patch("tor.copymgr.CHUNK_SIZE", 1000)
+    @patch("tor.copymgr.CHECKPOINT_SIZE", 1000)
+    def test_resumed_copy_verified_with_md5(self):
+        data = write_data(self.source, 3000)
+        temp = get_temp_path(self.target)
+        with open(temp, "wb") as file:
+            file.write(b"x" * 1000)
+        write_checkpoint(get_checkpoint_path(temp), os.stat(self.source), 1000)
+
+        with self.assertRaises(VerificationError):
+            copy_file(self.source, self.target, md5=hashlib.md5(data).hexdigest())
+
+        copy_file(self.source, self.target, md5=hashlib.md5(data).hexdigest())
+        self.assertEqual(self.read(self.target), data)
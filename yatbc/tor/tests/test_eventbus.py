@@ -0,0 +1,141 @@
+from django.test import TestCase, TransactionTestCase, override_settings
+from ..models import TaskEvent
+from ..eventbus import (
+    EventListener,
+    TaskActivity,
+    publish,
+    publish_torrent_changed,
+)
+from .. import eventbus
+import unittest
+from asgiref.sync import sync_to_async
+from pathlib import Path
+import tempfile
+import time
+import uuid
+import logging
+from .temp_settings import console_logging_config
+
+TEST_EVENT_BUS_FILE = Path(tempfile.gettempdir()) / "yatbc_test_events.seq"
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class TaskActivityTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        self.id = uuid.uuid4()
+
+    def _event(self, event, task_path="tor.tasks.torbox_status_task", task_id=None):
+        return TaskEvent(event=event, task_path=task_path, task_id=task_id or self.id)
+
+    def test_idle(self):
+        activity = TaskActivity()
+        self.assertTrue(activity.is_idle())
+        self.assertEqual(activity.on_timeout(), [{"status": "NoTasks"}])
+
+    def test_task_started_and_finished(self):
+        activity = TaskActivity()
+        self.assertEqual(activity.apply(self._event(TaskEvent.ENQUEUED)), [])
+        self.assertEqual(
+            activity.apply(self._event(TaskEvent.STARTED)),
+            [{"status": "TaskStillWorking", "task": "tor.tasks.torbox_status_task"}],
+        )
+        self.assertEqual(
+            activity.apply(self._event(TaskEvent.FINISHED)), [{"status": "Update"}]
+        )
+        self.assertTrue(activity.is_idle())
+
+    def test_no_update_while_other_task_running(self):
+        activity = TaskActivity(running=[(uuid.uuid4(), "tor.tasks.other")])
+        activity.apply(self._event(TaskEvent.STARTED))
+        self.assertEqual(activity.apply(self._event(TaskEvent.FINISHED)), [])
+
+    def test_parallel_runs_of_same_task(self):
+        other = uuid.uuid4()
+        activity = TaskActivity()
+        activity.apply(self._event(TaskEvent.STARTED))
+        activity.apply(self._event(TaskEvent.STARTED, task_id=other))
+
+        self.assertEqual(activity.apply(self._event(TaskEvent.FINISHED)), [])
+        self.assertFalse(activity.is_idle())
+        self.assertEqual(
+            activity.apply(self._event(TaskEvent.FINISHED, task_id=other)),
+            [{"status": "Update"}],
+        )
+
+    def test_ignored_tasks(self):
+        activity = TaskActivity(ignored=["tor.tasks.schedule_tasks"])
+        self.assertEqual(
+            activity.apply(self._event(TaskEvent.STARTED, "tor.tasks.schedule_tasks")),
+            [],
+        )
+        self.assertTrue(activity.is_idle())
+
+    def test_long_running_and_no_worker(self):
+        activity = TaskActivity(running=[(self.id, "tor.tasks.running")])
+        path, started = activity.running[str(self.id)]
+        activity.running[str(self.id)] = (
+            path,
+            started - eventbus.LONG_RUNNING_SECONDS - 1,
+        )
+        self.assertEqual(
+            activity.on_timeout(),
+            [{"status": "LongRunning", "task": "tor.tasks.running"}],
+        )
+
+        activity = TaskActivity(queued=[(self.id, "tor.tasks.queued")])
+        self.assertEqual(activity.on_timeout(), [])
+        path, queued = activity.queued[str(self.id)]
+        activity.queued[str(self.id)] = (path, queued - eventbus.NO_WORKER_SECONDS - 1)
+        self.assertEqual(
+            activity.on_timeout(),
+            [{"status": "NoWorker", "task": "tor.tasks.queued"}],
+        )
+
+
+@override_settings(
+    DEBUG=True, LOGGING=console_logging_config, EVENT_BUS_FILE=TEST_EVENT_BUS_FILE
+)
+class EventListenerTests(TransactionTestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+
+    def tearDown(self):
+        TEST_EVENT_BUS_FILE.unlink(missing_ok=True)
+
+    def test_listener_returns_new_events(self):
+        listener = EventListener()
+        publish(TaskEvent.STARTED, "tor.tasks.torbox_status_task")
+        publish_torrent_changed()
+
+        events = listener.wait(timeout=1)
+
+        self.assertEqual(
+            [event.event for event in events],
+            [TaskEvent.STARTED, TaskEvent.TORRENT_CHANGED],
+        )
+
+    def test_listener_does_not_query_without_events(self):
+        listener = EventListener()
+        with self.assertNumQueries(0):
+            start = time.monotonic()
+            events = listener.wait(timeout=0.2)
+        self.assertEqual(events, [])
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    async def test_async_listener_returns_new_events(self):
+        listener = await sync_to_async(EventListener)()
+        await sync_to_async(publish_torrent_changed)()
+
+        events = await listener.wait_async(timeout=1)
+
+        self.assertEqual([event.event for event in events], [TaskEvent.TORRENT_CHANGED])
+
+    async def test_async_listener_timeout(self):
+        listener = await sync_to_async(EventListener)()
+        events = await listener.wait_async(timeout=0.2)
+        self.assertEqual(events, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+from django.test import TestCase, override_settings
+from ..models import (
+    Torrent,
+    TorrentType,
+    TorrentHistory,
+    TorrentHistoryHourly,
+    TorrentHistoryDaily,
+)
+from ..historymgr import apply_history_retention, get_history_points
+import unittest
+from datetime import timedelta
+from django.utils import timezone
+import logging
+from .temp_settings import console_logging_config
+from .utils import create_torrent, create_history
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class HistoryMgrTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        self.torrent = create_torrent(TorrentType.objects.get_no_type())
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+    def _history(self, ago, download_speed=0, seeds=0):
+        history = create_history(self.torrent, updated_at=self.now - ago)
+        history.download_speed = download_speed
+        history.seeds = seeds
+        history.save()
+        return history
+
+    def test_raw_history_is_aggregated_per_hour(self):
+        old = self.now - timedelta(days=10)
+        self._history(timedelta(days=10), download_speed=10, seeds=1)
+        self._history(timedelta(days=10, minutes=10), download_speed=30, seeds=3)
+        recent = self._history(timedelta(hours=1), download_speed=5)
+
+        apply_history_retention(now=self.now)
+
+        self.assertEqual(list(TorrentHistory.objects.all()), [recent])
+        hourly = TorrentHistoryHourly.objects.get(torrent=self.torrent)
+        self.assertEqual(hourly.samples, 2)
+        self.assertEqual(hourly.avg_download_speed, 20)
+        self.assertEqual(hourly.max_download_speed, 30)
+        self.assertEqual(hourly.max_seeds, 3)
+        self.assertEqual(
+            hourly.period_start, timezone.localtime(old).replace(minute=0)
+        )
+
+    def test_latest_history_is_kept(self):
+        latest = self._history(timedelta(days=10), download_speed=10)
+
+        apply_history_retention(now=self.now)
+        apply_history_retention(now=self.now)
+
+        self.torrent.refresh_from_db()
+        self.assertEqual(self.torrent.latest_history, latest)
+        self.assertFalse(TorrentHistoryHourly.objects.exists())
+
+    def test_hourly_history_is_aggregated_per_day(self):
+        day = timezone.localtime(self.now - timedelta(days=100)).replace(hour=1)
+        TorrentHistoryHourly.objects.create(
+            torrent=self.torrent,
+            period_start=day,
+            samples=1,
+            avg_download_speed=10,
+            max_download_speed=10,
+        )
+        TorrentHistoryHourly.objects.create(
+            torrent=self.torrent,
+            period_start=day + timedelta(hours=1),
+            samples=3,
+            avg_download_speed=30,
+            max_download_speed=50,
+        )
+
+        apply_history_retention(now=self.now)
+
+        self.assertFalse(TorrentHistoryHourly.objects.exists())
+        daily = TorrentHistoryDaily.objects.get(torrent=self.torrent)
+        self.assertEqual(daily.samples, 4)
+        self.assertEqual(daily.avg_download_speed, 25)
+        self.assertEqual(daily.max_download_speed, 50)
+
+    def test_history_points_from_all_resolutions(self):
+        self._history(timedelta(days=10), download_speed=10)
+        self._history(timedelta(days=100), download_speed=20)
+        self._history(timedelta(hours=1), download_speed=30)
+        apply_history_retention(now=self.now)
+
+        points = get_history_points(self.torrent)
+        self.assertEqual([point["download_speed"] for point in points], [30, 10, 20])
+
+        points = get_history_points(self.torrent, since=self.now - timedelta(days=1))
+        self.assertEqual([point["download_speed"] for point in points], [30])
+
+    def test_history_points_prefer_finer_resolution(self):
+        raw = self._history(timedelta(hours=1), download_speed=30)
+        hour = timezone.localtime(raw.updated_at).replace(minute=0)
+        for period_start in [hour, hour - timedelta(hours=1)]:
+            TorrentHistoryHourly.objects.create(
+                torrent=self.torrent,
+                period_start=period_start,
+                samples=1,
+                avg_download_speed=20,
+            )
+        TorrentHistoryDaily.objects.create(
+            torrent=self.torrent,
+            period_start=hour.replace(hour=0),
+            samples=1,
+            avg_download_speed=10,
+        )
+
+        points = get_history_points(self.torrent)
+
+        self.assertEqual([point["download_speed"] for point in points], [30, 20])
+
+
+if __name__ == "__main__":
+    unittest.main()
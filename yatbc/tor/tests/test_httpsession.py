@@ -0,0 +1,124 @@
+from django.test import TestCase, override_settings
+from ..httpsession import (
+    get_session,
+    close_session,
+    get_connection_metrics,
+    host_slot,
+    MAX_REQUESTS_PER_HOST,
+)
+import threading
+from .. import transmissionapi
+from ..transmissionapi import (
+    get_transmission_client,
+    drop_transmission_client,
+    validate_transmission_api,
+)
+from constance import config
+import unittest
+import logging
+from .temp_settings import console_logging_config
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class HttpSessionTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        close_session()
+
+    def tearDown(self):
+        close_session()
+
+    def test_session_is_shared(self):
+        self.assertIs(get_session(), get_session())
+
+    def test_session_recreated_after_close(self):
+        session = get_session()
+        close_session()
+        self.assertIsNot(session, get_session())
+
+    def test_connection_metrics(self):
+        self.assertEqual(get_connection_metrics(), [])
+        session = get_session()
+        pool = session.get_adapter("http://").poolmanager.connection_from_url(
+            "http://yatbc-aria:6800"
+        )
+        pool.num_requests = 5
+        pool.num_connections = 1
+
+        metrics = get_connection_metrics()
+
+        self.assertEqual(
+            metrics,
+            [
+                {
+                    "host": "http://yatbc-aria:6800",
+                    "requests": 5,
+                    "connections": 1,
+                    "reused": 4,
+                }
+            ],
+        )
+
+    @unittest.mock.patch("tor.transmissionapi.Client")
+    def test_transmission_client_is_reused(self, client_mock):
+        drop_transmission_client()
+        config.TRANSMISSION_HOST = "host"
+        config.TRANSMISSION_PORT = 1
+        config.TRANSMISSION_USER = "user"
+        config.TRANSMISSION_PASSWORD = "pass"
+
+        first = get_transmission_client()
+        second = get_transmission_client()
+
+        self.assertIs(first, second)
+        client_mock.assert_called_once_with(
+            host="host", port=1, username="user", password="pass"
+        )
+        drop_transmission_client()
+        get_transmission_client()
+        self.assertEqual(client_mock.call_count, 2)
+
+        config.TRANSMISSION_PASSWORD = "changed"
+        get_transmission_client()
+        self.assertEqual(client_mock.call_count, 3)
+        client_mock.assert_called_with(
+            host="host", port=1, username="user", password="changed"
+        )
+        drop_transmission_client()
+
+    @unittest.mock.patch("tor.transmissionapi.Client")
+    def test_transmission_validation_is_not_cached(self, client_mock):
+        drop_transmission_client()
+
+        ok, _, _ = validate_transmission_api("other", 2, "user", "secret")
+        validate_transmission_api("other", 2, "user", "secret")
+
+        self.assertTrue(ok)
+        self.assertEqual(client_mock.call_count, 2)
+        self.assertIsNone(transmissionapi._client)
+
+    def test_host_slots_are_limited(self):
+        entered = threading.Event()
+        release = threading.Event()
+        running = []
+
+        def request(host):
+            with host_slot(host):
+                running.append(host)
+                if len(running) == MAX_REQUESTS_PER_HOST:
+                    entered.set()
+                release.wait(5)
+
+        threads = [
+            threading.Thread(target=request, args=("limited-host",))
+            for _ in range(MAX_REQUESTS_PER_HOST + 1)
+        ]
+        for thread in threads:
+            thread.start()
+        entered.wait(5)
+        with host_slot("other-host"):
+            self.assertEqual(len(running), MAX_REQUESTS_PER_HOST)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(running), MAX_REQUESTS_PER_HOST + 1)
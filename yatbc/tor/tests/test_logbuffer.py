@@ -0,0 +1,101 @@
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ..models import ErrorLog, TorrentErrorLog, TorrentType, Level
+from ..commondao import add_log
+from ..logbuffer import (
+    buffered_logs,
+    get_log_buffer,
+    on_task_started,
+    on_task_finished,
+)
+import unittest
+import logging
+from .temp_settings import console_logging_config
+from .utils import create_torrent
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class LogBufferTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        ErrorLog.objects.all().delete()
+        self.torrent = create_torrent(TorrentType.objects.get_no_type())
+        self.info = Level.objects.get_info()
+
+    def test_logs_written_at_end(self):
+        with buffered_logs():
+            for i in range(10):
+                add_log(f"Message {i}", self.info, source="test", torrent=self.torrent)
+            self.assertEqual(ErrorLog.objects.count(), 0)
+        self.assertEqual(ErrorLog.objects.count(), 10)
+        self.assertEqual(TorrentErrorLog.objects.count(), 10)
+        self.assertIsNone(get_log_buffer())
+
+    def test_logs_written_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            with buffered_logs():
+                for i in range(50):
+                    add_log(f"Message {i}", self.info, torrent=self.torrent)
+        self.assertLessEqual(len(queries), 4)
+
+    def test_flush_on_size(self):
+        with buffered_logs(flush_size=3):
+            for i in range(4):
+                add_log(f"Message {i}", self.info)
+            self.assertEqual(ErrorLog.objects.count(), 3)
+        self.assertEqual(ErrorLog.objects.count(), 4)
+
+    def test_flush_on_exception(self):
+        with self.assertRaises(ValueError):
+            with buffered_logs():
+                add_log("Before failure", self.info)
+                raise ValueError("failure")
+        self.assertTrue(ErrorLog.objects.filter(message="Before failure").exists())
+
+    def test_task_signals(self):
+        on_task_started(sender=None, task_result=None)
+        add_log("In task", self.info)
+        self.assertEqual(ErrorLog.objects.count(), 0)
+        on_task_finished(sender=None, task_result=None)
+        self.assertEqual(ErrorLog.objects.count(), 1)
+        self.assertIsNone(get_log_buffer())
+
+    def test_timer_waits_for_transaction(self):
+        # test runs in transaction, as task holding write lock would
+        with buffered_logs() as buffer:
+            add_log("In transaction", self.info)
+            buffer.flush_on_timer()
+            self.assertEqual(ErrorLog.objects.count(), 0)
+            self.assertTrue(buffer.timer.is_alive())
+        self.assertEqual(ErrorLog.objects.count(), 1)
+
+    def test_bad_log_does_not_drop_buffer(self):
+        with buffered_logs() as buffer:
+            add_log("Before", self.info, torrent=self.torrent)
+            buffer.add(ErrorLog(message="No level"))
+            add_log("After", self.info, torrent=self.torrent)
+        self.assertEqual(
+            sorted(ErrorLog.objects.values_list("message", flat=True)),
+            ["After", "Before"],
+        )
+        self.assertEqual(TorrentErrorLog.objects.count(), 2)
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class LogBufferTimerTests(TransactionTestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        # cached level can be removed by other transaction tests
+        self.info = Level.objects.create(name="INFO")
+
+    def test_flush_on_timer(self):
+        with buffered_logs(flush_seconds=0.5) as buffer:
+            add_log("Quiet task", self.info)
+            timer = buffer.timer
+            timer.join()
+            self.assertEqual(ErrorLog.objects.count(), 1)
+        self.assertEqual(ErrorLog.objects.count(), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+from django.test import TestCase, override_settings
+from ..models import ErrorLog, TorrentErrorLog, TorrentType, Level
+from ..commondao import add_log
+from ..logmgr import prune_logs
+from .. import logmgr
+import unittest
+from unittest.mock import patch
+import gzip
+import json
+import shutil
+from pathlib import Path
+from datetime import timedelta
+from django.utils import timezone
+import logging
+from .temp_settings import console_logging_config
+from .utils import create_torrent
+
+ARCHIVE_DIR = Path("./test_log_archive/")
+
+
+@override_settings(
+    DEBUG=True, LOGGING=console_logging_config, LOG_ARCHIVE_DIR=ARCHIVE_DIR
+)
+class LogMgrTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        shutil.rmtree(ARCHIVE_DIR, ignore_errors=True)
+        ErrorLog.objects.all().delete()
+        self.torrent = create_torrent(TorrentType.objects.get_no_type())
+
+    def tearDown(self):
+        shutil.rmtree(ARCHIVE_DIR, ignore_errors=True)
+
+    def _log(self, message, level, days_ago):
+        log = add_log(message=message, level=level, torrent=self.torrent)
+        ErrorLog.objects.filter(id=log.id).update(
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return log
+
+    def test_prune_per_level(self):
+        self._log("old info", Level.objects.get_info(), days_ago=20)
+        recent_info = self._log("recent info", Level.objects.get_info(), days_ago=1)
+        old_error = self._log("old error", Level.objects.get_error(), days_ago=20)
+
+        pruned = prune_logs(archive_logs=False)
+
+        self.assertEqual(pruned["INFO"], 1)
+        self.assertEqual(pruned["ERROR"], 0)
+        self.assertTrue(ErrorLog.objects.filter(id=recent_info.id).exists())
+        self.assertTrue(ErrorLog.objects.filter(id=old_error.id).exists())
+        self.assertFalse(ErrorLog.objects.filter(message="old info").exists())
+        self.assertEqual(TorrentErrorLog.objects.count(), 2)
+
+    def test_prune_in_chunks_with_archive(self):
+        for i in range(5):
+            self._log(f"old {i}", Level.objects.get_debug(), days_ago=10)
+
+        with patch.object(logmgr, "DELETE_CHUNK_SIZE", 2):
+            pruned = prune_logs(archive_logs=True)
+
+        self.assertEqual(pruned["DEBUG"], 5)
+        archives = list(ARCHIVE_DIR.glob("*.jsonl.gz"))
+        self.assertEqual(len(archives), 1)
+        with gzip.open(archives[0], "rt", encoding="utf-8") as archive:
+            entries = [json.loads(line) for line in archive]
+        self.assertEqual(
+            [entry["message"] for entry in entries], [f"old {i}" for i in range(5)]
+        )
+        self.assertEqual(entries[0]["torrents"], [self.torrent.id])
+        self.assertEqual(entries[0]["level"], "DEBUG")
+
+
+if __name__ == "__main__":
+    unittest.main()
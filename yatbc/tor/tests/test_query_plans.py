@@ -0,0 +1,83 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django_tasks.backends.database.models import DBTaskResult, ResultStatus
+from ..models import (
+    Torrent,
+    TorrentHistory,
+    TorrentFile,
+    AriaDownloadStatus,
+    ErrorLog,
+    TorrentTorBoxSearch,
+)
+from ..commondao import get_active_torrents_with_current_history, TORBOX_CLIENT
+import unittest
+import re
+import logging
+from .temp_settings import console_logging_config
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is sqlite only")
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+
+    def assertNoFullScan(self, query):
+        plan = query.explain()
+        full_scans = re.findall(r"SCAN (\w+)$", plan, re.MULTILINE)
+        self.assertEqual(full_scans, [], f"Full table scan in plan:\n{plan}")
+        return plan
+
+    def test_torrent_by_hash_and_client(self):
+        plan = self.assertNoFullScan(
+            Torrent.objects.filter(hash="hash", client=TORBOX_CLIENT)
+        )
+        self.assertIn("torrent_hash_client_idx", plan)
+
+    def test_active_torrents(self):
+        plan = self.assertNoFullScan(get_active_torrents_with_current_history())
+        self.assertIn("torrent_active_client_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_torrent_history(self):
+        plan = self.assertNoFullScan(
+            TorrentHistory.objects.filter(torrent_id=1).order_by("-updated_at")
+        )
+        self.assertIn("history_torrent_updated_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_torrent_files(self):
+        self.assertNoFullScan(TorrentFile.objects.filter(torrent_id=1))
+
+    def test_pending_aria_downloads(self):
+        plan = self.assertNoFullScan(
+            AriaDownloadStatus.objects.filter(
+                done=False, error="", internal_id__isnull=False
+            )
+        )
+        self.assertIn("aria_pending_idx", plan)
+
+    def test_latest_logs(self):
+        plan = self.assertNoFullScan(ErrorLog.objects.order_by("-created_at")[:10])
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_search_by_query(self):
+        plan = self.assertNoFullScan(
+            TorrentTorBoxSearch.objects.filter_by_query_season_episode(
+                query="query", season=1, episode=2
+            ).order_by("-date")
+        )
+        self.assertIn("search_query_idx", plan)
+
+    def test_task_by_path_and_status(self):
+        plan = self.assertNoFullScan(
+            DBTaskResult.objects.filter(
+                task_path="tor.tasks.schedule_tasks",
+                status__in=[ResultStatus.READY, ResultStatus.RUNNING],
+            )[:1]
+        )
+        self.assertIn("tor_dbtaskresult_path_status_idx", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+from django.test import TestCase, override_settings
+from ..models import ScheduledJob, AriaDownloadStatus
+from ..schedulermgr import (
+    Job,
+    run_due_jobs,
+    reset_jobs,
+    has_active_local_downloads,
+    MIN_SCHEDULER_DELAY,
+)
+import unittest
+import unittest.mock
+import logging
+from datetime import timedelta
+from django.utils import timezone
+from .temp_settings import console_logging_config
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class SchedulerMgrTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        self.now = timezone.now()
+        self.run = unittest.mock.Mock()
+        self.polling = Job(
+            name="polling",
+            run=self.run,
+            active_interval=20,
+            idle_interval=60,
+            max_interval=200,
+            is_active=has_active_local_downloads,
+        )
+
+    def _interval(self):
+        return ScheduledJob.objects.get(name="polling").interval
+
+    def _run(self, jobs, now):
+        with unittest.mock.patch("tor.schedulermgr.add_jitter", lambda x: x):
+            return run_due_jobs(jobs, now=now)
+
+    def test_idle_job_backs_off(self):
+        intervals = []
+        now = self.now
+        for _ in range(4):
+            now = self._run([self.polling], now)
+            intervals.append(self._interval())
+        self.assertEqual(intervals, [60, 120, 200, 200])
+        self.assertEqual(self.run.call_count, 4)
+
+    def test_active_job_polls_fast(self):
+        self._run([self.polling], self.now)
+        self._run([self.polling], self.now + timedelta(seconds=60))
+        AriaDownloadStatus.objects.create(path="test", internal_id="gid")
+
+        next_run = self._run([self.polling], self.now + timedelta(seconds=180))
+
+        self.assertEqual(self._interval(), 20)
+        self.assertEqual(next_run, self.now + timedelta(seconds=200))
+        self.assertTrue(ScheduledJob.objects.get(name="polling").active)
+
+    def test_failed_download_is_not_active(self):
+        AriaDownloadStatus.objects.create(path="error", internal_id="gid", error="Err")
+        AriaDownloadStatus.objects.create(path="not sent")
+
+        self._run([self.polling], self.now)
+
+        self.assertFalse(has_active_local_downloads())
+        self.assertEqual(self._interval(), 60)
+        self.assertFalse(ScheduledJob.objects.get(name="polling").active)
+
+    def test_only_due_jobs_run(self):
+        fixed_run = unittest.mock.Mock()
+        fixed = Job(name="fixed", run=fixed_run, idle_interval=600)
+        self._run([self.polling, fixed], self.now)
+
+        next_run = self._run([self.polling, fixed], self.now + timedelta(seconds=60))
+
+        self.assertEqual(self.run.call_count, 2)
+        self.assertEqual(fixed_run.call_count, 1)
+        self.assertEqual(next_run, self.now + timedelta(seconds=180))
+
+    def test_reset_and_minimal_delay(self):
+        self._run([self.polling], self.now)
+        reset_jobs([self.polling])
+
+        self.assertEqual(self._interval(), 0)
+        self.assertEqual(
+            self._run([], self.now), self.now + timedelta(seconds=MIN_SCHEDULER_DELAY)
+        )
+
+    def test_disabled_job(self):
+        disabled = Job(
+            name="disabled", run=self.run, idle_interval=60, is_enabled=lambda: False
+        )
+        self._run([disabled], self.now)
+        self.run.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from ..commondao import write_transaction
+from ..models import TorrentType
+import unittest
+import logging
+from .temp_settings import console_logging_config
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "sqlite only")
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class SqliteTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+
+    def _pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        self.assertEqual(self._pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self._pragma("temp_store"), 2)  # MEMORY
+        self.assertEqual(
+            self._pragma("cache_size"), int(settings.SQLITE_PRAGMAS["cache_size"])
+        )
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "sqlite only")
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class WriteTransactionTests(TransactionTestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+
+    def _begin_statements(self, atomic):
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.startswith("BEGIN"):
+                statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            with atomic():
+                TorrentType.objects.count()
+        return statements
+
+    def test_only_write_transaction_is_immediate(self):
+        self.assertEqual(self._begin_statements(transaction.atomic), ["BEGIN"])
+        self.assertEqual(
+            self._begin_statements(write_transaction), ["BEGIN IMMEDIATE"]
+        )
+        self.assertIsNone(connection.transaction_mode)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 from django.test import TestCase, override_settings
-from ..models import Torrent, TorrentFile, TorrentType, AriaDownloadStatus
+from ..models import Torrent, TorrentFile, TorrentType, AriaDownloadStatus, ErrorLog
 from ..statusmgr import StatusMgr
+from django_tasks.backends.database.models import DBTaskResult
 import unittest
 import shutil
 from pathlib import Path
@@ -38,6 +39,28 @@ class StatusMgrTests(TestCase):
         create_torrent_file(torrent=torrent, aria=aria)
         return torrent, work_dir, file_path
 
+    def test_remote_client_progress_logged_once(self):
+        status_mgr = StatusMgr.get_instance()
+        logs = ErrorLog.objects.filter(torrenterrorlog__torrent=self.torrent)
+
+        status_mgr.remote_client_progress(self.torrent)
+        status_mgr.remote_client_progress(self.torrent)
+
+        self.assertEqual(logs.count(), 1)
+        self.torrent.refresh_from_db()
+        self.assertEqual(self.torrent.local_status, status_mgr.client_progress)
+
+    def test_aria_progress_does_not_save_same_status(self):
+        status_mgr = StatusMgr.get_instance()
+        status_mgr.aria_progress(self.torrent, "First")
+        self.torrent.name = "Not saved"
+
+        status_mgr.aria_progress(self.torrent, "Second")
+
+        self.torrent.refresh_from_db()
+        self.assertEqual(self.torrent.local_status, status_mgr.local_progress)
+        self.assertNotEqual(self.torrent.name, "Not saved")
+
     def test_torrent_done_does_not_remove_non_empty_source_dir(self):
         torrent, work_dir, file_path = self._prepare_torrent_done()
 
@@ -60,14 +83,16 @@ class StatusMgrTests(TestCase):
         self.assertFalse(work_dir.exists())
 
     def test_remote_client_done(self):
-        torbox_request_torrent_files_mock = unittest.mock.Mock()
-        enqueue_mock = unittest.mock.Mock()
-        torbox_request_torrent_files_mock.enqueue = enqueue_mock
-
         status_mgr = StatusMgr.get_instance()
-        status_mgr.remote_client_done(self.torrent, torbox_request_torrent_files_mock)
+        status_mgr.remote_client_done(self.torrent)
+        status_mgr.remote_client_done(self.torrent)
         self.assertEqual(self.torrent.local_status, status_mgr.client_done)
-        enqueue_mock.assert_called_once_with(self.torrent.id)
+        self.assertEqual(
+            DBTaskResult.objects.filter(
+                task_path="tor.tasks.torbox_request_torrent_files"
+            ).count(),
+            1,
+        )
 
     def test_new_torrent(self):
         status_mgr = StatusMgr.get_instance()
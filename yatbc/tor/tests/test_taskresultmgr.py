@@ -0,0 +1,117 @@
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django_tasks.backends.database.models import DBTaskResult, ResultStatus
+from ..tasks import (
+    torbox_status_task,
+    process_arr_task,
+    enqueue_once,
+    exec_action_on_file_task,
+)
+from ..taskresultmgr import (
+    clean_task_results,
+    get_task_result_metrics,
+    vacuum_database,
+    enable_incremental_vacuum,
+)
+from ..models import ErrorLog, TaskSingleton
+import unittest
+import unittest.mock
+import logging
+from datetime import timedelta
+from django.utils import timezone
+from .temp_settings import console_logging_config
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class TaskResultMgrTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        self.now = timezone.now()
+
+    def _result(self, task, status, finished_days_ago=None, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = task.enqueue(*args)
+        finished_at = None
+        if finished_days_ago is not None:
+            finished_at = self.now - timedelta(days=finished_days_ago)
+        DBTaskResult.objects.filter(id=result.id).update(
+            status=status, finished_at=finished_at
+        )
+        return result.id
+
+    @unittest.mock.patch("tor.taskresultmgr.DELETE_CHUNK_SIZE", 2)
+    def test_old_finished_results_are_removed(self):
+        for i in range(3):
+            self._result(process_arr_task, ResultStatus.SUCCEEDED, 10, i)
+        self._result(torbox_status_task, ResultStatus.FAILED, 10)
+        recent = self._result(torbox_status_task, ResultStatus.SUCCEEDED, 1)
+        ready = self._result(torbox_status_task, ResultStatus.READY)
+
+        deleted = clean_task_results(now=self.now)
+
+        self.assertEqual(deleted, 4)
+        self.assertEqual(
+            sorted(str(id) for id in DBTaskResult.objects.values_list("id", flat=True)),
+            sorted([recent, ready]),
+        )
+        self.assertTrue(ErrorLog.objects.filter(source="taskresultmgr").exists())
+
+    def test_idle_singletons_are_removed(self):
+        done = enqueue_once(exec_action_on_file_task, 1)
+        enqueue_once(exec_action_on_file_task, 2)
+        enqueue_once(exec_action_on_file_task, 3)
+        DBTaskResult.objects.filter(id=done.id).update(status=ResultStatus.SUCCEEDED)
+        TaskSingleton.objects.update(updated_at=self.now - timedelta(days=10))
+        TaskSingleton.objects.create(task_path="tor.tasks.gone", args_hash="gone")
+        TaskSingleton.objects.filter(task_path="tor.tasks.gone").update(
+            updated_at=self.now - timedelta(days=10)
+        )
+
+        clean_task_results(now=self.now)
+
+        self.assertEqual(TaskSingleton.objects.count(), 2)
+        self.assertFalse(TaskSingleton.objects.filter(result_id=done.id).exists())
+
+    def test_metrics(self):
+        self._result(torbox_status_task, ResultStatus.SUCCEEDED, 1)
+        self._result(torbox_status_task, ResultStatus.READY)
+
+        metrics = get_task_result_metrics()
+
+        self.assertEqual(metrics["rows"], 2)
+        self.assertEqual(
+            metrics["statuses"],
+            {ResultStatus.SUCCEEDED: 1, ResultStatus.READY: 1},
+        )
+        self.assertGreater(metrics["database_size"], 0)
+
+    def test_no_vacuum_in_transaction(self):
+        self.assertFalse(vacuum_database())
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class VacuumTests(TransactionTestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+
+    def _auto_vacuum(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA auto_vacuum")
+            return cursor.fetchone()[0]
+
+    def test_full_vacuum_only_on_request(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA auto_vacuum=NONE")
+            cursor.execute("VACUUM")
+
+        self.assertFalse(vacuum_database())
+        self.assertEqual(self._auto_vacuum(), 0)
+
+        self.assertTrue(enable_incremental_vacuum())
+        self.assertEqual(self._auto_vacuum(), 2)
+        self.assertTrue(vacuum_database())
+        self.assertFalse(enable_incremental_vacuum())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+from django.test import TestCase, override_settings
+from django_tasks.backends.database.models import DBTaskResult, ResultStatus
+from ..models import TaskSingleton
+from ..tasks import (
+    enqueue_once,
+    exec_action_on_file_task,
+    queue_torbox_status,
+    queue_scheduler,
+    wake_scheduler,
+    reschedule,
+    schedule_tasks,
+)
+from datetime import timedelta
+from django.utils import timezone
+import unittest
+import logging
+from .temp_settings import console_logging_config
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class TasksTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+
+    def test_queue_is_not_duplicated(self):
+        first = queue_torbox_status()
+        second = queue_torbox_status()
+
+        self.assertEqual(str(first.id), str(second.id))
+        self.assertEqual(
+            DBTaskResult.objects.filter(
+                task_path="tor.tasks.torbox_status_task"
+            ).count(),
+            1,
+        )
+
+    def test_enqueue_once_by_args(self):
+        first = enqueue_once(exec_action_on_file_task, 1)
+        enqueue_once(exec_action_on_file_task, 1)
+        other = enqueue_once(exec_action_on_file_task, 2)
+
+        self.assertNotEqual(first.id, other.id)
+        self.assertEqual(DBTaskResult.objects.count(), 2)
+        self.assertEqual(TaskSingleton.objects.count(), 2)
+
+    def test_enqueue_again_when_finished(self):
+        first = queue_torbox_status()
+        DBTaskResult.objects.filter(id=first.id).update(
+            status=ResultStatus.SUCCEEDED
+        )
+
+        second = queue_torbox_status()
+
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual(str(TaskSingleton.objects.get().result_id), second.id)
+
+    def test_scheduler_keeps_single_chain(self):
+        first = queue_scheduler()
+        DBTaskResult.objects.filter(id=first.id).update(status=ResultStatus.RUNNING)
+        next_run = reschedule(schedule_tasks, timezone.now() + timedelta(minutes=10))
+        DBTaskResult.objects.filter(id=first.id).update(
+            status=ResultStatus.SUCCEEDED
+        )
+
+        self.assertEqual(str(queue_scheduler().id), next_run.id)
+        wake_scheduler()
+        self.assertLessEqual(
+            DBTaskResult.objects.get(id=next_run.id).run_after, timezone.now()
+        )
+        self.assertEqual(
+            DBTaskResult.objects.filter(task_path="tor.tasks.schedule_tasks").count(),
+            2,
+        )
+
+    def test_reschedule_reuses_queued_run(self):
+        queued = reschedule(schedule_tasks, timezone.now() + timedelta(minutes=10))
+        earlier = timezone.now() + timedelta(minutes=1)
+
+        again = reschedule(schedule_tasks, earlier)
+        queue_scheduler()
+
+        self.assertEqual(str(again.id), str(queued.id))
+        self.assertEqual(DBTaskResult.objects.get(id=queued.id).run_after, earlier)
+        self.assertEqual(
+            DBTaskResult.objects.filter(task_path="tor.tasks.schedule_tasks").count(),
+            1,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
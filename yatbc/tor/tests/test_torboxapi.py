@@ -16,15 +16,24 @@ from ..torboxapi import (
     TORBOX_CLIENT,
 )
 from ..commondao import prepare_torrent_dir_name
+from ..logbuffer import buffered_logs
+from ..statusmgr import StatusMgr
 import unittest
 import json
 from pathlib import Path
 from .temp_settings import console_logging_config
 import logging
 from django.utils import timezone
-from .utils import create_torrent, create_torrent_file, create_search
+from .utils import (
+    create_torrent,
+    create_torrent_file,
+    create_search,
+    create_torbox_entry,
+)
 from constance import config
 from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 @override_settings(DEBUG=True, LOGGING=console_logging_config)
@@ -42,7 +51,7 @@ class TorboxApiTests(TestCase):
         # Arrange
         aria_api = unittest.mock.Mock()
         aria_internal_id = "fake_aria_id"
-        aria_api.download_file.return_value = (True, aria_internal_id)
+        aria_api.download_files.return_value = (True, [aria_internal_id])
 
         api = unittest.mock.Mock()
         url = "http://test"
@@ -56,8 +65,8 @@ class TorboxApiTests(TestCase):
         request_dl(torrent.id, api=api, aria_api=aria_api)
 
         # Assert
-        aria_api.download_file.assert_called_once_with(
-            link=url, target_name=file.short_name, target_folder=path, torrent=torrent
+        aria_api.download_files.assert_called_once_with(
+            [(url, file.short_name, path)], torrent=torrent
         )
         api.request_download_link.assert_called_once_with(torrent=torrent, file=file)
         torrent = Torrent.objects.get(id=torrent.id)
@@ -65,6 +74,72 @@ class TorboxApiTests(TestCase):
         file = TorrentFile.objects.get(torrent=torrent)
         self.assertEqual(file.aria.internal_id, aria_internal_id)
 
+    @unittest.mock.patch("tor.torboxapi.LINK_RETRY_DELAY", 0)
+    def test_request_dl_many_files_with_retry(self):
+        torrent = create_torrent(self.no_type, local_download=False)
+        files = [create_torrent_file(torrent=torrent) for _ in range(10)]
+        failed_once = set()
+
+        def request_download_link(torrent, file):
+            if file.id not in failed_once:
+                failed_once.add(file.id)
+                return None
+            return f"http://test/{file.id}"
+
+        api = unittest.mock.Mock()
+        api.request_download_link.side_effect = request_download_link
+        aria_api = unittest.mock.Mock()
+        aria_api.download_files.return_value = (
+            True,
+            [f"aria{file.id}" for file in files],
+        )
+
+        request_dl(torrent.id, api=api, aria_api=aria_api)
+
+        self.assertEqual(api.request_download_link.call_count, 20)
+        downloads = aria_api.download_files.call_args.args[0]
+        self.assertEqual(
+            [link for link, _, _ in downloads],
+            [f"http://test/{file.id}" for file in files],
+        )
+        for file in files:
+            file.refresh_from_db()
+            self.assertEqual(file.aria.internal_id, f"aria{file.id}")
+        torrent.refresh_from_db()
+        self.assertTrue(torrent.local_download)
+
+    @unittest.mock.patch("tor.torboxapi.LINK_RETRY_DELAY", 0)
+    def test_request_dl_failed_link(self):
+        torrent = create_torrent(self.no_type, local_download=False)
+        create_torrent_file(torrent=torrent)
+        api = unittest.mock.Mock()
+        api.request_download_link.return_value = None
+        aria_api = unittest.mock.Mock()
+
+        request_dl(torrent.id, api=api, aria_api=aria_api)
+
+        self.assertEqual(api.request_download_link.call_count, 3)
+        aria_api.download_files.assert_not_called()
+        torrent.refresh_from_db()
+        self.assertFalse(torrent.local_download)
+
+    def test_request_dl_aria_refused_file(self):
+        torrent = create_torrent(self.no_type, local_download=False)
+        create_torrent_file(torrent=torrent)
+        create_torrent_file(torrent=torrent)
+        api = unittest.mock.Mock()
+        api.request_download_link.return_value = "http://test"
+        aria_api = unittest.mock.Mock()
+        aria_api.download_files.return_value = (True, ["aria1", None])
+
+        request_dl(torrent.id, api=api, aria_api=aria_api)
+
+        self.assertEqual(
+            TorrentFile.objects.filter(torrent=torrent, aria__isnull=False).count(), 1
+        )
+        torrent.refresh_from_db()
+        self.assertFalse(torrent.local_download)
+
     def test_ok_add_torrent(self):
         api = unittest.mock.Mock()
         api.add_torrent.return_value = unittest.mock.Mock(
@@ -81,37 +156,7 @@ class TorboxApiTests(TestCase):
 
     def test_ok_update_torrent_list(self):
         api = unittest.mock.Mock()
-        return_value = unittest.mock.Mock(
-            active=True,
-            hash="fakehash",
-            size=123,
-            created_at=timezone.now().isoformat(),
-            download_finished=False,
-            download_present=False,
-            id_="123",
-            magnet="magnet:?xt=fakehash&dn=test",
-            download_speed=12,
-            upload_speed=22,
-            eta=0,
-            peers=1,
-            ratio=2,
-            seeds=3,
-            progress=2,
-            updated_at=timezone.now().isoformat(),
-            availability=3,
-            download_state="downloading",
-            _kwargs={
-                "tracker": "test_tracker",
-                "total_uploaded": 1234,
-                "total_downloaded": 1233,
-                "cached": False,
-                "private": True,
-            },
-            files=None,
-        )
-        type(return_value).name = unittest.mock.PropertyMock(
-            return_value="Test Torrent"
-        )
+        return_value = create_torbox_entry("fakehash", "Test Torrent", private=True)
         api.get_torrent_list.return_value = [return_value]
 
         update_torrent_list(api=api)
@@ -127,6 +172,191 @@ class TorboxApiTests(TestCase):
         history = TorrentHistory.objects.get(torrent=torrent)
         self.assertEqual(history.download_speed, 12)
 
+    def test_update_torrent_list_bulk_sync(self):
+        existing = create_torrent(self.no_type, local_download=False)
+        existing.deleted = True
+        existing.save()
+        file = unittest.mock.Mock(
+            short_name="file.mkv",
+            size=12,
+            mimetype="video/x-matroska",
+            id_=1,
+            md5="d41d8cd98f00b204e9800998ecf8427e",
+            _kwargs={"hash": "filehash"},
+        )
+        type(file).name = unittest.mock.PropertyMock(return_value="Show/file.mkv")
+        api = unittest.mock.Mock()
+        api.get_torrent_list.return_value = [
+            create_torbox_entry(existing.hash, "Renamed"),
+            create_torbox_entry("newhash", "Show S01E01", files=[file]),
+        ]
+        request_torrent_files = unittest.mock.Mock()
+
+        with unittest.mock.patch(
+            "tor.tasks.torbox_request_torrent_files", request_torrent_files
+        ):
+            update_torrent_list(api=api)
+
+        existing.refresh_from_db()
+        self.assertFalse(existing.deleted)
+        self.assertTrue(existing.redownload)
+        self.assertEqual(existing.name, "Renamed")
+        new = Torrent.objects.get(hash="newhash")
+        self.assertEqual(new.torrent_type, TorrentType.objects.get_movie_series())
+        self.assertEqual(TorrentHistory.objects.filter(torrent=new).count(), 1)
+        self.assertEqual(TorrentHistory.objects.filter(torrent=existing).count(), 1)
+        new_file = TorrentFile.objects.get(torrent=new)
+        self.assertEqual(new_file.short_name, "file.mkv")
+        self.assertEqual(new_file.md5, "d41d8cd98f00b204e9800998ecf8427e")
+        request_torrent_files.enqueue.assert_not_called()
+
+    def test_update_torrent_list_does_not_duplicate_history(self):
+        updated_at = timezone.now().isoformat()
+        api = unittest.mock.Mock()
+        api.get_torrent_list.return_value = [
+            create_torbox_entry("hash1", "First", updated_at=updated_at)
+        ]
+
+        update_torrent_list(api=api)
+        update_torrent_list(api=api)
+
+        self.assertEqual(Torrent.objects.filter(hash="hash1").count(), 1)
+        self.assertEqual(
+            TorrentHistory.objects.filter(torrent__hash="hash1").count(), 1
+        )
+
+    def test_update_torrent_list_sets_latest_history(self):
+        api = unittest.mock.Mock()
+        api.get_torrent_list.return_value = [
+            create_torbox_entry("hash1", "First", updated_at="2024-01-01T10:00:00Z")
+        ]
+        update_torrent_list(api=api)
+        api.get_torrent_list.return_value = [
+            create_torbox_entry("hash1", "First", updated_at="2024-01-01T11:00:00Z")
+        ]
+        update_torrent_list(api=api)
+
+        torrent = Torrent.objects.get(hash="hash1")
+        newest = TorrentHistory.objects.filter(torrent=torrent).latest("updated_at")
+        self.assertEqual(torrent.latest_history_id, newest.id)
+
+    def test_update_torrent_list_constant_queries(self):
+        def count_queries(size):
+            Torrent.objects.all().delete()
+            updated_at = timezone.now().isoformat()
+            api = unittest.mock.Mock()
+            api.get_torrent_list.return_value = [
+                create_torbox_entry(f"hash{i}", f"Torrent {i}", updated_at=updated_at)
+                for i in range(size)
+            ]
+            update_torrent_list(api=api)
+            with CaptureQueriesContext(connection) as queries:
+                update_torrent_list(api=api)
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(20))
+
+    def test_update_torrent_list_constant_queries_changed_and_new(self):
+        def count_queries(size):
+            Torrent.objects.all().delete()
+            api = unittest.mock.Mock()
+            api.get_torrent_list.return_value = [
+                create_torbox_entry(f"hash{i}", f"Torrent {i}", updated_at="2024-01-01")
+                for i in range(2 * size)
+            ]
+            update_torrent_list(api=api)
+            Torrent.objects.update(
+                local_status=StatusMgr.get_instance().client_progress
+            )
+            # first half changed, second half unchanged, and same number of new ones
+            api.get_torrent_list.return_value = [
+                create_torbox_entry(
+                    f"hash{i}",
+                    f"Torrent {i}",
+                    updated_at="2024-01-02" if i < size else "2024-01-01",
+                )
+                for i in range(2 * size)
+            ] + [create_torbox_entry(f"new{i}", f"New {i}") for i in range(size)]
+            # sync runs as task, where logs are written in bulk
+            with CaptureQueriesContext(connection) as queries, buffered_logs():
+                update_torrent_list(api=api)
+            self.assertEqual(Torrent.objects.count(), 3 * size)
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(20))
+
+    @unittest.mock.patch("tor.torboxapi.SYNC_PAGE_SIZE", 2)
+    def test_update_torrent_list_pages(self):
+        entries = [
+            create_torbox_entry(f"hash{i}", f"Torrent {i}", updated_at="2024-01-01")
+            for i in range(5)
+        ]
+        # second page repeats entry, as if torrent was added between requests
+        pages = {0: entries[0:2], 2: entries[1:3], 4: entries[3:5], 6: []}
+        api = unittest.mock.Mock()
+        api.get_torrent_list.side_effect = lambda offset, limit: pages[offset][:limit]
+
+        update_torrent_list(api=api)
+
+        self.assertEqual(api.get_torrent_list.call_count, 4)
+        self.assertEqual(Torrent.objects.filter(deleted=False).count(), 5)
+
+    @unittest.mock.patch("tor.torboxapi.SYNC_PAGE_SIZE", 1)
+    def test_update_torrent_list_failed_page(self):
+        existing = create_torrent(self.no_type)
+        api = unittest.mock.Mock()
+        api.get_torrent_list.side_effect = [
+            [create_torbox_entry("hash1", "First")],
+            None,
+        ]
+
+        self.assertIsNone(update_torrent_list(api=api))
+
+        existing.refresh_from_db()
+        self.assertFalse(existing.deleted)
+        self.assertFalse(Torrent.objects.filter(hash="hash1").exists())
+
+    def test_update_torrent_list_skips_unchanged(self):
+        api = unittest.mock.Mock()
+        api.get_torrent_list.return_value = [
+            create_torbox_entry("hash1", "First", updated_at="2024-01-01T10:00:00Z"),
+            create_torbox_entry("hash2", "Second", updated_at="2024-01-01T10:00:00Z"),
+        ]
+        update_torrent_list(api=api)
+        Torrent.objects.update(local_status=StatusMgr.get_instance().client_progress)
+        api.get_torrent_list.return_value = [
+            create_torbox_entry("hash1", "Renamed", updated_at="2024-01-01T10:00:00Z"),
+            create_torbox_entry("hash2", "Renamed", updated_at="2024-01-01T11:00:00Z"),
+        ]
+
+        update_torrent_list(api=api)
+
+        first = Torrent.objects.get(hash="hash1")
+        self.assertEqual(first.name, "First")
+        self.assertFalse(first.deleted)
+        self.assertEqual(Torrent.objects.get(hash="hash2").name, "Renamed")
+
+    def test_update_torrent_list_backfills_md5(self):
+        updated_at = "2024-01-01T10:00:00Z"
+        api = unittest.mock.Mock()
+        api.get_torrent_list.return_value = [
+            create_torbox_entry("hash1", "First", updated_at=updated_at)
+        ]
+        update_torrent_list(api=api)
+        Torrent.objects.update(local_status=StatusMgr.get_instance().client_progress)
+        torrent = Torrent.objects.get(hash="hash1")
+        stored = create_torrent_file(torrent, internal_id="1")
+        file = unittest.mock.Mock(id_=1, md5="d41d8cd98f00b204e9800998ecf8427e")
+        api.get_torrent_list.return_value = [
+            create_torbox_entry("hash1", "First", updated_at=updated_at, files=[file])
+        ]
+
+        update_torrent_list(api=api)
+
+        stored.refresh_from_db()
+        self.assertEqual(stored.md5, "d41d8cd98f00b204e9800998ecf8427e")
+        self.assertEqual(TorrentFile.objects.filter(torrent=torrent).count(), 1)
+
     def test_ok_search_torrent(self):
         api = unittest.mock.Mock()
         hash = "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
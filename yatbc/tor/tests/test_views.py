@@ -1,6 +1,17 @@
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, Client, AsyncClient, override_settings
 from django.urls import reverse
-from ..models import TorrentQueue, TorrentType, ErrorLog, Level
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from ..models import (
+    TorrentQueue,
+    TorrentType,
+    ErrorLog,
+    Level,
+    Torrent,
+    TorrentHistory,
+)
 from ..commondao import add_log
 import json
 from .temp_settings import console_logging_config
@@ -60,3 +71,85 @@ class ViewsTest(TestCase):
         self.assertTrue("torrent" in result)
         self.assertTrue("files" in result)
         self.assertTrue("history" in result)
+
+    def test_data_updates_starts_with_no_tasks(self):
+        response = self.client.get(reverse("data_updates"))
+        message = next(iter(response.streaming_content))
+        response.close()
+        self.assertEqual(message, b'data: {"status": "NoTasks"}\n\n')
+
+    def test_get_torrents_list(self):
+        self.torrent_hist.download_speed = 10
+        self.torrent_hist.save()
+        create_history(self.torrent2, updated_at="2000-01-01 00:10")
+        newest = create_history(self.torrent2, updated_at="2000-01-01 00:12")
+
+        response = self.client.get(reverse("get_torrents_list"))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["summary"], {"down": 10, "up": 0})
+        histories = {
+            entry["torrent"]["id"]: entry["history"]["id"] for entry in data["torrents"]
+        }
+        self.assertEqual(
+            histories, {self.torrent.id: self.torrent_hist.id, self.torrent2.id: newest.id}
+        )
+        self.assertEqual(data["torrents"][0]["torrent"]["local_status"]["name"], "Unknown")
+
+    def test_get_torrent_speed_history_window(self):
+        create_history(self.torrent2, updated_at=timezone.now() - timedelta(days=5))
+        recent = create_history(self.torrent2, updated_at=timezone.now())
+
+        response = self.client.get(
+            reverse("get_torrent_speed_history", args=[self.torrent2.id])
+        )
+        self.assertEqual(len(response.json()), 2)
+
+        response = self.client.get(
+            reverse("get_torrent_speed_history", args=[self.torrent2.id]),
+            {"days": 1},
+        )
+        self.assertEqual(
+            response.json(), [{"x": recent.updated_at.isoformat(), "y": 0}]
+        )
+
+    def test_get_torrents_list_constant_queries(self):
+        def count_queries(size):
+            Torrent.objects.all().delete()
+            torrents = Torrent.objects.bulk_create(
+                [
+                    Torrent(
+                        hash=f"hash{i}",
+                        name=f"Torrent {i}",
+                        size=1,
+                        client=self.torrent.client,
+                        torrent_type=self.no_type,
+                        local_status=self.torrent.local_status,
+                        created_at=timezone.now(),
+                    )
+                    for i in range(size)
+                ]
+            )
+            for torrent in torrents:
+                torrent.latest_history = TorrentHistory(
+                    torrent=torrent, updated_at=timezone.now()
+                )
+            TorrentHistory.objects.bulk_create(
+                [torrent.latest_history for torrent in torrents]
+            )
+            Torrent.objects.bulk_update(torrents, ["latest_history"])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("get_torrents_list"))
+            self.assertEqual(len(response.json()["torrents"]), size)
+            return len(queries)
+
+        self.assertEqual(count_queries(10), count_queries(1000))
+
+    async def test_async_data_updates_starts_with_no_tasks(self):
+        response = await AsyncClient().get(reverse("data_updates"))
+        self.assertTrue(response.is_async)
+        stream = aiter(response.streaming_content)
+        message = await anext(stream)
+        await stream.aclose()
+        self.assertEqual(message, b'data: {"status": "NoTasks"}\n\n')
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django_tasks.backends.database.models import DBTaskResult, ResultStatus
+from ..tasks import exec_action_on_file_task, torbox_status_task, process_arr_task
+from ..workermgr import WorkerPool
+import unittest
+import logging
+from .temp_settings import console_logging_config
+
+
+@override_settings(DEBUG=True, LOGGING=console_logging_config)
+class WorkerMgrTests(TestCase):
+    def setUp(self):
+        logging.config.dictConfig(console_logging_config)
+        self.pool = WorkerPool(
+            lanes=settings.TASK_WORKER_LANES,
+            limits={"tor.tasks.process_arr_task": 1},
+        )
+        self.workers = {}
+        for worker in self.pool.create_workers():
+            self.workers.setdefault(worker.lane, worker)
+
+    def _claim(self, lane):
+        task_result = self.pool.claim(self.workers[lane])
+        return task_result.task_path if task_result else None
+
+    def test_lanes_claim_own_tasks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            exec_action_on_file_task.enqueue(1)
+            process_arr_task.enqueue(1)
+            torbox_status_task.enqueue()
+
+        self.assertEqual(self._claim("status"), "tor.tasks.torbox_status_task")
+        self.assertEqual(self._claim("default"), "tor.tasks.process_arr_task")
+        self.assertEqual(self._claim("files"), "tor.tasks.exec_action_on_file_task")
+        self.assertIsNone(self._claim("status"))
+        self.assertEqual(
+            DBTaskResult.objects.filter(status=ResultStatus.RUNNING).count(), 3
+        )
+
+    def test_concurrency_limit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            process_arr_task.enqueue(1)
+            process_arr_task.enqueue(2)
+
+        first = self.pool.claim(self.workers["default"])
+        self.assertIsNotNone(first)
+        self.assertIsNone(self._claim("default"))
+
+        self.pool.release(first)
+        self.assertEqual(self._claim("default"), "tor.tasks.process_arr_task")
+
+    def test_interrupted_tasks_requeued(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            exec_action_on_file_task.enqueue(1)
+        self.assertEqual(self._claim("files"), "tor.tasks.exec_action_on_file_task")
+
+        restarted = WorkerPool(lanes=settings.TASK_WORKER_LANES, limits={})
+        self.assertEqual(restarted.requeue_interrupted(), 1)
+
+        self.assertEqual(self._claim("files"), "tor.tasks.exec_action_on_file_task")
+
+    def test_worker_ids(self):
+        workers = self.pool.create_workers()
+        self.assertEqual(
+            len(workers),
+            sum(lane.get("workers", 1) for lane in settings.TASK_WORKER_LANES.values()),
+        )
+        self.assertEqual(len({worker.worker_id for worker in workers}), len(workers))
+
+
+if __name__ == "__main__":
+    unittest.main()
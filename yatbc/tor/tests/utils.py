@@ -8,8 +8,10 @@ from ..models import (
     TorrentTorBoxSearchResult,
 )
 import shutil
+import unittest.mock
 from pathlib import Path
 from ..torboxapi import TORBOX_CLIENT
+from ..commondao import add_torrent_history
 from django.utils import timezone
 
 
@@ -65,14 +67,21 @@ def create_file(file_name, work_dir=None):
 
 
 def create_torrent_file(
-    torrent, aria=None, internal_id="asd1", name="Test", short_name="Short test name"
+    torrent,
+    aria=None,
+    internal_id="asd1",
+    name="Test",
+    short_name="Short test name",
+    size=123,
+    md5=None,
 ):
     return TorrentFile.objects.create(
         torrent=torrent,
         aria=aria,
         name=name,
         short_name=short_name,
-        size=123,
+        size=size,
+        md5=md5,
         hash="hash",
         mime_type="Mime",
         internal_id=internal_id,
@@ -80,7 +89,7 @@ def create_torrent_file(
 
 
 def create_history(torrent: Torrent, updated_at="2000-01-01 00:11"):
-    return TorrentHistory.objects.create(torrent=torrent, updated_at=updated_at)
+    return add_torrent_history(TorrentHistory(torrent=torrent, updated_at=updated_at))
 
 
 def create_torrent(
@@ -113,3 +122,38 @@ def create_torrent(
         torrent_type=torrent_type,
         local_status=TorrentStatus.objects.get(name="Unknown"),
     )
+
+
+def create_torbox_entry(
+    hash, name, updated_at=None, download_finished=False, files=None, private=False
+):
+    entry = unittest.mock.Mock(
+        active=True,
+        hash=hash,
+        size=123,
+        created_at=timezone.now().isoformat(),
+        download_finished=download_finished,
+        download_present=download_finished,
+        id_="123",
+        magnet=f"magnet:?xt={hash}",
+        download_speed=12,
+        upload_speed=22,
+        eta=0,
+        peers=1,
+        ratio=2,
+        seeds=3,
+        progress=0.5,
+        updated_at=updated_at or timezone.now().isoformat(),
+        availability=3,
+        download_state="downloading",
+        _kwargs={
+            "tracker": "test_tracker",
+            "total_uploaded": 1234,
+            "total_downloaded": 1233,
+            "cached": False,
+            "private": private,
+        },
+        files=files,
+    )
+    type(entry).name = unittest.mock.PropertyMock(return_value=name)
+    return entry
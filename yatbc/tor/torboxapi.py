@@ -16,13 +16,30 @@ from .commondao import (
     clean_html,
     map_torbox_entry_to_torrent,
     map_torbox_entry_to_torrent_history,
+    map_torbox_file_to_torrent_file,
+    bulk_update_torrents,
+    get_torrent_files_state,
+    add_torrent_history,
+    write_transaction,
+    to_datetime,
 )
 from datetime import date, timedelta
 from .ariaapi import AriaApi
-import requests
+from .httpsession import get_session, host_slot
+from django.db import connections
+from concurrent.futures import ThreadPoolExecutor
+import time
 from constance import config
 from .queuemgr import add_to_queue_by_magnet
 
+# torrent list is read in pages of this size
+SYNC_PAGE_SIZE = 200
+SYNC_MAX_PAGES = 100
+# download links are requested in parallel, failed requests are retried with backoff
+LINK_WORKERS = 8
+LINK_ATTEMPTS = 3
+LINK_RETRY_DELAY = 1
+
 
 class TorBoxApi:
     def __init__(
@@ -123,7 +140,7 @@ class TorBoxApi:
         )
         try:
             self.logger.debug(body)
-            result = requests.post(
+            result = get_session().post(
                 f"https://{self.api}.{self.host}/{self.version}/api/torrents/controltorrent",
                 headers={"Authorization": f"Bearer {self.access_token}"},
                 data=body,
@@ -150,7 +167,7 @@ class TorBoxApi:
             additional_params += f"&episode={episode}"
         url = f"https://{self.search_api}.{self.host}/torrents/imdb:{query}?metadata=true&check_cache=true&check_owned=true&search_user_engines=true{additional_params}"
         self.logger.debug(f"Requesting search API: {url}")
-        result = requests.get(
+        result = get_session().get(
             url, headers={"Authorization": f"Bearer {self.access_token}"}
         )
         if result.ok:
@@ -165,14 +182,15 @@ class TorBoxApi:
         )
         return None
 
-    def get_torrent_list(self):
+    def get_torrent_list(self, offset=None, limit=None):
         try:
+            page = {}
+            if limit is not None:
+                page = {"offset": str(offset or 0), "limit": str(limit)}
             result = self.sdk.torrents.get_torrent_list(
                 api_version=self.version,
-                bypass_cache="True",  # ,
-                # id_="integer",
-                # offset="integer",
-                # limit="integer"
+                bypass_cache="True",
+                **page,
             )
 
             if result.error:
@@ -360,8 +378,8 @@ def add_torrent_by_data(torrent_type, magnet=None, blob=None, private=False, api
         torrent_type=torrent_type,
         private=private,
     )
-    TorrentHistory.objects.create(
-        torrent=new_torrent, updated_at=timezone.now().isoformat(), state="New"
+    add_torrent_history(
+        TorrentHistory(torrent=new_torrent, updated_at=timezone.now(), state="New")
     )
     return new_torrent
 
@@ -435,6 +453,30 @@ def add_torrent(query_search_id):
         )
 
 
+def request_download_links(api, torrent, files):
+    logger = logging.getLogger("torbox")
+    host = f"{api.api}.{api.host}"
+
+    def request_link(file):
+        try:
+            for attempt in range(LINK_ATTEMPTS):
+                if attempt:
+                    time.sleep(LINK_RETRY_DELAY * 2 ** (attempt - 1))
+                with host_slot(host):
+                    link = api.request_download_link(torrent=torrent, file=file)
+                if link:
+                    return link
+                logger.warning(
+                    f"Requesting link for torrent id: {torrent.id}, file: {file.id} failed, attempt: {attempt + 1}"
+                )
+            return None
+        finally:
+            connections.close_all()  # failures are logged to db from this thread
+
+    with ThreadPoolExecutor(max_workers=min(LINK_WORKERS, len(files))) as executor:
+        return list(executor.map(request_link, files))
+
+
 def request_dl(torrent_id, api=None, aria_api=None):
     logger = logging.getLogger("torbox")
 
@@ -505,48 +547,44 @@ def request_dl(torrent_id, api=None, aria_api=None):
         api = TorBoxApi()
     if not aria_api:
         aria_api = AriaApi()
-    request_data = []
-    for file in files:
-        result = api.request_download_link(torrent=torrent, file=file)
-        logger.debug(result)
-        if not result:
-            logger.warning(
-                f"Requesting link for torrent id: {torrent.id} failed, trying again"
-            )
-            result = api.request_download_link(torrent=torrent, file=file)
-            if not result:
-                status_mgr.remote_client_error(torrent)
-                return
-        request_data.append(
-            {
-                "url": result,
-                "path": f"{config.ARIA2_DIR}/{prepare_torrent_dir_name(torrent.name)}",
-                "file": file,
-            }
-        )
+    path = f"{config.ARIA2_DIR}/{prepare_torrent_dir_name(torrent.name)}"
+    links = request_download_links(api, torrent, files)
+    if not all(links):
+        status_mgr.remote_client_error(torrent)
+        return
 
     # fixme: in case of an error, do we want to do something about files that already were requested? Aria is probably down, so not here.
-    for request in request_data:
-        url = request["url"]
-        path = request["path"]
-        file = request["file"]
-        ok, aria_id = aria_api.download_file(
-            link=url, target_name=file.short_name, target_folder=path, torrent=torrent
-        )
-        if not ok:
-            logger.error(f"Could not request Aria to download file: {url}, stopping")
-            return
-        aria_download_status = AriaDownloadStatus.objects.create(
-            internal_id=aria_id, path=path
-        )
-        file.aria = aria_download_status
-        file.save()
+    ok, aria_ids = aria_api.download_files(
+        [(link, file.short_name, path) for link, file in zip(links, files)],
+        torrent=torrent,
+    )
+    if not ok:
+        logger.error(f"Could not request Aria to download files: {links}, stopping")
+        return
+    added = []
+    for link, file, aria_id in zip(links, files, aria_ids):
+        if not aria_id:
+            add_log(
+                message=f"Aria refused to download torrent file: {torrent_file_to_log(file)} from: <i>'{link}'</i>",
+                level=Level.objects.get_error(),
+                source="torboxapi",
+                torrent=torrent,
+            )
+            continue
+        file.aria = AriaDownloadStatus(internal_id=aria_id, path=path)
+        added.append(file)
+    AriaDownloadStatus.objects.bulk_create([file.aria for file in added])
+    TorrentFile.objects.bulk_update(added, ["aria"])
+    for file in added:
         add_log(
-            message=f"Torrent file: {torrent_file_to_log(file)} for torrent: {torrent_to_log(torrent)} send to Aria for download with id: <i>'{aria_id}'</i> and path: <i>'{path}'</i>",
+            message=f"Torrent file: {torrent_file_to_log(file)} for torrent: {torrent_to_log(torrent)} send to Aria for download with id: <i>'{file.aria.internal_id}'</i> and path: <i>'{path}'</i>",
             level=Level.objects.get_info(),
             source="torboxapi",
             torrent=torrent,
         )
+    if len(added) < len(files):
+        logger.error(f"Not all files of torrent: {torrent.id} were added to Aria")
+        return
     status_mgr.aria_new(torrent)
 
 
@@ -602,7 +640,7 @@ def validate_api(api, host, key):
     WRONG_KEY = 2
     API_VERSION = "v1"
     try:
-        result = requests.get(
+        result = get_session().get(
             f"https://{api}.{host}/{API_VERSION}/api/user/referraldata",
             headers={"Authorization": f"Bearer {key}"},
         )
@@ -621,64 +659,175 @@ def validate_api(api, host, key):
     return False, "Failed to validate TorBox API. Check your API key.", WRONG_KEY
 
 
-def update_torrent_list(api=None):
-    if not api:
-        api = TorBoxApi()
-    no_type = TorrentType.objects.get(name="No Type")
+def get_torrent_pages(api, page_size):
+    logger = logging.getLogger("torbox")
+    entries = {}
+    for page in range(SYNC_MAX_PAGES):
+        data = api.get_torrent_list(offset=page * page_size, limit=page_size)
+        if data is None:
+            return None
+        for entry in data:
+            # list can shift between pages, when torrent is added meanwhile
+            entries.setdefault(entry.hash, entry)
+        if len(data) < page_size:
+            return list(entries.values())
+    logger.error(f"Torrent list has more than {SYNC_MAX_PAGES} pages, sync skipped")
+    return None
+
+
+def get_files_md5(entry):
+    return {
+        str(file.id_): file.md5
+        for file in entry.files or []
+        if getattr(file, "md5", None)
+    }
+
+
+def backfill_files_md5(md5s):
+    # files synced before md5 was stored get it, when their torrent is synced again
+    if not md5s:
+        return 0
+    files = []
+    for file in TorrentFile.objects.filter(torrent_id__in=md5s, md5__isnull=True):
+        file.md5 = md5s[file.torrent_id].get(file.internal_id)
+        if file.md5:
+            files.append(file)
+    TorrentFile.objects.bulk_update(files, ["md5"])
+    return len(files)
+
+
+def split_unchanged_entries(data, files_state):
+    # latest stored history is the cursor: entries with same updated_at, that
+    # don't wait for files or links, need no processing
     status_mgr = StatusMgr.get_instance()
+    stored = {}
+    for pk, hash, updated_at, local_status_id, finished in (
+        Torrent.objects.filter(client=TORBOX_CLIENT, deleted=False)
+        .order_by("pk")
+        .values_list(
+            "pk",
+            "hash",
+            "latest_history__updated_at",
+            "local_status_id",
+            "download_finished",
+        )
+    ):
+        stored.setdefault(hash, (pk, updated_at, local_status_id, finished))
+    changed = []
+    unchanged_ids = []
+    for entry in data:
+        if entry.hash not in stored:
+            changed.append(entry)
+            continue
+        pk, updated_at, local_status_id, finished = stored[entry.hash]
+        files_count, aria_count, md5_count = files_state.get(pk, (0, 0, 0))
+        if (
+            updated_at is None
+            or updated_at != to_datetime(entry.updated_at)
+            or local_status_id == status_mgr.client_added.id
+            or (entry.files and not files_count)
+            or (finished and not aria_count)
+            or (files_count and len(get_files_md5(entry)) > md5_count)
+        ):
+            changed.append(entry)
+        else:
+            unchanged_ids.append(pk)
+    return changed, unchanged_ids
 
+
+def sync_torbox_entries(data, files_state=None):
+    status_mgr = StatusMgr.get_instance()
     logger = logging.getLogger("torbox")
-    data = api.get_torrent_list()
-    if data is None:
-        return None
-    logger.debug(f"Updating entries: {len(data)} in torboxapi")
-    not_deleted = []
-    for entry in data:
-        new_torrent = map_torbox_entry_to_torrent(entry, no_type=no_type)
-        torrent = update_torrent(new_torrent)
+    no_type = TorrentType.objects.get_no_type()
+    torrents = bulk_update_torrents(
+        [map_torbox_entry_to_torrent(entry, no_type=no_type) for entry in data],
+        client=TORBOX_CLIENT,
+    )
+    if files_state is None:
+        files_state = get_torrent_files_state(client=TORBOX_CLIENT)
+
+    histories = []
+    new_files = []
+    md5s = {}
+    in_progress = []
+    done = []
+    for entry, torrent in zip(data, torrents):
+        latest_history = torrent.latest_history
         if (
-            not TorrentHistory.objects.filter(torrent=torrent).exists()
+            latest_history is None
             or torrent.local_status == status_mgr.client_added
         ):
-            status_mgr.remote_client_progress(torrent)
-        previous_activity = TorrentHistory.objects.filter(
-            torrent=torrent, updated_at=entry.updated_at
-        )
-        if not previous_activity.exists():
+            in_progress.append(torrent)
+        updated_at = to_datetime(entry.updated_at)
+        if latest_history is None or latest_history.updated_at != updated_at:
             torrent_history = map_torbox_entry_to_torrent_history(entry, torrent)
-            if new_torrent.download_finished:
+            torrent_history.updated_at = updated_at
+            if torrent.download_finished:
                 torrent_history.progress = 1
-            torrent_history.save()
+            histories.append(torrent_history)
+            torrent.latest_history = torrent_history
         else:
             logger.debug("Torrent wasn't active from last check")
         download_requested = False
-        files = TorrentFile.objects.filter(torrent=torrent)
-        if entry.files and not files:
+        files_count, aria_count, md5_count = files_state.get(torrent.pk, (0, 0, 0))
+        if entry.files and not files_count:
             logger.debug(f"Filling files for: {torrent.name}")
-            for file in entry.files:
-                logger.debug(file)
-                TorrentFile.objects.create(
-                    torrent=torrent,
-                    name=file.name,
-                    short_name=file.short_name,
-                    size=file.size,
-                    hash=file._kwargs["hash"],
-                    mime_type=file.mimetype,
-                    internal_id=file.id_,
-                )
-
+            new_files.extend(
+                map_torbox_file_to_torrent_file(file, torrent) for file in entry.files
+            )
+            files_state[torrent.pk] = (
+                len(entry.files),
+                0,
+                len(get_files_md5(entry)),
+            )
             if torrent.download_finished:
-                status_mgr.remote_client_done(torrent)
+                done.append(torrent)
                 download_requested = True
+        elif files_count and len(get_files_md5(entry)) > md5_count:
+            md5s[torrent.pk] = get_files_md5(entry)
         if (  # refactor to use same code as request_dl
-            torrent.download_finished
-            and not any([file.aria for file in files])
-            and not download_requested
+            torrent.download_finished and not aria_count and not download_requested
         ):
             logger.warning(
                 f"Torrent {torrent.id} has no aria links but it's done on client site. It is possible, that client failed to respond with link. Will try again."
             )
-            status_mgr.remote_client_done(torrent)
+            done.append(torrent)
+
+    TorrentHistory.objects.bulk_create(histories)
+    Torrent.objects.bulk_update(
+        [history.torrent for history in histories], ["latest_history"]
+    )
+    TorrentFile.objects.bulk_create(new_files)
+    md5_count = backfill_files_md5(md5s)
+    logger.debug(
+        f"Bulk sync added history: {len(histories)}, files: {len(new_files)}, md5: {md5_count}"
+    )
+    reported = [
+        torrent
+        for torrent in dict.fromkeys(in_progress)
+        if status_mgr.remote_client_progress(torrent, save=False)
+    ]
+    Torrent.objects.bulk_update(reported, ["local_status"])
+    for torrent in dict.fromkeys(done):
+        status_mgr.remote_client_done(torrent)
+    return torrents
+
+
+def update_torrent_list(api=None):
+    if not api:
+        api = TorBoxApi()
 
-        not_deleted.append(torrent)
-    mark_deleted_torrents(not_deleted, clients=[TRANSMISSION_CLIENT])
+    logger = logging.getLogger("torbox")
+    data = get_torrent_pages(api, SYNC_PAGE_SIZE)
+    if data is None:
+        return None
+    with write_transaction():
+        files_state = get_torrent_files_state(client=TORBOX_CLIENT)
+        changed, unchanged_ids = split_unchanged_entries(data, files_state)
+        logger.debug(
+            f"Updating entries: {len(changed)}, unchanged: {len(unchanged_ids)} in torboxapi"
+        )
+        not_deleted = sync_torbox_entries(changed, files_state=files_state)
+        mark_deleted_torrents(
+            not_deleted, clients=[TRANSMISSION_CLIENT], unchanged_ids=unchanged_ids
+        )
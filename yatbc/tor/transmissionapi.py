@@ -1,21 +1,47 @@
 from transmission_rpc import Client
 from .models import Torrent, TorrentFile, TorrentHistory, TorrentType, ErrorLog
 
-from .commondao import update_torrent, mark_deleted_torrents, TRANSMISSION_CLIENT, TORBOX_CLIENT
+from .commondao import update_torrent, mark_deleted_torrents, add_torrent_history, TRANSMISSION_CLIENT, TORBOX_CLIENT
 import logging
+import threading
 from django.forms.models import model_to_dict
 from constance import config
+
+_lock = threading.Lock()
+_client = None
+_client_key = None
+
+
+def get_transmission_client():
+    # client keeps its http session and transmission session id, so reuse it between calls
+    global _client, _client_key
+    key = (config.TRANSMISSION_HOST, config.TRANSMISSION_PORT, config.TRANSMISSION_USER, config.TRANSMISSION_PASSWORD)
+    with _lock:
+        if _client is None or _client_key != key:  # replaced, when config was changed
+            _client = Client(host=key[0], port=key[1], username=key[2], password=key[3])
+            _client_key = key
+        return _client
+
+
+def drop_transmission_client():
+    global _client, _client_key
+    with _lock:
+        _client = None
+        _client_key = None
+
+
 def transmission_add_torrent(magnet, torrent_type):
     if not config.USE_TRANSMISSION:
         return
     logger = logging.getLogger("torbox")
     logger.debug(f"Adding torrent with host: {config.TRANSMISSION_HOST}, port: {config.TRANSMISSION_PORT}, user: {config.TRANSMISSION_USER}")
     try:
-        client = Client(host=config.TRANSMISSION_HOST, port=config.TRANSMISSION_PORT, username=config.TRANSMISSION_USER, password=config.TRANSMISSION_PASSWORD)
+        client = get_transmission_client()
         result = client.add_torrent(torrent=magnet)
         logger.debug(result)
         #todo: add empty torrent, to save torrent_type
     except Exception as e:
+        drop_transmission_client()
         logger.error(f"Could not add torrent: {e}")
         ErrorLog.objects.create(message=f"Could not add torrent with magnet {magnet}: {e}", level="ERROR", source="transmissionapi")
         return None
@@ -26,7 +52,7 @@ def transmission_delete_torrent(torrent_id):
     logger = logging.getLogger("torbox")
     torrent = Torrent.objects.get(pk=torrent_id)
     try:
-        client = Client(host=config.TRANSMISSION_HOST, port=config.TRANSMISSION_PORT, username=config.TRANSMISSION_USER, password=config.TRANSMISSION_PASSWORD)
+        client = get_transmission_client()
         if torrent.download_finished:
             logger.info(f"Requesting removing transmission torrent (completed one, without removing data): {torrent}")
             client.remove_torrent(ids=[int(torrent.internal_id)], delete_data=False)
@@ -36,6 +62,7 @@ def transmission_delete_torrent(torrent_id):
         torrent.deleted = True
         torrent.save()
     except Exception as e:
+        drop_transmission_client()
         torrent.deleted = False
         torrent.save()
         ErrorLog.objects.create(message=f"Could not delete torrent {torrent.name} with id {torrent_id}: {e}", level="ERROR", source="transmissionapi")
@@ -47,6 +74,7 @@ def validate_transmission_api(host, port, user, password):
     WRONG_HOST = 2
     
     try:
+        # not cached, form can be tested with credentials that are never saved
         client = Client(host=host, port=port, username=user, password=password)
         result = client.get_session()
         logger.debug(f"Result of get_session: {result}")
@@ -63,7 +91,7 @@ def transmission_status():
     no_type = TorrentType.objects.get(name="No Type")
     logger = logging.getLogger("torbox")
     try:
-        client = Client(host=config.TRANSMISSION_HOST, port=config.TRANSMISSION_PORT, username=config.TRANSMISSION_USER, password=config.TRANSMISSION_PASSWORD)
+        client = get_transmission_client()
 
         torrents = client.get_torrents()
 
@@ -102,7 +130,7 @@ def transmission_status():
                                                     updated_at=entry.activity_date,
                                                     availability=entry.desired_available,
                                                     state=entry.status.name)
-                torrent_history.save()
+                add_torrent_history(torrent_history)
                 logger.debug(model_to_dict(torrent_history))
 
             else:
@@ -121,6 +149,7 @@ def transmission_status():
                     tor_file.save()
         mark_deleted_torrents(not_deleted, clients=[TORBOX_CLIENT])
     except Exception as e:
+        drop_transmission_client()
         logger.error(f"Could not get torrents: {e}")
         ErrorLog.objects.create(message=f"Could not get torrents: {e}", level="ERROR", source="transmissionapi")
         return None
\ No newline at end of file
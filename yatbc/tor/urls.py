@@ -129,6 +129,12 @@ urlpatterns = [
     path("api/test_ip", views.test_ip, name="test_ip"),
     path("queue", views.queue, name="queue"),
     path("api/get_active_queue", views.api_get_active_queue, name="get_active_queue"),
+    path(
+        "api/get_scheduled_jobs",
+        views.api_get_scheduled_jobs,
+        name="get_scheduled_jobs",
+    ),
+    path("api/get_task_metrics", views.api_get_task_metrics, name="get_task_metrics"),
     path("history", views.history, name="history"),
     path("api/delete_logs", views.delete_logs, name="delete_logs"),
     path("api/delete_history", views.delete_history, name="delete_history"),
@@ -1,5 +1,7 @@
 import logging
-import time
+import asyncio
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from datetime import datetime, date, timedelta
 
 from .common import shorten_torrent_name
@@ -14,16 +16,16 @@ from django_tasks import default_task_backend
 from pathlib import Path
 from django.utils import timezone
 import json
-import requests
+from .httpsession import get_session
 from django.db import IntegrityError
 from .queuemgr import get_queue_folders, get_active_queue, get_queue_count
 from .common import get_name_from_magnet
-from .commondao import (
-    get_active_torrents_with_formatted_age,
-    format_age,
-    get_history_with_age,
-)
+from .commondao import get_active_torrents_with_latest_history, format_age
+from .schedulermgr import get_scheduled_jobs
+from .taskresultmgr import get_task_result_metrics
 from .arrmanager import get_all_arrs
+from .historymgr import get_history_points
+from .eventbus import EventListener, TaskActivity, publish_torrent_changed
 from .models import (
     Torrent,
     TorrentHistory,
@@ -38,115 +40,98 @@ from .models import (
 from .tasks import (
     queue_torbox_status,
     torbox_request_torrent_files,
-    queue_scheduler,
+    wake_scheduler,
     torbox_search,
     add_torbox_torrent,
     change_torrent_task,
     double_torrent_task,
     add_magnet,
     check_status,
-    get_task,
     get_tasks,
     not_status_checking,
     ResultStatus,
     queue_import_from_queue_folders,
     process_arr_task,
+    enqueue_once,
 )
 
 from .torboxapi import validate_api, add_referral_api
 from .ariaapi import validate_aria_api
 from .transmissionapi import validate_transmission_api
 from .stashapi import validate_stash_api
+from django.db.models import Q
+
+# how long event stream waits for events, before sending heartbeat
+BUSY_WAIT_SECONDS = 2
+IDLE_WAIT_SECONDS = 15
 
 
 def data_updates(request):
-    def wait_for_done(previous_path, timeout=10):
-        logger = logging.getLogger("torbox")
-        active_tasks = [
-            item
-            for item in get_tasks(
-                exclude_tasks_type=not_status_checking,
-                status=[ResultStatus.RUNNING],
-            )
-        ]
-        if not active_tasks:
-            return None, ""
-        path = active_tasks[0].task_path
-        for i in range(0, timeout):
-            task = get_task(path, [ResultStatus.RUNNING])
-            if not task:
-                logger.debug(f"Task {path} is done")
-                return True, ""
-            time.sleep(1)
-            if previous_path == path:
-                logger.debug(f"Long running task: {path}")
-                yield f"data: {json.dumps({'status': 'LongRunning', 'task': path})}\n\n"
-                continue
-            yield f"data: {json.dumps({'status': 'TaskStillWorking', 'task': path})}\n\n"
-        return False, path
+    def initial_activity():
+        running = get_tasks(
+            exclude_tasks_type=not_status_checking, status=[ResultStatus.RUNNING]
+        ).values_list("id", "task_path")
+        queued = (
+            get_tasks(exclude_tasks_type=not_status_checking, status=[ResultStatus.READY])
+            .filter(Q(run_after__isnull=True) | Q(run_after__lte=timezone.now()))
+            .values_list("id", "task_path")
+        )
+        return TaskActivity(
+            running=list(running), queued=list(queued), ignored=not_status_checking
+        )
+
+    def format_messages(messages):
+        return "".join(f"data: {json.dumps(message)}\n\n" for message in messages)
+
+    def apply_events(activity, events):
+        if not events:
+            return activity.on_timeout()
+        messages = []
+        for event in events:
+            messages.extend(activity.apply(event))
+        return messages
+
+    def wait_timeout(activity):
+        return IDLE_WAIT_SECONDS if activity.is_idle() else BUSY_WAIT_SECONDS
 
     def event_stream():
         logger = logging.getLogger("torbox")
-        # fixme: if tasks in queue are quick to finish, there will be no notification about finished task
         try:
-            path = ""
-            no_active_tasks_count = 0
-            worker_not_responding_threshold = 10
-            previous_done_tasks_count = 0
-            current_done_tasks_count = 0
+            listener = EventListener()
+            activity = initial_activity()
+            messages = activity.on_timeout()
             while True:
-                task_done, path = yield from wait_for_done(previous_path=path)
-                if task_done is None:
-                    no_active_tasks_count += 1
-                else:
-                    no_active_tasks_count = 0
-                previous_done_tasks_count = current_done_tasks_count
-                current_done_tasks_count = get_tasks(
-                    exclude_tasks_type=not_status_checking,
-                    status=[ResultStatus.SUCCEEDED, ResultStatus.FAILED],
-                ).count()
-
-                queued_tasks = [
-                    item
-                    for item in get_tasks(
-                        exclude_tasks_type=not_status_checking,
-                        status=[ResultStatus.READY],
-                    )
-                ]
-
-                if (
-                    queued_tasks
-                    and no_active_tasks_count > worker_not_responding_threshold
-                ):
-                    yield f"data: {json.dumps({'status': 'NoWorker', 'task': queued_tasks[0].task_path})}\n\n"
-                    time.sleep(2)
-                    continue
-
-                if not queued_tasks and (
-                    task_done or current_done_tasks_count > previous_done_tasks_count
-                ):
-                    if (
-                        current_done_tasks_count > previous_done_tasks_count
-                        and not task_done
-                    ):
-                        logger.debug(
-                            f"Current done tasks count: {current_done_tasks_count}, previous done tasks count: {previous_done_tasks_count}"
-                        )
-                    yield f"data: {json.dumps({'status': 'Update'})}\n\n"
-                    time.sleep(2)
-                    continue
-
-                if queued_tasks:
-                    time.sleep(2)
-                    continue
-
-                yield f"data: {json.dumps({'status': 'NoTasks'})}\n\n"
-                time.sleep(2)
+                if messages:
+                    yield format_messages(messages)
+                events = listener.wait(timeout=wait_timeout(activity))
+                messages = apply_events(activity, events)
         except GeneratorExit:
             logger.info("Event stream closed")
         except Exception as e:
             logger.error(f"Error in event stream: {e}")
 
+    async def async_event_stream():
+        # used under ASGI, waiting for events doesn't hold a worker thread
+        logger = logging.getLogger("torbox")
+        try:
+            listener = await sync_to_async(EventListener)()
+            activity = await sync_to_async(initial_activity)()
+            messages = activity.on_timeout()
+            while True:
+                if messages:
+                    yield format_messages(messages)
+                events = await listener.wait_async(timeout=wait_timeout(activity))
+                messages = apply_events(activity, events)
+        except (GeneratorExit, asyncio.CancelledError):
+            logger.info("Event stream closed")
+            raise
+        except Exception as e:
+            logger.error(f"Error in event stream: {e}")
+
+    if isinstance(request, ASGIRequest):
+        return StreamingHttpResponse(
+            async_event_stream(), content_type="text/event-stream"
+        )
     return StreamingHttpResponse(event_stream(), content_type="text/event-stream")
 
 
@@ -198,18 +183,29 @@ def get_config(request):
     return JsonResponse(config_data, safe=False)
 
 
+def get_history_since(request):
+    # optional chart window in days, whole history by default
+    try:
+        days = int(request.GET.get("days", 0))
+    except ValueError:
+        days = 0
+    if days <= 0:
+        return None
+    return timezone.now() - timedelta(days=days)
+
+
 def get_torrent_speed_history(request, id):
     logger = logging.getLogger("torbox")
     logger.info(f"Loading torrent speed history for id: {id}")
     try:
         torrent = Torrent.objects.get(id=id)
-        history = TorrentHistory.objects.filter(torrent=torrent).order_by("-updated_at")
+        history = get_history_points(torrent, since=get_history_since(request))
         if not history:
             logger.warning(f"No history found for torrent id: {id}")
             return JsonResponse({"error": "No history found"}, safe=False)
 
         data = [
-            {"x": entry.updated_at.isoformat(), "y": entry.download_speed}
+            {"x": entry["updated_at"].isoformat(), "y": round(entry["download_speed"])}
             for entry in history
         ]
         return JsonResponse(data, safe=False)
@@ -251,16 +247,18 @@ def get_torrent_seeders_history(request, id):
     logger.info(f"Loading torrent seed history for id: {id}")
     try:
         torrent = Torrent.objects.get(id=id)
-        history = TorrentHistory.objects.filter(torrent=torrent).order_by("-updated_at")
+        history = get_history_points(torrent, since=get_history_since(request))
         if not history:
             logger.warning(f"No history found for torrent id: {id}")
             return JsonResponse({"error": "No history found"}, safe=False)
 
         seeds = [
-            {"x": entry.updated_at.isoformat(), "y": entry.seeds} for entry in history
+            {"x": entry["updated_at"].isoformat(), "y": round(entry["seeds"])}
+            for entry in history
         ]
         peers = [
-            {"x": entry.updated_at.isoformat(), "y": entry.peers} for entry in history
+            {"x": entry["updated_at"].isoformat(), "y": round(entry["peers"])}
+            for entry in history
         ]
         return JsonResponse({"seeds": seeds, "peers": peers}, safe=False)
     except Torrent.DoesNotExist:
@@ -602,6 +600,8 @@ def save_config(request):
             actions = [
                 TorrentType.ACTION_COPY,
                 TorrentType.ACTION_MOVE,
+                TorrentType.ACTION_HARDLINK,
+                TorrentType.ACTION_REFLINK,
                 TorrentType.ACTION_DO_NOTHING,
             ]
             for type in result.get("TORRENT_TYPES", {}).items():
@@ -707,7 +707,7 @@ def validate_aria(request):
 
 def test_ip(request):
     logger = logging.getLogger("torbox")
-    result = requests.get("http://ip-api.com/json/?fields=status,message,query,isp,org")
+    result = get_session().get("http://ip-api.com/json/?fields=status,message,query,isp,org")
     # todo: add ip test for db_worker
     if result.ok:
         json_result = json.loads(result.content)
@@ -880,28 +880,23 @@ def get_search_results(request, query, season=0, episode=0):
 
 
 def get_torrents():
-    torrent_with_latest_details = get_active_torrents_with_formatted_age()
     result = []
     summary = {"down": 0, "up": 0}
-    for torrent_instance in torrent_with_latest_details:
-        latest_history = None
-        if torrent_instance.latest_history_id:
-            latest_history = get_history_with_age(torrent_instance.latest_history_id)
-            latest_history.last_updated_ago = format_age(
-                latest_history.ago.total_seconds()
-            )
+    for torrent_instance in get_active_torrents_with_latest_history():
+        latest_history = torrent_instance.latest_history
         torrent_instance = shorten_torrent_name(torrent_instance)
-        summary["down"] += latest_history.download_speed
-        summary["up"] += latest_history.upload_speed
         torrent = model_to_dict(torrent_instance)
         torrent["formatted_age"] = torrent_instance.formatted_age
-
-        history = model_to_dict(latest_history)
-        history["last_updated_ago"] = latest_history.last_updated_ago
         torrent["local_status"] = model_to_dict(torrent_instance.local_status)
         torrent["local_status"]["level"] = model_to_dict(
             torrent_instance.local_status.level
         )
+        history = {}
+        if latest_history:
+            summary["down"] += latest_history.download_speed
+            summary["up"] += latest_history.upload_speed
+            history = model_to_dict(latest_history)
+            history["last_updated_ago"] = latest_history.last_updated_ago
         result.append(
             {
                 "torrent": torrent,
@@ -920,7 +915,7 @@ def update_queue_folders(request):
 def update_torrent_list(request):
     logger = logging.getLogger("torbox")
     result = check_status()
-    queue_scheduler()
+    wake_scheduler()
     return JsonResponse({"request_id": result.id}, safe=False)
 
 
@@ -972,6 +967,28 @@ def api_get_active_queue(request):
     return JsonResponse({"error": "Invalid request method"}, status=400)
 
 
+def api_get_scheduled_jobs(request):
+    if request.method == "GET":
+        jobs = [
+            {
+                "name": job.name,
+                "interval": job.interval,
+                "active": job.active,
+                "last_run_at": job.last_run_at.isoformat() if job.last_run_at else None,
+                "next_run_at": job.next_run_at.isoformat() if job.next_run_at else None,
+            }
+            for job in get_scheduled_jobs()
+        ]
+        return JsonResponse({"jobs": jobs}, safe=False)
+    return JsonResponse({"error": "Invalid request method"}, status=400)
+
+
+def api_get_task_metrics(request):
+    if request.method == "GET":
+        return JsonResponse({"metrics": get_task_result_metrics()}, safe=False)
+    return JsonResponse({"error": "Invalid request method"}, status=400)
+
+
 def change_torrent_api(request, action, id):
     logger = logging.getLogger("torbox")
     actions = ["delete", "reannounce", "resume"]
@@ -987,6 +1004,7 @@ def change_torrent_api(request, action, id):
             torrent.deleted = True
             torrent.save()
             logger.debug(f"Torrent: {torrent} internally deleted")
+            publish_torrent_changed()
         result = change_torrent_task.enqueue(action, id)
         return JsonResponse({"request_id": result.id}, safe=False)
     return JsonResponse({"error": "Invalid request method"}, status=400)
@@ -1006,7 +1024,7 @@ def add_torrent_api(request):
 
 
 def download_torrent_files(request, id):
-    result = torbox_request_torrent_files.enqueue(id)
+    result = enqueue_once(torbox_request_torrent_files, id)
     return JsonResponse({"request_id": result.id}, safe=False)
 
 
@@ -1017,6 +1035,7 @@ def update_torrent_type(request, torrent_id, torrent_type_id):
     Torrent.objects.filter(pk=torrent_id).update(
         torrent_type=torrent_type
     )  # filter has update
+    publish_torrent_changed()
     return JsonResponse({"response": True}, safe=False)
 
 
@@ -0,0 +1,134 @@
+import logging
+import threading
+from collections import Counter
+from django.db import close_old_connections
+from django.db.utils import OperationalError
+from django_tasks.backends.database.management.commands.db_worker import Worker
+from django_tasks.backends.database.models import DBTaskResult, ResultStatus
+from .commondao import write_transaction
+
+
+class LaneWorker(Worker):
+    def __init__(self, pool, lane, worker_id):
+        super().__init__(
+            queue_names=["*"],
+            interval=pool.interval,
+            batch=False,
+            backend_name=pool.backend_name,
+            startup_delay=False,
+            max_tasks=None,
+            worker_id=worker_id,
+        )
+        self.pool = pool
+        self.lane = lane
+
+    def run(self):
+        logging.getLogger("torbox").info(
+            f"Starting worker: {self.worker_id}, lane: {self.lane}"
+        )
+        while not self.pool.stopping.is_set():
+            task_result = self.pool.claim(self)
+            if task_result is not None:
+                try:
+                    self.run_task(task_result)
+                finally:
+                    self.pool.release(task_result)
+            close_old_connections()
+            if task_result is None:
+                self.pool.stopping.wait(self.interval)
+        close_old_connections()
+
+
+class WorkerPool:
+    def __init__(self, lanes, limits, interval=1, backend_name="default", prefix=""):
+        self.lanes = lanes
+        self.limits = limits
+        self.interval = interval
+        self.backend_name = backend_name
+        self.prefix = prefix
+        self.stopping = threading.Event()
+        # claiming is serialized, so limits are exact for workers of this pool
+        self._lock = threading.Lock()
+        self.running = Counter()
+        self.threads = []
+
+    def get_lane_tasks(self, lane):
+        tasks = DBTaskResult.objects.ready().filter(backend_name=self.backend_name)
+        lane_paths = self.lanes[lane].get("tasks")
+        if lane_paths:
+            return tasks.filter(task_path__in=lane_paths)
+        # lane without tasks takes everything not assigned to other lanes
+        other_paths = [
+            path
+            for name, lane_settings in self.lanes.items()
+            if name != lane
+            for path in lane_settings.get("tasks") or []
+        ]
+        return tasks.exclude(task_path__in=other_paths)
+
+    def get_full_paths(self):
+        return [
+            path for path, limit in self.limits.items() if self.running[path] >= limit
+        ]
+
+    def claim(self, worker):
+        with self._lock:
+            tasks = self.get_lane_tasks(worker.lane)
+            full_paths = self.get_full_paths()
+            if full_paths:
+                tasks = tasks.exclude(task_path__in=full_paths)
+            with write_transaction(using=tasks.db):
+                try:
+                    task_result = tasks.get_locked()
+                except OperationalError as e:
+                    if "is locked" not in e.args[0]:
+                        raise
+                    task_result = None
+                if task_result is not None:
+                    task_result.claim(worker.worker_id)
+            if task_result is not None:
+                self.running[task_result.task_path] += 1
+            return task_result
+
+    def release(self, task_result):
+        with self._lock:
+            self.running[task_result.task_path] -= 1
+
+    def create_workers(self):
+        return [
+            LaneWorker(self, lane, f"{self.prefix}{lane}-{i}")
+            for lane, lane_settings in self.lanes.items()
+            for i in range(lane_settings.get("workers", 1))
+        ]
+
+    def requeue_interrupted(self):
+        # one worker process runs per database, so running tasks were left by
+        # previous process, which was killed or crashed. enqueue_once would treat
+        # them as queued forever, they are run again instead
+        count = (
+            DBTaskResult.objects.running()
+            .filter(backend_name=self.backend_name)
+            .update(status=ResultStatus.READY, started_at=None)
+        )
+        if count:
+            logging.getLogger("torbox").warning(
+                f"Tasks interrupted by worker restart queued again: {count}"
+            )
+        return count
+
+    def start(self):
+        self.requeue_interrupted()
+        for worker in self.create_workers():
+            thread = threading.Thread(
+                target=worker.run, name=worker.worker_id, daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stopping.set()
+
+    def join(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+        return not any(thread.is_alive() for thread in self.threads)
@@ -52,6 +52,37 @@ BOOTSTRAP5 = {
     "use_cdns": False,
 }
 TASKS = {"default": {"BACKEND": "django_tasks.backends.database.DatabaseBackend"}}
+# worker threads started by: manage.py run_workers
+# status polling has own lane, so it never waits behind long file actions
+TASK_WORKER_LANES = {
+    "status": {
+        "workers": 1,
+        "tasks": [
+            "tor.tasks.schedule_tasks",
+            "tor.tasks.torbox_status_task",
+            "tor.tasks.transmission_status_task",
+            "tor.tasks.check_local_download_status_task",
+        ],
+    },
+    "files": {
+        "workers": int(os.getenv("WORKER_FILE_THREADS", "1")),
+        "tasks": ["tor.tasks.exec_action_on_file_task"],
+    },
+    "default": {"workers": int(os.getenv("WORKER_DEFAULT_THREADS", "2"))},
+}
+# max running tasks of given path, for whole worker pool
+TASK_CONCURRENCY_LIMITS = {
+    "tor.tasks.process_arr_task": 1,
+    "tor.tasks.torbox_search": 1,
+    "tor.tasks.process_queue_task": 1,
+    "tor.tasks.history_retention_task": 1,
+    "tor.tasks.log_retention_task": 1,
+    "tor.tasks.task_result_cleanup_task": 1,
+}
+# touched by every process publishing task events, so event stream can wait without querying db
+EVENT_BUS_FILE = PERSISTENT_DIR / "events.seq"
+# removed logs are archived here, when ARCHIVE_PRUNED_LOGS is on
+LOG_ARCHIVE_DIR = PERSISTENT_DIR / "log_archive"
 
 LOGGING = {
     "version": 1,
@@ -164,6 +195,39 @@ CONSTANCE_CONFIG = {
         False,
         "Rescan Stash when task for home video runs ",
     ),
+    "HISTORY_RAW_DAYS": (
+        7,
+        "How many days torrent history is kept in full detail, older is aggregated per hour",
+    ),
+    "HISTORY_HOURLY_DAYS": (
+        90,
+        "How many days hourly torrent history is kept, older is aggregated per day",
+    ),
+    "NEXT_HISTORY_RETENTION": (
+        None,
+        "When YATBC should aggregate old torrent history next time?",
+    ),
+    "ARIA_PROGRESS_LOG_STEP": (
+        0.1,
+        "How much Aria download progress (0-1) has to change, to be logged again",
+    ),
+    "LOG_DEBUG_DAYS": (3, "How many days DEBUG logs are kept"),
+    "LOG_INFO_DAYS": (14, "How many days INFO logs are kept"),
+    "LOG_WARNING_DAYS": (30, "How many days WARNING logs are kept"),
+    "LOG_ERROR_DAYS": (90, "How many days ERROR logs are kept"),
+    "ARCHIVE_PRUNED_LOGS": (
+        False,
+        "Should removed logs be archived as compressed files in persistent folder?",
+    ),
+    "NEXT_LOG_RETENTION": (
+        None,
+        "When YATBC should remove old logs next time?",
+    ),
+    "TASK_RESULT_DAYS": (3, "How many days finished task results are kept"),
+    "NEXT_TASK_RESULT_CLEANUP": (
+        None,
+        "When YATBC should remove old task results next time?",
+    ),
 }
 
 ROOT_URLCONF = "torbox.urls"
@@ -188,16 +252,44 @@ WSGI_APPLICATION = "torbox.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# gui, worker and prepare container share one sqlite file, these pragmas are run on every new connection
+# can be changed in .env, constance can't be used, as it is stored in the same db
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-32000"),  # negative means KiB
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "20000"),  # ms
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": PERSISTENT_DIR / "db.sqlite3",
         "OPTIONS": {
-            "timeout": 20,
+            "timeout": int(SQLITE_PRAGMAS["busy_timeout"]) / 1000,
+            "init_command": ";".join(
+                f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+            ),
         },
     }
 }
 
+# optional PostgreSQL, used instead of sqlite when POSTGRES_HOST is set
+# existing sqlite data can be moved with: manage.py copy_from_sqlite
+if os.getenv("POSTGRES_HOST"):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.getenv("POSTGRES_DB", "yatbc"),
+        "USER": os.getenv("POSTGRES_USER", "yatbc"),
+        "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+        "HOST": os.getenv("POSTGRES_HOST"),
+        "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": int(os.getenv("POSTGRES_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 